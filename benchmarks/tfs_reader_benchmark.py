@@ -0,0 +1,70 @@
+"""
+Benchmark the column-projected TFS reader against ``tfs.read``.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/tfs_reader_benchmark.py [folder]
+
+By default every ``*.tfs`` and ``twiss.dat`` file under ``tests/test_data`` is
+read. For each file the best time over several repetitions is reported for
+``tfs.read`` followed by the NAME filter (what the analysis did before) and for
+``read_tfs_columns`` with the same projection and filter.
+"""
+
+from __future__ import annotations
+
+import sys
+import timeit
+from pathlib import Path
+
+import tfs
+
+from rdtfeeddown.analysis import RDT_COLUMNS
+from rdtfeeddown.tfs_reader import read_tfs_columns
+
+MODEL_COLUMNS = ("NAME", "S")
+
+
+def tfs_read_filtered(filepath: Path):
+    df = tfs.read(filepath)
+    return df[df["NAME"].str.contains("BPM")]
+
+
+def main(folder: Path, repeat: int = 5, number: int = 10):
+    files = sorted(folder.rglob("*.tfs")) + sorted(folder.rglob("twiss.dat"))
+    if not files:
+        print(f"No TFS files found under {folder}")
+        return
+    print(f"{'file':<60} {'tfs.read [ms]':>14} {'fast [ms]':>10} {'speedup':>8}")
+    total_ref = total_fast = 0.0
+    for filepath in files:
+        columns = MODEL_COLUMNS if filepath.name == "twiss.dat" else RDT_COLUMNS
+        ref = min(
+            timeit.repeat(
+                lambda f=filepath: tfs_read_filtered(f), repeat=repeat, number=number
+            )
+        )
+        fast = min(
+            timeit.repeat(
+                lambda f=filepath, c=columns: read_tfs_columns(
+                    f, c, name_filter="BPM", headers=("Command",)
+                ),
+                repeat=repeat,
+                number=number,
+            )
+        )
+        total_ref += ref
+        total_fast += fast
+        name = str(filepath.relative_to(folder))
+        print(
+            f"{name:<60} {1e3 * ref / number:>14.2f} "
+            f"{1e3 * fast / number:>10.2f} {ref / fast:>7.1f}x"
+        )
+    print(
+        f"{'total':<60} {1e3 * total_ref / number:>14.2f} "
+        f"{1e3 * total_fast / number:>10.2f} {total_ref / total_fast:>7.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main(Path(sys.argv[1]) if len(sys.argv) > 1 else Path("tests/test_data"))
@@ -1,53 +1,294 @@
 from __future__ import annotations
 
-import re
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, NamedTuple
 
 if TYPE_CHECKING:
     from collections.abc import Callable
+from functools import partial
+from itertools import compress
 from pathlib import Path
 
 import numpy as np
 import tfs
 from scipy.optimize import curve_fit
-from scipy.stats import zscore
 
-from rdtfeeddown.utils import csv_to_dict, get_analysis_knobsetting
+from rdtfeeddown.archive import local_path, path_is_file, prefetch_paths
+from rdtfeeddown.bad_bpms import BadBPMSet, excluded_bpms
+from rdtfeeddown.bpm_registry import (
+    BAD_BPMS,
+    averaged_bpms,
+    get_bpm_registry,
+    parse_bpm_name,
+)
+from rdtfeeddown.dataset import RDTDataset
+from rdtfeeddown.fitcache import fit_bpms
+from rdtfeeddown.knobs import KnobResolver
+from rdtfeeddown.parallel import map_ordered, resolve_executor
+from rdtfeeddown.sim_mapping import load_sim_mapping
+from rdtfeeddown.tfs_reader import read_tfs_columns
+from rdtfeeddown.utils import rdt_to_order_and_type
 
+if TYPE_CHECKING:
+    from rdtfeeddown.knob_cache import KnobCache
+    from rdtfeeddown.tfs_cache import TFSCache
+
+RDT_COLUMNS = ("NAME", "AMP", "REAL", "IMAG", "ERRAMP")
+OUTLIER_MODES = ("zscore", "mad", "sigma_clip", "complex")
+# Ratio of the standard deviation to the median absolute deviation of a normal
+# distribution
+MAD_SCALE = 1.4826
+
+
+class RDTColumns(NamedTuple):
+    """
+    Columnar BPM entries of an RDT file, one NumPy array per field.
+
+    All arrays share the same length (one element per BPM), so the row-wise
+    [NAME, AMP, REAL, IMAG, ERRAMP] view is simply ``zip(*columns)``.
+    """
+
+    names: np.ndarray
+    amp: np.ndarray
+    real: np.ndarray
+    imag: np.ndarray
+    erramp: np.ndarray
+
+
+def columns_to_rows(columns: RDTColumns) -> list[list[float]]:
+    """
+    Convert columnar RDT data to the list-of-rows representation.
+
+    Parameters
+    ----------
+    columns : RDTColumns
+        Columnar BPM entries.
+
+    Returns
+    -------
+    list[list[float]]
+        List of [NAME, AMP, REAL, IMAG, ERRAMP] rows with Python scalars.
+    """
+    return [
+        list(row)
+        for row in zip(
+            columns.names.tolist(),
+            columns.amp.tolist(),
+            columns.real.tolist(),
+            columns.imag.tolist(),
+            columns.erramp.tolist(),
+        )
+    ]
 
-def filter_outliers(data: list[list[float]], threshold: float = 3):
+
+def rows_to_columns(data: list[list[float]]) -> RDTColumns:
     """
-    Filter outliers from RDT data using Z-scores.
+    Convert a list of [NAME, AMP, REAL, IMAG, ERRAMP] rows to columnar form.
 
     Parameters
     ----------
     data : list[list[float]]
-        List of RDT rows. Each row is expected to be
-        [NAME, AMP, REAL, IMAG, ERRAMP].
+        List of RDT rows.
+
+    Returns
+    -------
+    RDTColumns
+        Columnar BPM entries.
+    """
+    if not data:
+        empty = np.empty(0, dtype=float)
+        return RDTColumns(np.empty(0, dtype=str), empty, empty, empty, empty)
+    names, amp, real, imag, erramp = zip(*data)
+    return RDTColumns(
+        np.array(names, dtype=str),
+        np.array(amp, dtype=float),
+        np.array(real, dtype=float),
+        np.array(imag, dtype=float),
+        np.array(erramp, dtype=float),
+    )
+
+
+def outlier_mask(
+    amp: np.ndarray,
+    real: np.ndarray,
+    imag: np.ndarray,
+    threshold: float = 3,
+    mode: str = "zscore",
+    max_iter: int = 10,
+) -> np.ndarray:
+    """
+    Flag the BPM entries of an RDT file that are not outliers.
+
+    Modes
+    -----
+    "zscore"
+        Reject entries whose Z-score in AMP, REAL or IMAG reaches threshold, as
+        ``scipy.stats.zscore``.
+    "mad"
+        As "zscore", with the median as centre and the scaled median absolute
+        deviation (1.4826 * MAD) as spread, so that a few large outliers do not
+        mask each other.
+    "sigma_clip"
+        Repeat the "zscore" rejection with the mean and standard deviation of
+        the entries kept so far, until no more entries are rejected or after
+        max_iter passes.
+    "complex"
+        Reject entries whose distance in the complex plane from the median of
+        REAL and IMAG reaches threshold standard deviations, with the standard
+        deviation estimated from the median distance (median / sqrt(2 ln 2)).
+
+    Parameters
+    ----------
+    amp, real, imag : np.ndarray
+        AMP, REAL and IMAG columns, shape (n,).
     threshold : float, optional
-        Z-score threshold used to reject outliers (default: 3).
+        Rejection threshold in standard deviations (default: 3).
+    mode : str, optional
+        One of OUTLIER_MODES (default: "zscore").
+    max_iter : int, optional
+        Maximum number of passes of "sigma_clip" (default: 10).
 
     Returns
     -------
-    list[list[float]]
-        Filtered list of rows with outliers removed.
+    np.ndarray
+        Boolean mask, True for the entries to keep.
+
+    Raises
+    ------
+    ValueError
+        If the mode is unknown.
     """
-    data_np = np.array(data, dtype=object)
-    amp_values = data_np[:, 1].astype(float)
-    re_values = data_np[:, 2].astype(float)
-    im_values = data_np[:, 3].astype(float)
+    if mode not in OUTLIER_MODES:
+        msg = f"Unknown outlier mode '{mode}', expected one of {OUTLIER_MODES}."
+        raise ValueError(msg)
+    real = np.asarray(real, dtype=float)
+    keep = np.ones(real.size, dtype=bool)
+    if real.size == 0:
+        return keep
+    columns = (np.asarray(amp, dtype=float), real, np.asarray(imag, dtype=float))
+    # Work arrays reused for every column and pass
+    dev = np.empty(real.size)
+    passed = np.empty(real.size, dtype=bool)
+
+    def reject(column, centre, scale):
+        np.subtract(column, centre, out=dev)
+        np.abs(dev, out=dev)
+        np.divide(dev, scale, out=dev)
+        np.less(dev, threshold, out=passed)
+        np.logical_and(keep, passed, out=keep)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if mode == "zscore":
+            for column in columns:
+                reject(column, column.mean(), column.std())
+        elif mode == "mad":
+            for column in columns:
+                centre = np.median(column)
+                np.subtract(column, centre, out=dev)
+                np.abs(dev, out=dev)
+                reject(column, centre, MAD_SCALE * np.median(dev))
+        elif mode == "sigma_clip":
+            kept = keep.copy()
+            for _ in range(max_iter):
+                keep[:] = True
+                for column in columns:
+                    reject(column, column.mean(where=kept), column.std(where=kept))
+                if np.array_equal(keep, kept) or not keep.any():
+                    break
+                kept[:] = keep
+        else:
+            np.hypot(
+                real - np.median(real), columns[2] - np.median(columns[2]), out=dev
+            )
+            scale = np.median(dev) / np.sqrt(2 * np.log(2))
+            np.less(dev, threshold * scale, out=keep)
+    return keep
 
-    amp_zscores = zscore(amp_values)
-    re_zscores = zscore(re_values)
-    im_zscores = zscore(im_values)
 
-    return [
-        row
-        for i, row in enumerate(data)
-        if abs(amp_zscores[i]) < threshold
-        and abs(re_zscores[i]) < threshold
-        and abs(im_zscores[i]) < threshold
-    ]
+def filter_outliers(
+    data: list[list[float]] | RDTColumns, threshold: float = 3, mode: str = "zscore"
+):
+    """
+    Filter outliers from RDT data.
+
+    Parameters
+    ----------
+    data : list[list[float]] or RDTColumns
+        List of RDT rows, each row being [NAME, AMP, REAL, IMAG, ERRAMP], or
+        the equivalent columnar arrays.
+    threshold : float, optional
+        Rejection threshold in standard deviations (default: 3).
+    mode : str, optional
+        Outlier statistics, one of OUTLIER_MODES, see outlier_mask (default:
+        "zscore").
+
+    Returns
+    -------
+    list[list[float]] or RDTColumns
+        Filtered data with outliers removed, in the same form as the input.
+    """
+    if isinstance(data, RDTColumns):
+        keep = outlier_mask(data.amp, data.real, data.imag, threshold, mode)
+        return RDTColumns(*(column[keep] for column in data))
+
+    count = len(data)
+    amp, real, imag = (
+        np.fromiter((row[i] for row in data), dtype=float, count=count)
+        for i in (1, 2, 3)
+    )
+    keep = outlier_mask(amp, real, imag, threshold, mode)
+    return list(compress(data, keep.tolist()))
+
+
+def read_rdt_columns(
+    filepath: Path,
+    log_func: Callable[[str], None] = None,
+    cache: TFSCache | None = None,
+):
+    """
+    Read RDT data from a TFS file as columnar NumPy arrays.
+
+    Parameters
+    ----------
+    filepath : Path
+        Path to the TFS file to read.
+    log_func : Callable[[str], None], optional
+        Optional logging function to report issues (default: None).
+    cache : TFSCache, optional
+        Parsed-TFS cache to look the BPM columns up in before parsing the file,
+        and to store them in after parsing (default: None).
+
+    Returns
+    -------
+    tuple[RDTColumns, str] or None
+        If BPM data found: (columns, beam_no), where columns holds the NAME, AMP,
+        REAL, IMAG and ERRAMP arrays of the BPM rows and beam_no is the beam
+        identifier. If no BPM data found, returns None.
+    """
+    if cache is not None:
+        hit = cache.get(filepath, RDT_COLUMNS)
+        if hit is not None:
+            arrays, meta = hit
+            return RDTColumns(*(arrays[col] for col in RDT_COLUMNS)), meta["beam_no"]
+    arrays, headers = read_tfs_columns(
+        filepath, RDT_COLUMNS, name_filter="BPM", headers=("Command",)
+    )
+    beam_no = headers["Command"][-1]
+    if len(arrays["NAME"]) == 0:
+        if log_func:
+            log_func(f"No BPM data found in file: {filepath}")
+        else:
+            print(f"No BPM data found in file: {filepath}")
+        return None
+    columns = RDTColumns(
+        arrays["NAME"],
+        arrays["AMP"].astype(float),
+        arrays["REAL"].astype(float),
+        arrays["IMAG"].astype(float),
+        arrays["ERRAMP"].astype(float),
+    )
+    if cache is not None:
+        cache.put(filepath, dict(zip(RDT_COLUMNS, columns)), {"beam_no": beam_no})
+    return columns, beam_no
 
 
 def read_rdt_file(filepath: Path, log_func: Callable[[str], None] = None):
@@ -68,28 +309,11 @@ def read_rdt_file(filepath: Path, log_func: Callable[[str], None] = None):
         [NAME, AMP, REAL, IMAG, ERRAMP] rows and beam_no is the beam identifier.
         If no BPM data found, returns None.
     """
-    raw_data = []
-    rt = tfs.read(filepath)
-    beam_no = rt["Command"][-1]
-    rt_filtered = rt[rt["NAME"].str.contains("BPM")]
-    if rt_filtered.empty:
-        if log_func:
-            log_func(f"No BPM data found in file: {filepath}")
-        else:
-            print(f"No BPM data found in file: {filepath}")
+    result = read_rdt_columns(filepath, log_func)
+    if result is None:
         return None
-
-    for index, row in rt_filtered.iterrows():
-        raw_data.append(
-            [
-                str(row["NAME"]),
-                float(row["AMP"]),
-                float(row["REAL"]),
-                float(row["IMAG"]),
-                float(row["ERRAMP"]),
-            ]
-        )
-    return raw_data, beam_no
+    columns, beam_no = result
+    return columns_to_rows(columns), beam_no
 
 
 def ensure_trailing_slash(path: Path):
@@ -103,9 +327,10 @@ def ensure_trailing_slash(path: Path):
 
     Returns
     -------
-    Path or str
-        The input path with a trailing '/' appended if it was missing.
+    str
+        The input path as a string with a trailing '/' appended if it was missing.
     """
+    path = str(path)
     return path if path.endswith("/") else path + "/"
 
 
@@ -117,6 +342,9 @@ def readrdtdatafile(
     threshold: float = 3,
     sim: bool = False,
     log_func: Callable[[str], None] = None,
+    columnar: bool = False,
+    cache: TFSCache | None = None,
+    outlier_mode: str = "zscore",
 ):
     """
     Read RDT data file(s), optionally in simulation mode, and filter outliers.
@@ -132,55 +360,100 @@ def readrdtdatafile(
     rdtfolder : str
         Subfolder name inside the rdt folder.
     threshold : float, optional
-        Z-score threshold for outlier filtering (default: 3).
+        Threshold for outlier filtering, in standard deviations (default: 3).
     sim : bool, optional
-        If True, treat cfile as the direct path to a tfs-readable file (default: False).
+        If True and cfile is a file, read it as a simulation output holding the
+        complex F{rdt} column, see read_sim_rdt_columns (default: False).
     log_func : Callable[[str], None], optional
         Optional logging function for error messages.
+    columnar : bool, optional
+        If True, return the filtered data as RDTColumns instead of a list of
+        rows (default: False).
+    cache : TFSCache, optional
+        Parsed-TFS cache used when reading the OMC3 RDT file (default: None).
+    outlier_mode : str, optional
+        Outlier statistics, one of OUTLIER_MODES, see outlier_mask (default:
+        "zscore").
 
     Returns
     -------
-    tuple[list[list[float]], str]
+    tuple[list[list[float]] | RDTColumns, str]
         Filtered RDT data and beam number.
     """
     # Ensure cfile and rdtfolder have trailing slashes
     cfile2 = ensure_trailing_slash(cfile)
     rdtfolder = ensure_trailing_slash(rdtfolder)
     filepath = f"{cfile2}rdt/{rdtfolder}f{rdt}_{rdt_plane}.tfs"
-    if sim:
-        try:
-            df = tfs.read(cfile)
-            beam_no = df["Command"][-1]
-            df_filtered = df[df["NAME"].str.contains("BPM")]
-            if df_filtered.empty:
-                if log_func:
-                    log_func(f"No BPM data found in file: {filepath}")
-                else:
-                    print(f"No BPM data found in file: {filepath}")
-                return None
-            raw_data = []
-            for index, row in df_filtered.iterrows():
-                row["REAL"] = np.real(row[f"F{rdt}"])
-                row["IMAG"] = np.imag(row[f"F{rdt}"])
-                row["AMP"] = np.abs(row[f"F{rdt}"])
-                raw_data.append(
-                    [
-                        str(row["NAME"]),
-                        float(row["AMP"]),
-                        float(row["REAL"]),
-                        float(row["IMAG"]),
-                        0,
-                    ]
-                )
-        except (FileNotFoundError, IsADirectoryError):
-            raw_data, beam_no = read_rdt_file(filepath, log_func)
+    if sim and path_is_file(cfile):
+        result = read_sim_rdt_columns(cfile, rdt, log_func)
+        if result is None:
+            return None
+        raw_data, beam_no = result
+        if not columnar:
+            raw_data = columns_to_rows(raw_data)
     else:
-        raw_data, beam_no = read_rdt_file(filepath, log_func)
-    return filter_outliers(raw_data, threshold), beam_no
+        raw_data, beam_no = _read_rdt(filepath, log_func, columnar, cache)
+    return filter_outliers(raw_data, threshold, outlier_mode), beam_no
+
+
+def read_sim_rdt_columns(
+    filepath: Path, rdt: str, log_func: Callable[[str], None] = None
+) -> tuple[RDTColumns, str] | None:
+    """
+    Read the BPM rows of a simulation output holding a complex F{rdt} column.
+
+    Parameters
+    ----------
+    filepath : Path
+        Path to the TFS file, with a "Command" header ending in the beam number.
+    rdt : str
+        RDT identifier (e.g., "1020").
+    log_func : Callable[[str], None], optional
+        Optional logging function for error messages.
+
+    Returns
+    -------
+    tuple[RDTColumns, str] or None
+        (columns, beam_no) with AMP, REAL and IMAG taken from the complex RDT
+        and ERRAMP set to zero, or None if the file holds no BPM rows.
+    """
+    column = f"F{rdt}"
+    arrays, headers = read_tfs_columns(
+        filepath, ("NAME", column), name_filter="BPM", headers=("Command",)
+    )
+    if arrays["NAME"].size == 0:
+        msg = f"No BPM data found in file: {filepath}"
+        if log_func:
+            log_func(msg)
+        else:
+            print(msg)
+        return None
+    values = arrays[column].astype(complex)
+    columns = RDTColumns(
+        arrays["NAME"],
+        np.abs(values),
+        values.real.copy(),
+        values.imag.copy(),
+        np.zeros(values.size),
+    )
+    return columns, headers["Command"][-1]
+
+
+def _read_rdt(
+    filepath: Path,
+    log_func: Callable[[str], None],
+    columnar: bool,
+    cache: TFSCache | None,
+):
+    result = read_rdt_columns(filepath, log_func, cache)
+    if result is None or columnar:
+        return result
+    columns, beam_no = result
+    return columns_to_rows(columns), beam_no
 
 
 def update_bpm_data(
-    bpmdata: dict, data: list[list[float]], key: str, knob_setting: float
+    bpmdata: dict, data: list[list[float]] | RDTColumns, key: str, knob_setting: float
 ):
     """
     Update bpmdata dictionary with new measurements.
@@ -189,8 +462,9 @@ def update_bpm_data(
     ----------
     bpmdata : dict
         Dictionary keyed by BPM name holding measurement lists.
-    data : list[list[float]]
-        List of BPM rows: [NAME, AMP, REAL, IMAG, ERRAMP].
+    data : list[list[float]] or RDTColumns
+        List of BPM rows: [NAME, AMP, REAL, IMAG, ERRAMP], or the equivalent
+        columnar arrays.
     key : str
         Key under which to append the new entries (e.g., "ref" or "data").
     knob_setting : float
@@ -200,11 +474,115 @@ def update_bpm_data(
     -------
     None
     """
+    if isinstance(data, RDTColumns):
+        data = zip(
+            data.names.tolist(),
+            data.amp.tolist(),
+            data.real.tolist(),
+            data.imag.tolist(),
+            data.erramp.tolist(),
+        )
     for entry in data:
         name, amp, re, im, amp_err = entry
         bpmdata[name][key].append([knob_setting, amp, re, im, amp_err])
 
 
+def _read_analysis_folder(
+    item: tuple[Path, str],
+    beam: str,
+    rdts: list[tuple[str, str, str]],
+    sim: bool,
+    cache: TFSCache | None,
+    log_func: Callable[[str], None] | None,
+    buffer_log: bool,
+    threshold: float = 3,
+    outlier_mode: str = "zscore",
+):
+    """
+    Read the filtered RDT data of one results folder.
+
+    Parameters
+    ----------
+    item : tuple[Path, str]
+        (folder, role) where role is "reference" or "measurement".
+    rdts : list[tuple[str, str, str]]
+        (rdt, rdt_plane, rdtfolder) of each RDT file to read from the folder.
+    buffer_log : bool
+        If True, collect the log messages instead of passing them to log_func,
+        so that concurrent reads can report them in folder order. log_func may
+        then be None, which is required when running in a worker process.
+
+    Other parameters are as in getrdt_omc3.
+
+    Returns
+    -------
+    tuple
+        (columns, messages, error) where columns holds one entry per RDT, or is
+        None, messages is the list of buffered log calls, and error is the
+        RuntimeError raised for this folder or None.
+    """
+    folder, role = item
+    messages = []
+    log = log_func
+    if buffer_log:
+
+        def log(*args):
+            messages.append(args)
+
+    columns = []
+    try:
+        for rdt, rdt_plane, rdtfolder in rdts:
+            try:
+                cdat, beam_no = readrdtdatafile(
+                    folder,
+                    rdt,
+                    rdt_plane,
+                    rdtfolder,
+                    threshold,
+                    sim=sim,
+                    log_func=log,
+                    columnar=True,
+                    cache=cache,
+                    outlier_mode=outlier_mode,
+                )
+            except FileNotFoundError as e:
+                msg = f"RDT file not found in {role} folder: {folder}."
+                if log:
+                    log(msg)
+                raise RuntimeError(msg) from e
+            except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+                msg = f"Error reading RDT file in {role} folder {folder}: {e}"
+                if log:
+                    log(msg)
+                raise RuntimeError(msg) from e
+            if beam_no != beam[-1]:
+                msg = f"Input is for LHCB{beam_no} not LHCB{beam[-1]}."
+                if log:
+                    log(msg)
+                raise RuntimeError(msg)
+            columns.append(cdat)
+    except RuntimeError as e:
+        return None, messages, e
+    return columns, messages, None
+
+
+def _report_folder(
+    messages: list[tuple],
+    error: RuntimeError | None,
+    log_func: Callable[[str], None] | None,
+):
+    """
+    Replay buffered log messages of a folder and re-raise its error, if any.
+    """
+    for args in messages:
+        if log_func:
+            log_func(*args)
+        else:
+            print(args[0])
+    if error is not None:
+        raise error
+
+
 def getrdt_omc3(
     ldb: None | Callable[[str], None],
     beam: str,
@@ -220,6 +598,14 @@ def getrdt_omc3(
     propfile: str,
     threshold: float = 3,
     log_func: Callable[[str], None] = None,
+    cache: TFSCache | None = None,
+    max_workers: int | None = None,
+    executor: str = "thread",
+    chunksize: int | None = None,
+    outlier_mode: str = "zscore",
+    bad_bpms: BadBPMSet | None = None,
+    knob_cache: KnobCache | None = None,
+    knob_resolver: KnobResolver | None = None,
 ):
     """
     Read, validate and assemble RDT measurement data for OMC3 analysis.
@@ -231,7 +617,7 @@ def getrdt_omc3(
     Parameters
     ----------
     ldb : None or Callable[[str], None]
-        Timber statetracker or None (used by get_analysis_knobsetting).
+        Timber statetracker or None (used by KnobResolver).
     beam : str
         Beam identifier (e.g., "LHCB1" or "LHCB2").
     modelbpmlist : list[list[str]]
@@ -255,9 +641,42 @@ def getrdt_omc3(
     propfile : str
         Path to simulation property mapping file (used when sim is True).
     threshold : float, optional
-        Z-score threshold for outlier filtering (default: 3).
+        Threshold for outlier filtering, in standard deviations (default: 3).
     log_func : Callable[[str], None], optional
         Optional logging function.
+    cache : TFSCache, optional
+        Parsed-TFS cache for the RDT files, so repeated runs over the same
+        folders skip parsing (default: None).
+    max_workers : int, optional
+        Number of workers reading the reference and measurement folders
+        concurrently. Results are merged in folder order, so the output is
+        identical to the serial path (default: None, serial for threads and one
+        worker per CPU for processes).
+    executor : str, optional
+        "thread" to read folders in a thread pool, "process" to parse and
+        filter the RDT files in a process pool, or "serial" (default:
+        "thread"). Worker processes return compact column arrays. With a
+        single CPU or worker, the folders are read serially. The knob settings
+        of all folders are resolved together in the background while the
+        folders are read, see knob_resolver.
+    chunksize : int, optional
+        Number of folders sent to a worker at a time (default: None, chosen
+        from the number of folders and workers).
+    outlier_mode : str, optional
+        Outlier statistics applied to each RDT file, one of OUTLIER_MODES, see
+        outlier_mask (default: "zscore").
+    bad_bpms : BadBPMSet, optional
+        BPMs to leave out of the dataset, see resolve_bad_bpms. The set is
+        recorded under "bad_bpms" in the metadata (default: None, keep every
+        BPM).
+    knob_cache : KnobCache, optional
+        Persistent store of knob settings, so that only kicks resolved for the
+        first time are queried from the logging service (default: None).
+    knob_resolver : KnobResolver, optional
+        Resolver of the folders' knob settings, setting the concurrency,
+        timeout and retries of the knob queries; it replaces ldb and
+        knob_cache (default: None, a serial KnobResolver over ldb and
+        knob_cache).
 
     Returns
     -------
@@ -273,6 +692,137 @@ def getrdt_omc3(
     RuntimeError
         On missing files, inconsistent beams, or if no BPM data could be assembled.
     """
+    results = _getrdts_omc3(
+        ldb,
+        beam,
+        modelbpmlist,
+        [bpmdata],
+        ref,
+        flist,
+        knob,
+        [(rdt, rdt_plane, rdtfolder)],
+        sim,
+        propfile,
+        log_func,
+        cache,
+        max_workers,
+        executor,
+        chunksize,
+        threshold,
+        outlier_mode,
+        bad_bpms,
+        knob_cache,
+        knob_resolver,
+    )
+    return None if results is None else results[0]
+
+
+def getrdts_omc3(
+    ldb: None | Callable[[str], None],
+    beam: str,
+    modelbpmlist: list[list[str]],
+    bpmdata: dict,
+    ref: Path,
+    flist: list[Path],
+    knob: str,
+    rdts: list[tuple[str, str]],
+    sim: bool,
+    propfile: str,
+    log_func: Callable[[str], None] = None,
+    cache: TFSCache | None = None,
+    max_workers: int | None = None,
+    executor: str = "thread",
+    chunksize: int | None = None,
+    threshold: float = 3,
+    outlier_mode: str = "zscore",
+    bad_bpms: BadBPMSet | None = None,
+    knob_cache: KnobCache | None = None,
+    knob_resolver: KnobResolver | None = None,
+):
+    """
+    Read, validate and assemble the data of several RDTs in a single pass.
+
+    Each folder is visited once: its knob setting is resolved once and all the
+    requested RDT files are read from it. The result for each RDT is the same
+    as a separate getrdt_omc3 call.
+
+    Parameters
+    ----------
+    bpmdata : dict
+        Dictionary keyed by BPM name holding at least the "s" position, as
+        returned by getmodelbpms. It is not modified: each RDT is collected in
+        its own copy.
+    rdts : list[tuple[str, str]]
+        (rdt, rdt_plane) pairs, e.g. [("0030", "y"), ("1002", "x")]. The RDT
+        subfolder is derived with rdt_to_order_and_type.
+
+    Other parameters are as in getrdt_omc3.
+
+    Returns
+    -------
+    list[dict] or None
+        One dataset per requested RDT, in the order of rdts, each as returned by
+        getrdt_omc3. None if the beam does not match the model.
+
+    Raises
+    ------
+    RuntimeError
+        On missing files, inconsistent beams, or if no BPM data could be assembled
+        for one of the RDTs.
+    """
+    bpmdatas = [
+        {
+            bpm: {"s": entry["s"], "ref": [], "data": []}
+            for bpm, entry in bpmdata.items()
+        }
+        for _ in rdts
+    ]
+    return _getrdts_omc3(
+        ldb,
+        beam,
+        modelbpmlist,
+        bpmdatas,
+        ref,
+        flist,
+        knob,
+        [(rdt, rdt_plane, rdt_to_order_and_type(rdt)) for rdt, rdt_plane in rdts],
+        sim,
+        propfile,
+        log_func,
+        cache,
+        max_workers,
+        executor,
+        chunksize,
+        threshold,
+        outlier_mode,
+        bad_bpms,
+        knob_cache,
+        knob_resolver,
+    )
+
+
+def _getrdts_omc3(
+    ldb: None | Callable[[str], None],
+    beam: str,
+    modelbpmlist: list[list[str]],
+    bpmdatas: list[dict],
+    ref: Path,
+    flist: list[Path],
+    knob: str,
+    rdts: list[tuple[str, str, str]],
+    sim: bool,
+    propfile: str,
+    log_func: Callable[[str], None],
+    cache: TFSCache | None,
+    max_workers: int | None,
+    executor: str,
+    chunksize: int | None,
+    threshold: float,
+    outlier_mode: str,
+    bad_bpms: BadBPMSet | None,
+    knob_cache: KnobCache | None,
+    knob_resolver: KnobResolver | None,
+):
     beam_no = modelbpmlist[0][-1]
     if beam[-1] != beam_no:
         msg = f"Beam number {beam} does not match the model BPM list."
@@ -281,79 +831,86 @@ def getrdt_omc3(
         else:
             print(msg)
         return None
-    mapping_dict = {}
-    if sim:
-        mapping_dict = csv_to_dict(propfile)
-
-    # Search for ref in mapping_dict and retrieve knob value
+    mapping = load_sim_mapping(propfile) if sim else None
     refk = None
-    if sim and mapping_dict:
-        for entry in mapping_dict:
-            regex_str = entry.get("MATCH", "")
-            if re.fullmatch(rf"^{regex_str}$", str(Path(ref).name)):
-                refk = float(entry.get("KNOB", 0))  # Default to 0 if "KNOB" is missing
-                if refk is None:
-                    msg = f"Reference knob for {ref} not found in mapping dictionary."
-                    if log_func:
-                        log_func(msg)
-                    raise RuntimeError(msg)
-                break
-    else:  # Fallback to original method if not found
-        refk = get_analysis_knobsetting(ldb, knob, ref, log_func)
-        if refk is None:
-            msg = f"Reference knob {ref} not found."
+    ksettings = None
+    if mapping:
+        # Every folder is matched once; unmatched and ambiguous folders are
+        # reported together
+        sim_match = mapping.resolve([ref, *flist])
+        for msg in sim_match.report(f"mapping dictionary {propfile}"):
             if log_func:
                 log_func(msg)
-            raise RuntimeError(msg)
-    try:
-        refdat, beam_no = readrdtdatafile(
-            ref, rdt, rdt_plane, rdtfolder, sim=sim, log_func=log_func
-        )
-        if beam_no != beam[-1]:
-            log_func(f"Input is for LHCB{beam_no} not LHCB{beam[-1]}.")
-            raise RuntimeError(f"Input is for LHCB{beam_no} not LHCB{beam[-1]}.")
-    except FileNotFoundError:
-        msg = f"RDT file not found in reference folder: {ref}."
-        if log_func:
-            log_func(msg)
-        raise RuntimeError(msg)
-    if refdat is not None and refk is not None:
-        update_bpm_data(bpmdata, refdat, "ref", refk)
-
-    updated_count = 0
-    ksetting = None
-    for f in flist:
-        if sim and mapping_dict:
-            entry = next(
-                (
-                    e
-                    for e in mapping_dict
-                    if re.search(rf"^{e.get('MATCH', '')}$", str(Path(f).name))
+            else:
+                print(msg)
+        ksettings = sim_match.settings
+        refk = ksettings[0]
+    folders = [(ref, "reference")] + [(f, "measurement") for f in flist]
+    executor, workers = resolve_executor(executor, max_workers, len(folders))
+    if executor != "process":
+        # Compressed tarballs have no random access: the files of all folders
+        # are read in one pass in archive order instead of seeking back for
+        # each concurrent or out-of-order read
+        prefetch_paths(
+            f"{ensure_trailing_slash(folder)}{name}"
+            for folder, _ in folders
+            for name in [
+                *([] if mapping else ["command.run"]),
+                *(
+                    f"rdt/{ensure_trailing_slash(rdtfolder)}f{rdt}_{rdt_plane}.tfs"
+                    for rdt, rdt_plane, rdtfolder in rdts
                 ),
-                None,
-            )
-            if entry is not None:
-                ksetting = float(entry.get("KNOB", 0))
+            ]
+        )
+    resolution = None
+    if not mapping:
+        resolver = knob_resolver or KnobResolver(ldb, knob, knob_cache)
+        # The knob settings are resolved while the RDT files are read
+        resolution = resolver.submit([ref, *flist])
+    # GUI callbacks cannot be sent to worker processes
+    in_process = executor == "process"
+    read_folder = partial(
+        _read_analysis_folder,
+        beam=beam,
+        rdts=rdts,
+        sim=sim,
+        cache=cache,
+        log_func=None if in_process else log_func,
+        buffer_log=in_process or bool(log_func and workers > 1),
+        threshold=threshold,
+        outlier_mode=outlier_mode,
+    )
+    results = map_ordered(read_folder, folders, workers, executor, chunksize)
+
+    refdats, messages, error = next(results)
+    _report_folder(messages, error, log_func)
+    if resolution is not None:
+        resolution = resolution.result()
+        # Every unresolved folder is reported at once
+        report = resolution.report()
+        for msg in [*resolution.messages, *([report] if report else [])]:
+            if log_func:
+                log_func(msg)
             else:
-                msg = f"Measurement knob for {f} not found in mapping dictionary"
-                if log_func:
-                    log_func(msg)
-        else:  # Fallback to original method if not found
-            ksetting = get_analysis_knobsetting(ldb, knob, f, log_func)
-        try:
-            cdat, beam_no = readrdtdatafile(
-                f, rdt, rdt_plane, rdtfolder, sim=sim, log_func=log_func
-            )
-            if beam_no != beam[-1]:
-                log_func(f"Input is for LHCB{beam_no} not LHCB{beam[-1]}.")
-                raise RuntimeError(f"Input is for LHCB{beam_no} not LHCB{beam[-1]}.")
-        except FileNotFoundError:
-            msg = f"RDT file not found in measurement folder: {f}."
+                print(msg)
+        ksettings = resolution.settings
+        refk = ksettings[0]
+        if refk is None:
+            msg = f"Reference knob {ref} not found."
             if log_func:
                 log_func(msg)
             raise RuntimeError(msg)
-        if cdat is not None and ksetting is not None:
-            update_bpm_data(bpmdata, cdat, "data", ksetting)
+    if refk is not None:
+        for bpmdata, refdat in zip(bpmdatas, refdats):
+            update_bpm_data(bpmdata, refdat, "ref", refk)
+
+    updated_count = 0
+    for k, (cdats, messages, error) in enumerate(results, start=1):
+        ksetting = ksettings[k]
+        _report_folder(messages, error, log_func)
+        if ksetting is not None:
+            for bpmdata, cdat in zip(bpmdatas, cdats):
+                update_bpm_data(bpmdata, cdat, "data", ksetting)
             updated_count += 1
 
     # If no measurement folder updated, throw error and return None
@@ -364,9 +921,53 @@ def getrdt_omc3(
         raise RuntimeError(msg)
         return None
 
+    ref = str(Path(ref).resolve())
+    flist = [str(Path(f).resolve()) for f in flist]
+    extra = {}
+    if bad_bpms is not None:
+        # Applied once here: excluded BPMs never enter the assembled datasets
+        registry = get_bpm_registry(modelbpmlist, bad_bpms.bpms)
+        modelbpmlist = list(compress(modelbpmlist, (~registry.bad).tolist()))
+        extra["bad_bpms"] = bad_bpms.to_metadata()
+        if log_func:
+            log_func(
+                f"Excluding {int(registry.bad.sum())} BPMs of the bad-BPM list "
+                f"({bad_bpms.source}, version {bad_bpms.version})."
+            )
+    return [
+        _intersect_bpm_data(
+            bpmdata,
+            modelbpmlist,
+            len(flist),
+            {
+                "beam": beam,
+                "ref": ref,
+                "file_list": flist,
+                "rdt": rdt,
+                "rdt_plane": rdt_plane,
+                "knob": knob,
+                **extra,
+            },
+            log_func,
+        )
+        for bpmdata, (rdt, rdt_plane, _) in zip(bpmdatas, rdts)
+    ]
+
+
+def _intersect_bpm_data(
+    bpmdata: dict,
+    modelbpmlist: list[str],
+    nfiles: int,
+    metadata: dict,
+    log_func: Callable[[str], None] | None,
+):
+    """
+    Build the knob-sorted differences to the reference of the BPMs present in
+    every folder.
+    """
     intersected_bpm_data = {}
     for bpm in modelbpmlist:
-        if len(bpmdata[bpm]["ref"]) != 1 or len(bpmdata[bpm]["data"]) != len(flist):
+        if len(bpmdata[bpm]["ref"]) != 1 or len(bpmdata[bpm]["data"]) != nfiles:
             continue
 
         s = bpmdata[bpm]["s"]
@@ -392,19 +993,7 @@ def getrdt_omc3(
         if log_func:
             log_func(msg)
         raise RuntimeError(msg)
-    ref = str(Path(ref).resolve())
-    flist = [str(Path(f).resolve()) for f in flist]
-    return {
-        "metadata": {
-            "beam": beam,
-            "ref": ref,
-            "file_list": flist,
-            "rdt": rdt,
-            "rdt_plane": rdt_plane,
-            "knob": knob,
-        },
-        "data": intersected_bpm_data,
-    }
+    return {"metadata": metadata, "data": intersected_bpm_data}
 
 
 # def polyfunction(x: float, c: float, m: float, n: float) -> float:
@@ -494,39 +1083,43 @@ def fitdatanoerrors(
     return popt, pcov, perr
 
 
-def fit_bpm(fulldata: dict, order: int = 2) -> dict:
+def fit_bpm(fulldata: dict, order: int = 2, weighting: str = "none") -> dict:
     """
     Fit real and imaginary components of BPM RDT differences to a polynomial.
 
+    All BPMs are fitted in one batched linear least-squares solve, see
+    fit_dataset; the results match a curve_fit of each BPM and component. Fits
+    go through the fit cache, so refitting unchanged data costs only a hash.
+
     Parameters
     ----------
     fulldata : dict
         Dictionary with 'data' key containing BPM diffdata arrays.
     order : int, optional
         Polynomial order for fitting (default: 2).
+    weighting : str, optional
+        "none" for unweighted fits (as fitdatanoerrors) or "erramp" to weight
+        each point by its ERRAMP (as fitdata) (default: "none").
 
     Returns
     -------
     dict
-        Input fulldata updated with 'fitdata' entries per BPM and returned.
+        Input fulldata updated with 'fitdata' entries per BPM and returned. The
+        order and weighting are recorded under metadata["fit"].
+
+    Raises
+    ------
+    ValueError
+        If the weighting mode is unknown, or if weighting by ERRAMP and some
+        errors are not positive (e.g. simulation data).
     """
-    polyfunction = make_polyfunction(order)
     data = fulldata["data"]
+    fits = fit_bpms(data, order, weighting)
     for bpm in data:
-        diffdata = data[bpm]["diffdata"]
-        xing = []
-        re = []
-        im = []
-        re_err = []
-        im_err = []
-        for x in range(len(diffdata)):
-            xing.append(diffdata[x][0])
-            re.append(diffdata[x][1])
-            im.append(diffdata[x][2])
-        re_opt, re_cov, re_err = fitdatanoerrors(xing, re, polyfunction, order)
-        im_opt, im_cov, im_err = fitdatanoerrors(xing, im, polyfunction, order)
-        data[bpm]["fitdata"] = [re_opt, re_cov, re_err, im_opt, im_cov, im_err]
+        data[bpm]["fitdata"] = fits[bpm]
     fulldata["data"] = data
+    if "metadata" in fulldata:
+        fulldata["metadata"]["fit"] = {"order": order, "weighting": weighting}
     return fulldata
 
 
@@ -542,17 +1135,10 @@ def arc_bpm_check(bpm: str) -> bool:
     Returns
     -------
     bool
-        True if BPM is an arc BPM, False otherwise.
+        True if BPM is an arc BPM, False otherwise. See parse_bpm_name; for
+        whole datasets use a BPMRegistry.
     """
-    bpmtype = bpm.partition(".")[0]
-    if bpmtype != "BPM":
-        is_arc_bpm = False
-    else:
-        bpmindex = (
-            bpm.partition(".")[2].rpartition(".")[0].partition("L")[0].partition("R")[0]
-        )
-        is_arc_bpm = int(bpmindex) >= 10
-    return is_arc_bpm
+    return parse_bpm_name(bpm).arc
 
 
 def bad_bpm_check(bpm: str) -> bool:
@@ -569,60 +1155,48 @@ def bad_bpm_check(bpm: str) -> bool:
     bool
         True if the BPM is in the exclude list, False otherwise.
     """
-    badbpmb1 = ["BPM.13L2.B1"]
-    badbpmb2 = ["BPM.25R3.B2", "BPM.26R3.B2"]
-    badbpm = False
-    for b in badbpmb1:
-        if bpm == b:
-            badbpm = True
-            break
-    for b in badbpmb2:
-        if bpm == b:
-            badbpm = True
-            break
-    return badbpm
+    return bpm in BAD_BPMS
 
 
-def calculate_avg_rdt_shift(data: dict) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+def calculate_avg_rdt_shift(
+    data: dict, metadata: dict | None = None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     Calculate the average RDT shift and standard deviation over BPMs for given data.
 
+    Only arc BPMs that are not flagged as bad are averaged. The crossing angles
+    are those measured by the first BPM; for each, every entry of the averaged
+    BPMs at that angle contributes once, and BPMs without an entry there are
+    left out.
+
     Parameters
     ----------
     data : dict
         Dictionary of BPM entries with 'diffdata' arrays.
+    metadata : dict, optional
+        Metadata of the dataset, selecting the bad BPMs, see excluded_bpms
+        (default: None, exclude BAD_BPMS).
 
     Returns
     -------
     tuple[np.ndarray, np.ndarray, np.ndarray]
         (xing, avg_amplitudes, std_deviations) arrays for the measured crossing angles.
     """
-    xing = []  # Get the list of crossing angles measured
-    for b in data:
-        diffdata = data[b]["diffdata"]
-        for x in range(len(diffdata)):
-            xing.append(diffdata[x][0])
-        break
-
-    ampdat = []
-    stddat = []
-    for x in xing:
-        toavg = []
-        for b in data:
-            if not arc_bpm_check(b) or bad_bpm_check(b):
-                continue
-            diffdata = data[b]["diffdata"]
-            for y in range(len(diffdata)):
-                if diffdata[y][0] == x:
-                    re = diffdata[y][1]
-                    im = diffdata[y][2]
-                    amp = np.sqrt(re**2 + im**2)
-                    toavg.append(amp)
-        avg_rdt_shift = np.mean(np.array(toavg))
-        avg_rdt_shift_err = np.std(np.array(toavg))
-        ampdat.append(avg_rdt_shift)
-        stddat.append(avg_rdt_shift_err)
-
+    if not data:
+        return np.array([]), np.array([]), np.array([])
+    xing = [row[0] for row in next(iter(data.values()))["diffdata"]]
+    averaged = {bpm: data[bpm] for bpm in averaged_bpms(data, excluded_bpms(metadata))}
+    dataset = RDTDataset.from_dict({"data": averaged})
+    amp = np.sqrt(dataset.re**2 + dataset.im**2)
+
+    # Entries are taken BPM by BPM, in diffdata order, as in a scan of the rows
+    stats = {}
+    for x in dict.fromkeys(xing):
+        columns = dataset.knobs == x
+        toavg = amp[:, columns][dataset.mask[:, columns]]
+        stats[x] = (np.mean(toavg), np.std(toavg))
+    ampdat = [stats[x][0] for x in xing]
+    stddat = [stats[x][1] for x in xing]
     return np.array(xing), np.array(ampdat), np.array(stddat)
 
 
@@ -821,7 +1395,8 @@ def getrdt_sim(
     rdtfolder = rdtfolder if rdtfolder.endswith("/") else rdtfolder + "/"
     try:
         ref = ref if ref.endswith("/") else ref + "/"
-        refdat = tfs.read(f"{ref}rdt/{rdtfolder}f{rdt}_{rdt_plane}.tfs")
+        with local_path(f"{ref}rdt/{rdtfolder}f{rdt}_{rdt_plane}.tfs") as path:
+            refdat = tfs.read(path)
         refdat = refdat[refdat["NAME"].str.contains("BPM")]
     except FileNotFoundError:
         msg = f"RDT file not found in reference folder: {ref}."
@@ -829,9 +1404,10 @@ def getrdt_sim(
             log_func(msg)
         raise RuntimeError(msg)
     if refdat is not None:
+        averaged = set(averaged_bpms(refdat["NAME"]))
         for index, entry in refdat.iterrows():
             bpm = entry["NAME"]
-            if not arc_bpm_check(bpm) or bad_bpm_check(bpm):
+            if bpm not in averaged:
                 continue
             bpmlist.append(bpm)
             bpmdata[bpm] = {}
@@ -849,7 +1425,8 @@ def getrdt_sim(
     # Read the measurement data
     try:
         file = file if file.endswith("/") else file + "/"
-        cdat = tfs.read(f"{file}rdt/{rdtfolder}f{rdt}_{rdt_plane}.tfs")
+        with local_path(f"{file}rdt/{rdtfolder}f{rdt}_{rdt_plane}.tfs") as path:
+            cdat = tfs.read(path)
         cdat = cdat[cdat["NAME"].str.contains("BPM")]
     except FileNotFoundError:
         msg = f"RDT file not found in measurement folder: {file}."
@@ -857,9 +1434,10 @@ def getrdt_sim(
             log_func(msg)
         raise RuntimeError(msg)
     if cdat is not None:
+        averaged = set(averaged_bpms(cdat["NAME"]))
         for index, entry in cdat.iterrows():
             bpm = entry["NAME"]
-            if not arc_bpm_check(bpm) or bad_bpm_check(bpm):
+            if bpm not in averaged:
                 continue
             bpmdata[bpm]["data"].append(
                 [
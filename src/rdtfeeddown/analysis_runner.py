@@ -9,13 +9,24 @@ from qtpy.QtWidgets import (
     QWidget,
 )
 
-from rdtfeeddown.analysis import getrdt_omc3, getrdt_sim, group_datasets
+from rdtfeeddown.analysis import (
+    fit_bpm,
+    getrdt_omc3,
+    getrdt_sim,
+    getrdts_omc3,
+    group_datasets,
+)
+from rdtfeeddown.bad_bpms import BadBPMSet, resolve_bad_bpms
 from rdtfeeddown.data_handler import (
     load_rdtdata,
     save_b1_rdtdata,
     save_b2_rdtdata,
     save_rdtdata,
 )
+from rdtfeeddown.fitcache import FitCache, default_fit_cache_dir, set_fit_cache
+from rdtfeeddown.knob_cache import KnobCache
+from rdtfeeddown.knobs import KnobResolver
+from rdtfeeddown.tfs_cache import DEFAULT_MAX_BYTES, TFSCache
 from rdtfeeddown.utils import (
     getmodelbpms,
     initialize_statetracker,
@@ -129,13 +140,44 @@ def handle_beam_analysis(
     simulation_checkbox: bool = None,
     simulation_file: Path = None,
     log_func: callable = None,
+    cache: TFSCache = None,
+    max_workers: int = None,
+    executor: str = "thread",
+    rdts: list[tuple[str, str]] = None,
+    threshold: float = 3,
+    outlier_mode: str = "zscore",
+    bad_bpms: BadBPMSet = None,
+    knob_cache: KnobCache = None,
+    knob_resolver: KnobResolver = None,
 ):
     if parent:
         simulation_checkbox = parent.simulation_checkbox.isChecked()
         simulation_file = parent.simulation_file_entry.text()
         log_func = parent.log_error
     if beam_model and beam_folders:
-        modelbpmlist, bpmdata = getmodelbpms(beam_model)
+        modelbpmlist, bpmdata = getmodelbpms(beam_model, cache)
+        if rdts:
+            return getrdts_omc3(
+                ldb,
+                beam_label,
+                modelbpmlist,
+                bpmdata,
+                beam_reffolder,
+                beam_folders,
+                knob,
+                rdts,
+                simulation_checkbox,
+                simulation_file,
+                log_func=log_func,
+                cache=cache,
+                max_workers=max_workers,
+                executor=executor,
+                threshold=threshold,
+                outlier_mode=outlier_mode,
+                bad_bpms=bad_bpms,
+                knob_cache=knob_cache,
+                knob_resolver=knob_resolver,
+            )
         return getrdt_omc3(
             ldb,
             beam_label,
@@ -149,7 +191,15 @@ def handle_beam_analysis(
             rdt_folder,
             simulation_checkbox,
             simulation_file,
+            threshold,
             log_func=log_func,
+            cache=cache,
+            max_workers=max_workers,
+            executor=executor,
+            outlier_mode=outlier_mode,
+            bad_bpms=bad_bpms,
+            knob_cache=knob_cache,
+            knob_resolver=knob_resolver,
         )
     return None
 
@@ -279,11 +329,77 @@ def run_analysis(parent=None, **kwargs):
         Output filename for LHCB1.
     b2filename : str or Path
         Output filename for LHCB2.
+    tfs_cache : bool or str or Path
+        Cache parsed RDT files on disk; True uses the default cache directory,
+        a path selects the cache directory (default: False).
+    tfs_cache_max_bytes : int
+        Size cap of the parsed-TFS cache in bytes (default: 512 MiB).
+    max_workers : int
+        Number of workers reading the measurement folders concurrently
+        (default: None, serial for threads and one per CPU for processes).
+    executor : str
+        "thread", "process" or "serial" (default: "thread"). Use "process" for
+        scans with many folders, where parsing is CPU bound.
+    rdts : list[tuple[str, str]]
+        (rdt, rdt_plane) pairs analysed in a single pass over the folders,
+        replacing rdt, rdt_plane and rdt_folder. Each dataset is saved to the
+        output filename with "_f{rdt}_{rdt_plane}" appended to its stem.
+    fit_order : int
+        If given, fit each BPM with a polynomial of this order before saving,
+        see fit_bpm (default: None, save the data without fits).
+    fit_weighting : str
+        Weighting of the saved fits, "none" or "erramp" (default: "none").
+    fit_cache : bool or str or Path
+        Store the BPM fits on disk and reuse them in later runs and plots;
+        True uses the default cache directory, a path selects the cache
+        directory. The cache is installed as the default fit cache, see
+        set_fit_cache (default: False, fits are cached in memory only).
+    outlier_threshold : float
+        Outlier rejection threshold in standard deviations (default: 3).
+    outlier_mode : str
+        Outlier statistics applied to each RDT file: "zscore", "mad",
+        "sigma_clip" or "complex", see outlier_mask (default: "zscore").
+    bad_bpm_file : str or Path
+        Versioned bad-BPM list whose BPMs are left out of the datasets and
+        recorded in their metadata, see load_bad_bpm_file (default: None, keep
+        every BPM).
+    fill : int
+        Fill number of the measurements, selecting the fill entries of the
+        bad-BPM list.
+    measurement_time : str or datetime
+        Time of the measurements, selecting the time range entries of the
+        bad-BPM list.
+    knob_source : str or Path
+        File of recorded knob settings (CSV, Parquet or SQLite) replayed instead
+        of querying the logging service, see ReplayKnobSource.
+    knob_cache : bool or str or Path
+        Store the knob settings at the kick times on disk and answer repeated
+        lookups from there; True uses the default cache directory, a path
+        selects the cache directory (default: False).
+    knob_cache_offline : bool
+        Resolve knobs from the knob cache only, without the logging service
+        (default: False).
+    knob_cache_bypass : bool
+        Neither read nor write the knob cache (default: False).
+    knob_import : str or Path
+        CSV file of knob settings added to the knob cache before the analysis,
+        see KnobCache.import_csv.
+    knob_export : str or Path
+        CSV file the knob cache is written to after the analysis.
+    knob_concurrency : int
+        Maximum number of knob queries and command.run reads in flight at a
+        time (default: 1).
+    knob_timeout : float
+        Seconds after which a knob query is abandoned (default: None, wait).
+    knob_retries : int
+        Number of times a failed knob query is repeated, with exponential
+        backoff (default: 0).
 
     Returns
     -------
     tuple
         Analysis results for LHCB1 and LHCB2 in file usable for plotting and matching with response.
+        With rdts, each is a list holding one result per requested RDT.
     """
     if parent:
         parent.input_progress.show()
@@ -362,6 +478,7 @@ def run_analysis(parent=None, **kwargs):
     else:
         ldb = None
         log_func = kwargs.get("log_func", print)
+        rdts = kwargs.get("rdts")
         rdt = kwargs.get("rdt")
         rdt_plane = kwargs.get("rdt_plane")
         rdt_folder = kwargs.get(
@@ -379,14 +496,49 @@ def run_analysis(parent=None, **kwargs):
             kwargs.get("b2filename", ""),
         )
         simulation_checkbox = kwargs.get("simulation_checkbox", False)
-        if not simulation_checkbox:
-            ldb = initialize_statetracker()
+        knob_cache = None
+        offline = kwargs.get("knob_cache_offline", False)
+        if offline or any(
+            kwargs.get(key) for key in ("knob_cache", "knob_import", "knob_export")
+        ):
+            cache_dir = kwargs.get("knob_cache")
+            knob_cache = KnobCache(
+                None if cache_dir is True else cache_dir,
+                offline=offline,
+                bypass=kwargs.get("knob_cache_bypass", False),
+            )
+            if kwargs.get("knob_import"):
+                knob_cache.import_csv(kwargs["knob_import"])
+        if not simulation_checkbox and not offline:
+            ldb = initialize_statetracker(kwargs.get("knob_source"))
             is_valid_knob, knob_message = validate_knob(ldb, knob)
             if not is_valid_knob:
                 if kwargs.get("log_func"):
                     kwargs["log_func"](f"Invalid Knob: {knob_message}")
                 return None, None
+        knob_resolver = KnobResolver(
+            ldb,
+            knob,
+            knob_cache,
+            max_concurrency=kwargs.get("knob_concurrency", 1),
+            timeout=kwargs.get("knob_timeout"),
+            retries=kwargs.get("knob_retries", 0),
+        )
         simulation_file = kwargs.get("simulation_file", "")
+        tfs_cache = kwargs.get("tfs_cache", False)
+        cache = None
+        if tfs_cache:
+            cache = TFSCache(
+                None if tfs_cache is True else tfs_cache,
+                kwargs.get("tfs_cache_max_bytes", DEFAULT_MAX_BYTES),
+            )
+        bad_bpms = None
+        if kwargs.get("bad_bpm_file"):
+            bad_bpms = resolve_bad_bpms(
+                kwargs["bad_bpm_file"],
+                kwargs.get("fill"),
+                kwargs.get("measurement_time"),
+            )
         b1rdtdata = handle_beam_analysis(
             None,
             ldb,
@@ -401,6 +553,15 @@ def run_analysis(parent=None, **kwargs):
             simulation_checkbox,
             simulation_file,
             log_func,
+            cache,
+            kwargs.get("max_workers"),
+            kwargs.get("executor", "thread"),
+            rdts,
+            kwargs.get("outlier_threshold", 3),
+            kwargs.get("outlier_mode", "zscore"),
+            bad_bpms,
+            knob_cache,
+            knob_resolver,
         )
         b2rdtdata = handle_beam_analysis(
             None,
@@ -416,13 +577,78 @@ def run_analysis(parent=None, **kwargs):
             simulation_checkbox,
             simulation_file,
             log_func,
+            cache,
+            kwargs.get("max_workers"),
+            kwargs.get("executor", "thread"),
+            rdts,
+            kwargs.get("outlier_threshold", 3),
+            kwargs.get("outlier_mode", "zscore"),
+            bad_bpms,
+            knob_cache,
+            knob_resolver,
         )
+        fit_cache = kwargs.get("fit_cache", False)
+        if fit_cache:
+            set_fit_cache(
+                FitCache(default_fit_cache_dir() if fit_cache is True else fit_cache)
+            )
+        fit_order = kwargs.get("fit_order")
+        if fit_order is not None:
+            fit_weighting = kwargs.get("fit_weighting", "none")
+            results = (
+                [*(b1rdtdata or []), *(b2rdtdata or [])]
+                if rdts
+                else [b1rdtdata, b2rdtdata]
+            )
+            for result in results:
+                if result is not None:
+                    fit_bpm(result, fit_order, fit_weighting)
+        if knob_cache is not None and kwargs.get("knob_export"):
+            knob_cache.export_csv(kwargs["knob_export"], [knob])
+        if cache is not None:
+            cache.flush()
+        if rdts:
+            for (rdt, rdt_plane), b1data, b2data in zip(
+                rdts, b1rdtdata or [None] * len(rdts), b2rdtdata or [None] * len(rdts)
+            ):
+                if b1data is not None:
+                    save_rdtdata(
+                        b1data, rdt_output_filename(b1filename, rdt, rdt_plane)
+                    )
+                if b2data is not None:
+                    save_rdtdata(
+                        b2data, rdt_output_filename(b2filename, rdt, rdt_plane)
+                    )
+            return b1rdtdata, b2rdtdata
         save_rdtdata(b1rdtdata, b1filename)
         save_rdtdata(b2rdtdata, b2filename)
         return b1rdtdata, b2rdtdata
     return None
 
 
+def rdt_output_filename(filename: str | Path, rdt: str, rdt_plane: str) -> Path:
+    """
+    Return the output filename of one RDT of a multi-RDT analysis.
+
+    Parameters
+    ----------
+    filename : str or Path
+        Output filename given for the whole analysis, e.g. "b1.json".
+    rdt : str
+        RDT identifier (e.g., "0030").
+    rdt_plane : str
+        RDT plane ("x" or "y").
+
+    Returns
+    -------
+    Path
+        filename with "_f{rdt}_{rdt_plane}" appended to its stem, e.g.
+        "b1_f0030_y.json".
+    """
+    filename = Path(filename)
+    return filename.with_name(f"{filename.stem}_f{rdt}_{rdt_plane}{filename.suffix}")
+
+
 # --- Response validation helpers ---
 
 
@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import io
+import shutil
+import tarfile
+import tempfile
+import threading
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz", ".zip")
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+class ArchiveIndex:
+    """
+    Member index of a tar or zip archive of OMC3 results folders.
+
+    The archive is scanned once to record every regular member: its ZipInfo
+    for zip files, or the data offset and size of tarball members, which are
+    then read by seeking to their offset. For zip files and uncompressed tarballs this is true random access. For
+    compressed tarballs the decompressed stream is kept open and sought in:
+    reading members in archive order is a single streaming pass, but every
+    backward seek decompresses the archive again from its start. Readers that
+    need many members in no particular order (e.g. concurrent folder reads)
+    should therefore prefetch them first, which reads them in one pass in
+    archive order and holds them in memory until they are read.
+
+    Parameters
+    ----------
+    archive_path : str or Path
+        Path to the archive.
+    """
+
+    def __init__(self, archive_path: Path | str):
+        self.archive_path = Path(archive_path)
+        self._lock = threading.Lock()
+        self._zip = None
+        self._stream = None
+        self._prefetched = {}
+        self.members = {}
+        if self.archive_path.name.endswith(".zip"):
+            self._zip = zipfile.ZipFile(self.archive_path)
+            self.members = {
+                _normalise(info.filename): info
+                for info in self._zip.infolist()
+                if not info.is_dir()
+            }
+        else:
+            with tarfile.open(self.archive_path) as tar:
+                self.members = {
+                    _normalise(member.name): (member.offset_data, member.size)
+                    for member in tar
+                    if member.isfile()
+                }
+        self.folders = {
+            str(parent)
+            for name in self.members
+            for parent in PurePosixPath(name).parents
+            if str(parent) != "."
+        }
+
+    def is_file(self, member: str) -> bool:
+        """
+        Return True if the archive holds a regular file with this name.
+        """
+        return _normalise(member) in self.members
+
+    def is_dir(self, member: str) -> bool:
+        """
+        Return True if some archive member lies below this folder name.
+        """
+        return _normalise(member) in self.folders
+
+    def read_bytes(self, member: str) -> bytes:
+        """
+        Return the content of a member.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the archive holds no regular file with this name.
+        """
+        name = _normalise(member)
+        if name not in self.members:
+            raise FileNotFoundError(f"{member} not found in {self.archive_path}")
+        with self._lock:
+            data = self._prefetched.pop(name, None)
+            if data is not None:
+                return data
+            if self._zip is not None:
+                return self._zip.read(self.members[name])
+            return self._read_tar_member(name)
+
+    def prefetch(self, members: Iterable[str]) -> None:
+        """
+        Read members of a compressed tarball ahead, in one pass in archive
+        order. Each is then returned once by read_bytes without seeking; the
+        members of an earlier prefetch that were not read are dropped. Missing
+        members are ignored, and nothing is done for other archives, which
+        have random access.
+        """
+        if self._zip is not None or self.archive_path.name.endswith(".tar"):
+            return
+        names = {_normalise(member) for member in members} & self.members.keys()
+        with self._lock:
+            self._prefetched = {
+                name: self._read_tar_member(name)
+                for name in sorted(names, key=lambda name: self.members[name][0])
+            }
+
+    def _read_tar_member(self, name: str) -> bytes:
+        offset, size = self.members[name]
+        if self._stream is None:
+            self._stream = _open_tar_stream(self.archive_path)
+        self._stream.seek(offset)
+        return self._stream.read(size)
+
+    def close(self) -> None:
+        """
+        Close the open archive handles.
+        """
+        with self._lock:
+            for handle in (self._zip, self._stream):
+                if handle is not None:
+                    handle.close()
+            self._zip = self._stream = None
+            self._prefetched = {}
+
+
+def split_archive_path(path: Path | str) -> tuple[Path, str] | None:
+    """
+    Split a path running through an archive into the archive and member name.
+
+    A folder or file inside an archive is addressed by appending its name
+    inside the archive to the archive path, e.g.
+    ``fills/fill_9000.tar.gz/LHCB1_IP5V_150/rdt/skew_sextupole/f0030_y.tfs``.
+
+    Parameters
+    ----------
+    path : str or Path
+        Path to check.
+
+    Returns
+    -------
+    tuple[Path, str] or None
+        (archive_path, member) if a parent of path is an existing archive file,
+        otherwise None. member is empty for the archive itself.
+    """
+    path = Path(path)
+    for candidate in (path, *path.parents):
+        if candidate.name.endswith(ARCHIVE_SUFFIXES) and candidate.is_file():
+            member = path.relative_to(candidate).as_posix()
+            return candidate, "" if member == "." else member
+    return None
+
+
+def get_archive_index(archive_path: Path | str) -> ArchiveIndex:
+    """
+    Return the member index of an archive.
+
+    Indexes are kept for the lifetime of the process and rebuilt when the size
+    or modification time of the archive changes.
+
+    Parameters
+    ----------
+    archive_path : str or Path
+        Path to the archive.
+
+    Returns
+    -------
+    ArchiveIndex
+        Shared index of the archive.
+    """
+    archive_path = Path(archive_path)
+    stat = archive_path.stat()
+    key = str(archive_path.resolve())
+    signature = (stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        entry = _indexes.get(key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+    index = ArchiveIndex(archive_path)
+    with _lock:
+        old = _indexes.get(key)
+        _indexes[key] = (signature, index)
+    if old is not None:
+        old[1].close()
+    return index
+
+
+def clear_archive_indexes() -> None:
+    """
+    Close and forget every archive index held in memory.
+    """
+    with _lock:
+        entries = list(_indexes.values())
+        _indexes.clear()
+    for _, index in entries:
+        index.close()
+
+
+def path_is_file(path: Path | str) -> bool:
+    """
+    Return True if path is a regular file, on disk or inside an archive.
+    """
+    located = split_archive_path(path)
+    if located is None:
+        return Path(path).is_file()
+    archive_path, member = located
+    return bool(member) and get_archive_index(archive_path).is_file(member)
+
+
+def path_is_dir(path: Path | str) -> bool:
+    """
+    Return True if path is a folder, on disk or inside an archive. An archive
+    itself counts as a folder.
+    """
+    located = split_archive_path(path)
+    if located is None:
+        return Path(path).is_dir()
+    archive_path, member = located
+    return not member or get_archive_index(archive_path).is_dir(member)
+
+
+def read_path_bytes(path: Path | str) -> bytes:
+    """
+    Return the content of a file on disk or inside an archive.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the file does not exist.
+    """
+    located = split_archive_path(path)
+    if located is None:
+        return Path(path).read_bytes()
+    archive_path, member = located
+    return get_archive_index(archive_path).read_bytes(member)
+
+
+def prefetch_paths(paths: Iterable[Path | str]) -> None:
+    """
+    Read the files of compressed tarballs among paths ahead, in archive order.
+
+    See ArchiveIndex.prefetch. Paths on disk and missing files are ignored.
+
+    Parameters
+    ----------
+    paths : iterable of str or Path
+        Files that are about to be read, in any order.
+    """
+    members = {}
+    for path in paths:
+        located = split_archive_path(path)
+        if located is not None and located[1]:
+            members.setdefault(located[0], []).append(located[1])
+    for archive_path, names in members.items():
+        get_archive_index(archive_path).prefetch(names)
+
+
+def open_path_text(path: Path | str) -> io.TextIOBase:
+    """
+    Open a file on disk or inside an archive for reading text.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the file does not exist.
+    """
+    if split_archive_path(path) is None:
+        return Path.open(path, "r")
+    return io.StringIO(read_path_bytes(path).decode())
+
+
+def path_signature(path: Path | str) -> tuple[int, int] | None:
+    """
+    Return (size, mtime_ns) identifying the current content of a file.
+
+    For archive members these are the size and modification time of the
+    archive. None if the file does not exist.
+    """
+    try:
+        located = split_archive_path(path)
+        if located is None:
+            stat = Path(path).stat()
+        else:
+            archive_path, member = located
+            if not get_archive_index(archive_path).is_file(member):
+                return None
+            stat = archive_path.stat()
+    except (OSError, tarfile.TarError, zipfile.BadZipFile):
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+@contextmanager
+def local_path(path: Path | str) -> Iterator[Path]:
+    """
+    Provide a filesystem path for a file that may lie inside an archive.
+
+    Archive members are written to a temporary file that is removed on exit,
+    for readers that only accept real paths (e.g. ``tfs.read``).
+
+    Yields
+    ------
+    Path
+        path itself if it is not inside an archive, otherwise the temporary copy.
+    """
+    if split_archive_path(path) is None:
+        yield Path(path)
+        return
+    tmpdir = tempfile.mkdtemp(prefix="rdtfeeddown-")
+    try:
+        tmp_path = Path(tmpdir) / Path(path).name
+        tmp_path.write_bytes(read_path_bytes(path))
+        yield tmp_path
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _normalise(member: str) -> str:
+    return PurePosixPath(member.strip("/")).as_posix().removeprefix("./")
+
+
+def _open_tar_stream(archive_path: Path) -> io.BufferedIOBase:
+    name = archive_path.name
+    if name.endswith((".tar.gz", ".tgz")):
+        import gzip
+
+        return gzip.open(archive_path, "rb")
+    if name.endswith(".tar.bz2"):
+        import bz2
+
+        return bz2.open(archive_path, "rb")
+    if name.endswith(".tar.xz"):
+        import lzma
+
+        return lzma.open(archive_path, "rb")
+    return Path.open(archive_path, "rb")
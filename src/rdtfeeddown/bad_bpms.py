@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import json
+import threading
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import NamedTuple
+
+from rdtfeeddown.bpm_registry import BAD_BPMS
+
+BUILTIN_SOURCE = "built-in"
+
+_files = {}
+_lock = threading.Lock()
+
+
+class BadBPMSet(NamedTuple):
+    """
+    Active set of excluded BPMs and where it comes from.
+
+    Attributes
+    ----------
+    bpms : frozenset[str]
+        Names of the excluded BPMs.
+    source : str
+        Resolved path of the list file, or "built-in" for BAD_BPMS.
+    version : str or None
+        Version of the list file, None for the built-in list.
+    fill : int or None
+        Fill number the set was selected for.
+    time : str or None
+        Measurement time the set was selected for, in ISO format.
+    """
+
+    bpms: frozenset[str]
+    source: str = BUILTIN_SOURCE
+    version: str | None = None
+    fill: int | None = None
+    time: str | None = None
+
+    def to_metadata(self) -> dict:
+        """
+        Return the set as recorded under "bad_bpms" in a dataset's metadata.
+        """
+        return {
+            "source": self.source,
+            "version": self.version,
+            "fill": self.fill,
+            "time": self.time,
+            "bpms": sorted(self.bpms),
+        }
+
+
+def load_bad_bpm_file(path: Path | str) -> dict:
+    """
+    Load a versioned bad-BPM list file.
+
+    The file is a JSON object::
+
+        {
+            "version": "2025.1",
+            "default": ["BPM.13L2.B1"],
+            "entries": [
+                {"fills": [10500, 10620], "bpms": ["BPM.25R3.B2"]},
+                {"fill": 10511, "bpms": ["BPM.12L1.B1"]},
+                {"from": "2025-05-01", "to": "2025-05-15T12:00", "bpms": [...]}
+            ]
+        }
+
+    "default" is excluded in every measurement; each entry adds its BPMs for a
+    single fill, an inclusive range of fills, or a time range starting at
+    "from" and ending before "to" (either may be omitted). Times without a time
+    zone are UTC. A file is parsed once and reloaded only when it changes.
+
+    Parameters
+    ----------
+    path : str or Path
+        Path to the list file.
+
+    Returns
+    -------
+    dict
+        {"source", "version", "default", "entries"}, with the BPM lists as
+        frozensets and the fills and times of each entry parsed.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a valid bad-BPM list.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        loaded = _files.get(str(path))
+        if loaded is not None and loaded[0] == key:
+            return loaded[1]
+    with path.open() as f:
+        try:
+            content = json.load(f)
+        except json.JSONDecodeError as e:
+            msg = f"Bad-BPM list {path} is not valid JSON: {e}"
+            raise ValueError(msg) from e
+    if not isinstance(content, dict) or "version" not in content:
+        msg = f"Bad-BPM list {path} must be a JSON object with a 'version'."
+        raise ValueError(msg)
+    badlist = {
+        "source": str(path),
+        "version": str(content["version"]),
+        "default": _bpm_set(content.get("default", []), path),
+        "entries": [_parse_entry(entry, path) for entry in content.get("entries", [])],
+    }
+    with _lock:
+        _files[str(path)] = (key, badlist)
+    return badlist
+
+
+def resolve_bad_bpms(
+    path: Path | str | None = None,
+    fill: int | None = None,
+    time: datetime | str | None = None,
+) -> BadBPMSet:
+    """
+    Select the excluded BPMs of a measurement.
+
+    Parameters
+    ----------
+    path : str or Path, optional
+        Bad-BPM list file, see load_bad_bpm_file (default: None, use the
+        built-in BAD_BPMS).
+    fill : int, optional
+        Fill number of the measurement, selecting the fill entries.
+    time : datetime or str, optional
+        Time of the measurement (ISO format if a string), selecting the time
+        range entries.
+
+    Returns
+    -------
+    BadBPMSet
+        The default BPMs of the file together with those of every entry
+        matching the fill or the time.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a valid bad-BPM list or the time cannot be parsed.
+    """
+    when = _parse_time(time, "measurement time") if time is not None else None
+    fill = int(fill) if fill is not None else None
+    stamp = when.isoformat() if when is not None else None
+    if path is None:
+        return BadBPMSet(BAD_BPMS, fill=fill, time=stamp)
+    badlist = load_bad_bpm_file(path)
+    bpms = set(badlist["default"])
+    for entry in badlist["entries"]:
+        if fill is not None and entry["fills"] is not None:
+            first, last = entry["fills"]
+            if first <= fill <= last:
+                bpms |= entry["bpms"]
+        elif when is not None and entry["fills"] is None:
+            start, end = entry["from"], entry["to"]
+            if (start is None or start <= when) and (end is None or when < end):
+                bpms |= entry["bpms"]
+    return BadBPMSet(
+        frozenset(bpms), badlist["source"], badlist["version"], fill, stamp
+    )
+
+
+def excluded_bpms(metadata: dict | None) -> frozenset[str]:
+    """
+    Return the BPMs to leave out of the averages and slope plots of a dataset.
+
+    A dataset built with a bad-BPM list has those BPMs removed already and
+    records the list under metadata["bad_bpms"]. The recorded list replaces the
+    built-in BAD_BPMS, so a fill's list can re-enable a BPM that is bad by
+    default. Datasets without the record use BAD_BPMS.
+
+    Parameters
+    ----------
+    metadata : dict or None
+        Metadata of the dataset.
+
+    Returns
+    -------
+    frozenset[str]
+        Names of the excluded BPMs.
+    """
+    recorded = (metadata or {}).get("bad_bpms")
+    if recorded is None:
+        return BAD_BPMS
+    return frozenset(recorded["bpms"])
+
+
+def _parse_entry(entry: dict, path: Path) -> dict:
+    if not isinstance(entry, dict) or "bpms" not in entry:
+        msg = f"Bad-BPM list {path}: every entry needs a 'bpms' list."
+        raise ValueError(msg)
+    fills = None
+    if "fill" in entry:
+        fills = (int(entry["fill"]), int(entry["fill"]))
+    elif "fills" in entry:
+        fills = tuple(int(fill) for fill in entry["fills"])
+        if len(fills) != 2 or fills[0] > fills[1]:
+            msg = f"Bad-BPM list {path}: 'fills' must be [first, last]."
+            raise ValueError(msg)
+    start = _parse_time(entry["from"], path) if "from" in entry else None
+    end = _parse_time(entry["to"], path) if "to" in entry else None
+    if fills is None and start is None and end is None:
+        msg = f"Bad-BPM list {path}: entries need 'fill', 'fills', 'from' or 'to'."
+        raise ValueError(msg)
+    return {
+        "fills": fills,
+        "from": start,
+        "to": end,
+        "bpms": _bpm_set(entry["bpms"], path),
+    }
+
+
+def _bpm_set(bpms: list, path: Path) -> frozenset[str]:
+    if isinstance(bpms, str) or not all(isinstance(bpm, str) for bpm in bpms):
+        msg = f"Bad-BPM list {path}: BPMs must be given as a list of names."
+        raise ValueError(msg)
+    return frozenset(bpms)
+
+
+def _parse_time(value: datetime | str, origin: Path | str) -> datetime:
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(str(value))
+        except ValueError as e:
+            msg = f"Invalid time '{value}' in {origin}, expected ISO format."
+            raise ValueError(msg) from e
+    if value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value.astimezone(UTC)
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import compress
+from typing import TYPE_CHECKING, NamedTuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+BAD_BPMS = frozenset({"BPM.13L2.B1", "BPM.25R3.B2", "BPM.26R3.B2"})
+# Arc BPMs are the plain "BPM" monitors from this position from the IP onwards
+ARC_MIN_POSITION = 10
+REGISTRY_CACHE_SIZE = 32
+
+_LOCATION_RE = re.compile(r"(\d+)(?:([LR])(\d*))?")
+_BEAM_RE = re.compile(r"B([12])")
+
+_registries = OrderedDict()
+_lock = threading.Lock()
+
+
+class BPMInfo(NamedTuple):
+    """
+    Classification of a BPM parsed from its name, e.g. "BPM.13L2.B1".
+
+    Attributes
+    ----------
+    kind : str
+        Monitor type before the first dot, e.g. "BPM", "BPMWB" or "BPMSW".
+    position : int
+        Position counted from the IP (13), or -1 if it cannot be parsed.
+    side : str
+        "L" or "R" of the IP, or "" if unknown.
+    ip : int
+        IP number (2), or 0 if unknown.
+    beam : int
+        Beam number (1), or 0 if unknown.
+    arc : bool
+        True for arc BPMs: plain "BPM" monitors at position ARC_MIN_POSITION or
+        more.
+    """
+
+    kind: str
+    position: int
+    side: str
+    ip: int
+    beam: int
+    arc: bool
+
+
+@lru_cache(maxsize=4096)
+def parse_bpm_name(name: str) -> BPMInfo:
+    """
+    Parse a BPM name into its classification; each name is parsed only once.
+
+    Parameters
+    ----------
+    name : str
+        BPM name, e.g. "BPM.13L2.B1".
+
+    Returns
+    -------
+    BPMInfo
+        Classification of the BPM.
+    """
+    kind, _, rest = name.partition(".")
+    location, _, beam_part = rest.rpartition(".")
+    position, side, ip = -1, "", 0
+    match = _LOCATION_RE.match(location)
+    if match is not None:
+        position = int(match.group(1))
+        side = match.group(2) or ""
+        ip = int(match.group(3)) if match.group(3) else 0
+    beam_match = _BEAM_RE.match(beam_part)
+    beam = int(beam_match.group(1)) if beam_match is not None else 0
+    arc = kind == "BPM" and position >= ARC_MIN_POSITION
+    return BPMInfo(kind, position, side, ip, beam, arc)
+
+
+class BPMRegistry:
+    """
+    Classification table of a set of BPMs, one array entry per BPM.
+
+    The names are parsed once when the table is built; afterwards BPMs are
+    classified by row index, by name through a dictionary, or all at once with
+    the boolean mask arrays.
+
+    Parameters
+    ----------
+    names : iterable of str
+        BPM names, e.g. the BPMs of a model or of a dataset.
+    bad_bpms : iterable of str, optional
+        Names of the BPMs to exclude (default: BAD_BPMS).
+
+    Attributes
+    ----------
+    names : np.ndarray
+        BPM names.
+    kind, side : np.ndarray
+        Monitor type and side of the IP of each BPM, see BPMInfo.
+    position, ip, beam : np.ndarray
+        Integer position from the IP, IP number and beam number of each BPM.
+    arc, bad : np.ndarray
+        Boolean masks of the arc BPMs and of the excluded BPMs.
+    index : dict[str, int]
+        Row of each BPM name.
+    """
+
+    def __init__(self, names: Iterable[str], bad_bpms: Iterable[str] = BAD_BPMS):
+        names = list(names)
+        infos = [parse_bpm_name(name) for name in names]
+        self.names = np.array(names, dtype=str)
+        self.kind = np.array([info.kind for info in infos], dtype=str)
+        self.side = np.array([info.side for info in infos], dtype=str)
+        self.position = np.array([info.position for info in infos], dtype=int)
+        self.ip = np.array([info.ip for info in infos], dtype=int)
+        self.beam = np.array([info.beam for info in infos], dtype=int)
+        self.arc = np.array([info.arc for info in infos], dtype=bool)
+        self.bad_bpms = frozenset(bad_bpms)
+        self.bad = np.array([name in self.bad_bpms for name in names], dtype=bool)
+        self.index = {name: i for i, name in enumerate(names)}
+
+    def __len__(self) -> int:
+        return self.names.size
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    @property
+    def averaged(self) -> np.ndarray:
+        """
+        Boolean mask of the BPMs used in averages and slope plots: arc BPMs
+        that are not excluded.
+        """
+        return self.arc & ~self.bad
+
+    def is_arc(self, bpm: str | int) -> bool:
+        """
+        Return True if the BPM, given by name or row index, is an arc BPM.
+
+        Names not in the table are parsed (and cached) on the fly.
+        """
+        if isinstance(bpm, str):
+            row = self.index.get(bpm)
+            if row is None:
+                return parse_bpm_name(bpm).arc
+            bpm = row
+        return bool(self.arc[bpm])
+
+    def is_bad(self, bpm: str | int) -> bool:
+        """
+        Return True if the BPM, given by name or row index, is excluded.
+        """
+        if isinstance(bpm, str):
+            return bpm in self.bad_bpms
+        return bool(self.bad[bpm])
+
+    def rows(self, names: Iterable[str]) -> np.ndarray:
+        """
+        Return the row indices of BPM names.
+
+        Raises
+        ------
+        KeyError
+            If a name is not in the table.
+        """
+        return np.array([self.index[name] for name in names], dtype=int)
+
+
+def get_bpm_registry(
+    names: Iterable[str], bad_bpms: Iterable[str] = BAD_BPMS
+) -> BPMRegistry:
+    """
+    Return the classification table of a set of BPM names.
+
+    Recently used tables are kept in memory, so that replotting the same
+    dataset reuses its table instead of classifying its BPMs again.
+
+    Parameters
+    ----------
+    names : iterable of str
+        BPM names, in the order of the table rows.
+    bad_bpms : iterable of str, optional
+        Names of the BPMs to exclude (default: BAD_BPMS).
+
+    Returns
+    -------
+    BPMRegistry
+        Shared table; its arrays must not be modified.
+    """
+    key = (tuple(names), frozenset(bad_bpms))
+    with _lock:
+        registry = _registries.get(key)
+        if registry is not None:
+            _registries.move_to_end(key)
+            return registry
+    registry = BPMRegistry(key[0], key[1])
+    with _lock:
+        _registries[key] = registry
+        while len(_registries) > REGISTRY_CACHE_SIZE:
+            _registries.popitem(last=False)
+    return registry
+
+
+def averaged_bpms(
+    names: Iterable[str], bad_bpms: Iterable[str] = BAD_BPMS
+) -> list[str]:
+    """
+    Return the arc BPMs that are not excluded, in the order given.
+
+    Parameters
+    ----------
+    names : iterable of str
+        BPM names, e.g. the keys of a dataset's "data" dictionary.
+    bad_bpms : iterable of str, optional
+        Names of the BPMs to exclude (default: BAD_BPMS).
+
+    Returns
+    -------
+    list[str]
+        Names of the BPMs used in averages and slope plots.
+    """
+    registry = get_bpm_registry(names, bad_bpms)
+    return list(compress(registry.names.tolist(), registry.averaged.tolist()))
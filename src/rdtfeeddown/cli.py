@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import argparse
+import re
+
+from rdtfeeddown.analysis import OUTLIER_MODES
+from rdtfeeddown.analysis_runner import run_analysis
+from rdtfeeddown.fitting import WEIGHTINGS
+from rdtfeeddown.validation_utils import validate_rdt_and_plane
+
+_RDT_SPEC_RE = re.compile(r"^f?(\d{4})_([xy])$")
+
+
+def parse_rdt_spec(spec: str) -> tuple[str, str]:
+    """
+    Parse an RDT given on the command line.
+
+    Parameters
+    ----------
+    spec : str
+        RDT and plane as in the OMC3 file names, e.g. "f0030_y" or "0030_y".
+
+    Returns
+    -------
+    tuple[str, str]
+        (rdt, rdt_plane), e.g. ("0030", "y").
+
+    Raises
+    ------
+    argparse.ArgumentTypeError
+        If the spec is malformed or the RDT and plane do not form a valid pair.
+    """
+    match = _RDT_SPEC_RE.match(spec.strip())
+    if match is None:
+        raise argparse.ArgumentTypeError(
+            f"Invalid RDT '{spec}', expected e.g. f0030_y or 1002_x."
+        )
+    rdt, rdt_plane = match.groups()
+    valid, message = validate_rdt_and_plane(rdt, rdt_plane)
+    if not valid:
+        raise argparse.ArgumentTypeError(f"Invalid RDT '{spec}': {message}")
+    return rdt, rdt_plane
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="rdtfeeddown",
+        description="Run the RDT feed-down analysis of OMC3 results without the GUI.",
+    )
+    parser.add_argument(
+        "--rdt",
+        dest="rdts",
+        type=parse_rdt_spec,
+        action="append",
+        required=True,
+        help="RDT and plane to analyse, e.g. f0030_y. Repeat to analyse several "
+        "RDTs in a single pass over the folders.",
+    )
+    parser.add_argument("--knob", required=True, help="Knob name.")
+    for beam in ("1", "2"):
+        parser.add_argument(f"--beam{beam}-model", help=f"LHCB{beam} model folder.")
+        parser.add_argument(
+            f"--beam{beam}-reffolder", help=f"LHCB{beam} reference folder."
+        )
+        parser.add_argument(
+            f"--beam{beam}-folders", nargs="+", help=f"LHCB{beam} measurement folders."
+        )
+        parser.add_argument(
+            f"--b{beam}-output",
+            default=f"b{beam}_rdtdata.json",
+            help=f"LHCB{beam} output file; the RDT is appended to its name "
+            f"(default: b{beam}_rdtdata.json).",
+        )
+    parser.add_argument(
+        "--simulation-file",
+        help="CSV file mapping folder names to knob values, for simulations "
+        "where the knobs are not available on Timber.",
+    )
+    parser.add_argument(
+        "--tfs-cache",
+        nargs="?",
+        const=True,
+        default=False,
+        help="Cache parsed RDT files on disk, optionally in the given directory.",
+    )
+    parser.add_argument(
+        "--max-workers", type=int, help="Number of folders read concurrently."
+    )
+    parser.add_argument(
+        "--executor",
+        choices=("thread", "process", "serial"),
+        default="thread",
+        help="How folders are read concurrently (default: thread).",
+    )
+    parser.add_argument(
+        "--outlier-mode",
+        choices=OUTLIER_MODES,
+        default="zscore",
+        help="Statistics used to reject outlier BPMs in each RDT file "
+        "(default: zscore).",
+    )
+    parser.add_argument(
+        "--outlier-threshold",
+        type=float,
+        default=3,
+        help="Outlier rejection threshold in standard deviations (default: 3).",
+    )
+    parser.add_argument(
+        "--fit-order",
+        type=int,
+        help="Save a polynomial fit of this order for every BPM.",
+    )
+    parser.add_argument(
+        "--fit-weighting",
+        choices=WEIGHTINGS,
+        default="none",
+        help="Weighting of the saved fits; erramp weights each point by its "
+        "ERRAMP (default: none).",
+    )
+    parser.add_argument(
+        "--fit-cache",
+        nargs="?",
+        const=True,
+        default=False,
+        help="Store BPM fits on disk, optionally in the given directory, and "
+        "reuse them in later runs.",
+    )
+    parser.add_argument(
+        "--bad-bpm-file",
+        help="Versioned JSON list of BPMs to leave out of the datasets.",
+    )
+    parser.add_argument(
+        "--fill",
+        type=int,
+        help="Fill number, selecting the fill entries of the bad-BPM list.",
+    )
+    parser.add_argument(
+        "--time",
+        help="Measurement time in ISO format, selecting the time range entries "
+        "of the bad-BPM list.",
+    )
+    parser.add_argument(
+        "--knob-source",
+        help="CSV, Parquet or SQLite file of recorded knob settings, replayed "
+        "instead of querying the logging service.",
+    )
+    parser.add_argument(
+        "--knob-cache",
+        nargs="?",
+        const=True,
+        default=False,
+        help="Store knob settings on disk, optionally in the given directory, "
+        "and answer repeated lookups from there.",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Resolve knobs from the knob cache only, without the logging service.",
+    )
+    parser.add_argument(
+        "--bypass-knob-cache",
+        action="store_true",
+        help="Query every knob setting again, ignoring the knob cache.",
+    )
+    parser.add_argument(
+        "--import-knobs", help="CSV file of knob settings to add to the knob cache."
+    )
+    parser.add_argument(
+        "--export-knobs", help="CSV file to write the knob cache to after the run."
+    )
+    parser.add_argument(
+        "--knob-concurrency",
+        type=int,
+        default=1,
+        help="Maximum number of knob queries in flight at a time.",
+    )
+    parser.add_argument(
+        "--knob-timeout",
+        type=float,
+        help="Seconds after which a knob query is abandoned.",
+    )
+    parser.add_argument(
+        "--knob-retries",
+        type=int,
+        default=0,
+        help="Number of times a failed knob query is repeated, with backoff.",
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Command line entry point, see ``rdtfeeddown --help``.
+
+    Returns
+    -------
+    int
+        Exit status: 0 if at least one beam was analysed, 1 otherwise.
+    """
+    args = get_parser().parse_args(argv)
+    b1rdtdata, b2rdtdata = run_analysis(
+        rdts=args.rdts,
+        knob=args.knob,
+        beam1_model=args.beam1_model,
+        beam2_model=args.beam2_model,
+        beam1_reffolder=args.beam1_reffolder,
+        beam2_reffolder=args.beam2_reffolder,
+        beam1_folders=args.beam1_folders,
+        beam2_folders=args.beam2_folders,
+        b1filename=args.b1_output,
+        b2filename=args.b2_output,
+        simulation_checkbox=args.simulation_file is not None,
+        simulation_file=args.simulation_file or "",
+        tfs_cache=args.tfs_cache,
+        max_workers=args.max_workers,
+        executor=args.executor,
+        outlier_mode=args.outlier_mode,
+        outlier_threshold=args.outlier_threshold,
+        fit_order=args.fit_order,
+        fit_cache=args.fit_cache,
+        fit_weighting=args.fit_weighting,
+        bad_bpm_file=args.bad_bpm_file,
+        fill=args.fill,
+        measurement_time=args.time,
+        knob_source=args.knob_source,
+        knob_cache=args.knob_cache,
+        knob_cache_offline=args.offline,
+        knob_cache_bypass=args.bypass_knob_cache,
+        knob_import=args.import_knobs,
+        knob_export=args.export_knobs,
+        knob_concurrency=args.knob_concurrency,
+        knob_timeout=args.knob_timeout,
+        knob_retries=args.knob_retries,
+    )
+    return 0 if b1rdtdata or b2rdtdata else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+from itertools import chain
+
+import numpy as np
+
+
+class RDTDataset:
+    """
+    Columnar view of an RDT feed-down dataset.
+
+    The per-BPM ``diffdata`` lists of an analysis result are stored as dense
+    (n_bpm x n_knob) matrices sharing a single knob axis. The knob axis is the
+    sorted union of the knob settings of all BPMs, keeping repeated settings
+    (e.g. two folders measured at the same crossing angle) as separate
+    columns. Entries a BPM does not have are NaN and False in ``mask``.
+
+    Parameters
+    ----------
+    names : array-like of str
+        BPM names, shape (n_bpm,).
+    s : array-like of float
+        Longitudinal BPM positions, shape (n_bpm,).
+    knobs : array-like of float
+        Knob settings relative to the reference, sorted, shape (n_knob,).
+    re, im, err : array-like of float
+        Real and imaginary RDT shifts and amplitude errors, shape
+        (n_bpm, n_knob).
+    mask : array-like of bool, optional
+        True where a BPM has an entry for a knob column (default: where re is
+        not NaN).
+    metadata : dict, optional
+        Metadata of the analysis, as in the "metadata" entry of the JSON schema.
+
+    Attributes
+    ----------
+    index : dict[str, int]
+        Row of each BPM name.
+    """
+
+    def __init__(
+        self,
+        names,
+        s,
+        knobs,
+        re,
+        im,
+        err,
+        mask=None,
+        metadata: dict | None = None,
+    ):
+        self.names = np.asarray(names, dtype=str)
+        self.s = np.asarray(s, dtype=float)
+        self.knobs = np.asarray(knobs, dtype=float)
+        self.re = np.asarray(re, dtype=float).reshape(self.names.size, self.knobs.size)
+        self.im = np.asarray(im, dtype=float).reshape(self.re.shape)
+        self.err = np.asarray(err, dtype=float).reshape(self.re.shape)
+        self.mask = ~np.isnan(self.re) if mask is None else np.asarray(mask, dtype=bool)
+        self.metadata = dict(metadata or {})
+        self.index = {name: i for i, name in enumerate(self.names.tolist())}
+
+    # --- Conversion ---
+
+    @classmethod
+    def from_dict(cls, data: dict) -> RDTDataset:
+        """
+        Build a dataset from the JSON dict schema produced by getrdt_omc3.
+
+        Parameters
+        ----------
+        data : dict
+            {"metadata": {...}, "data": {bpm: {"s": s, "diffdata": rows}}} where
+            each row is [knob, re, im, err]. Other per-BPM entries (e.g.
+            "fitdata") are ignored.
+
+        Returns
+        -------
+        RDTDataset
+            Columnar dataset with the BPMs in the order of data["data"].
+
+        Raises
+        ------
+        ValueError
+            If a diffdata row does not hold four values.
+        """
+        bpms = data["data"]
+        names = list(bpms)
+        rows = [bpms[bpm]["diffdata"] for bpm in names]
+        lengths = np.array([len(bpm_rows) for bpm_rows in rows], dtype=int)
+        try:
+            flat = np.array(list(chain.from_iterable(rows)), dtype=float)
+        except ValueError:
+            flat = None
+        if flat is None or flat.shape != (lengths.sum(), 4):
+            for bpm, bpm_rows in zip(names, rows):
+                if any(len(row) != 4 for row in bpm_rows):
+                    msg = f"diffdata of {bpm} does not hold [knob, re, im, err] rows."
+                    raise ValueError(msg)
+            flat = np.array(list(chain.from_iterable(rows)), dtype=float).reshape(-1, 4)
+
+        # One column per occurrence of a knob value, as often as in any BPM
+        bpm_index = np.repeat(np.arange(len(names)), lengths)
+        values, value_index = np.unique(flat[:, 0], return_inverse=True)
+        value_index = value_index.reshape(-1)
+        order = np.lexsort((value_index, bpm_index))
+        group = bpm_index[order] * values.size + value_index[order]
+        starts = np.flatnonzero(np.diff(group, prepend=-1))
+        occurrence = np.empty_like(order)
+        occurrence[order] = np.arange(order.size) - np.repeat(
+            starts, np.diff(starts, append=order.size)
+        )
+        slots = np.zeros(values.size, dtype=int)
+        np.maximum.at(slots, value_index, occurrence + 1)
+        first_column = np.cumsum(slots) - slots
+        knobs = np.repeat(values, slots)
+        columns = first_column[value_index] + occurrence
+
+        shape = (len(names), knobs.size)
+        re = np.full(shape, np.nan)
+        im = np.full(shape, np.nan)
+        err = np.full(shape, np.nan)
+        mask = np.zeros(shape, dtype=bool)
+        re[bpm_index, columns] = flat[:, 1]
+        im[bpm_index, columns] = flat[:, 2]
+        err[bpm_index, columns] = flat[:, 3]
+        mask[bpm_index, columns] = True
+        s = [bpms[bpm]["s"] for bpm in names]
+        return cls(names, s, knobs, re, im, err, mask, data.get("metadata"))
+
+    def to_dict(self) -> dict:
+        """
+        Convert the dataset back to the JSON dict schema.
+
+        Returns
+        -------
+        dict
+            {"metadata": {...}, "data": {bpm: {"s": s, "diffdata": rows}}} with
+            the rows of each BPM sorted by knob setting and the missing entries
+            left out.
+        """
+        knobs = self.knobs.tolist()
+        data = {}
+        for i, name in enumerate(self.names.tolist()):
+            columns = np.flatnonzero(self.mask[i])
+            data[name] = {
+                "s": float(self.s[i]),
+                "diffdata": [
+                    [knobs[j], re, im, err]
+                    for j, re, im, err in zip(
+                        columns.tolist(),
+                        self.re[i, columns].tolist(),
+                        self.im[i, columns].tolist(),
+                        self.err[i, columns].tolist(),
+                    )
+                ],
+            }
+        return {"metadata": dict(self.metadata), "data": data}
+
+    # --- Access ---
+
+    def __len__(self) -> int:
+        return self.names.size
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def row(self, name: str) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return the entries of one BPM.
+
+        Parameters
+        ----------
+        name : str
+            BPM name.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+            (knobs, re, im, err) of the knob columns the BPM has an entry for.
+
+        Raises
+        ------
+        KeyError
+            If the BPM is not in the dataset.
+        """
+        i = self.index[name]
+        present = self.mask[i]
+        return (
+            self.knobs[present],
+            self.re[i, present],
+            self.im[i, present],
+            self.err[i, present],
+        )
+
+    def select(self, rows) -> RDTDataset:
+        """
+        Return a dataset holding a subset of the BPMs.
+
+        Parameters
+        ----------
+        rows : array-like of bool, int or str
+            Boolean mask over the BPMs, row indices or BPM names.
+
+        Returns
+        -------
+        RDTDataset
+            New dataset sharing the knob axis and metadata.
+        """
+        rows = np.asarray(rows)
+        if rows.dtype.kind in "US":
+            rows = np.array([self.index[name] for name in rows.tolist()], dtype=int)
+        return RDTDataset(
+            self.names[rows],
+            self.s[rows],
+            self.knobs,
+            self.re[rows],
+            self.im[rows],
+            self.err[rows],
+            self.mask[rows],
+            self.metadata,
+        )
+
+    @property
+    def amp(self) -> np.ndarray:
+        """
+        Amplitude of the RDT shifts, NaN where entries are missing.
+        """
+        return np.hypot(self.re, self.im)
+
+    @property
+    def complete(self) -> bool:
+        """
+        True if every BPM has an entry for every knob column.
+        """
+        return bool(self.mask.all())
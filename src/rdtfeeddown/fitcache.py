@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from rdtfeeddown.dataset import RDTDataset
+from rdtfeeddown.fitting import WEIGHTINGS, fit_dataset
+from rdtfeeddown.tfs_cache import default_cache_dir
+
+DEFAULT_MAX_ENTRIES = 20000
+DB_FILE = "fits.sqlite"
+
+
+def default_fit_cache_dir() -> Path:
+    """
+    Return the default directory of the persistent fit cache, next to the
+    parsed-TFS cache (``~/.cache/rdtfeeddown/fits`` unless XDG_CACHE_HOME is
+    set).
+    """
+    return default_cache_dir().with_name("fits")
+
+
+class FitCache:
+    """
+    Memoised polynomial fits of BPM RDT shifts.
+
+    Each BPM fit is keyed by a hash of the values in its diffdata, the fit
+    order and the weighting mode, so a fit is reused whenever the same data is
+    fitted again: across replots, reloaded files or, with a cache directory,
+    across sessions. Recently used fits are kept in memory; with a cache
+    directory every fit is also stored in a SQLite database there.
+
+    Parameters
+    ----------
+    cache_dir : str or Path, optional
+        Directory of the persistent store (default: None, memory only).
+    max_entries : int, optional
+        Maximum number of fits kept in memory (default: 20000).
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path | str | None = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_entries = int(max_entries)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(
+                self.cache_dir / DB_FILE, check_same_thread=False
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS fits (key TEXT PRIMARY KEY, value BLOB)"
+            )
+            self._db.commit()
+
+    def fit(self, data: dict, order: int = 2, weighting: str = "none") -> dict:
+        """
+        Return the fits of every BPM, computing only those not cached.
+
+        Parameters
+        ----------
+        data : dict
+            BPM dictionary {bpm: {"diffdata": rows, ...}} with rows
+            [knob, re, im, err], i.e. the "data" entry of a dataset.
+        order : int, optional
+            Polynomial order (default: 2).
+        weighting : str, optional
+            Weighting mode, one of WEIGHTINGS (default: "none").
+
+        Returns
+        -------
+        dict
+            [re_opt, re_cov, re_err, im_opt, im_cov, im_err] for each BPM.
+            The arrays are shared with the cache and must not be modified.
+
+        Raises
+        ------
+        ValueError
+            If the weighting mode is unknown, or if weighting by errors and
+            some errors are not positive.
+        """
+        if weighting not in WEIGHTINGS:
+            msg = f"Unknown weighting '{weighting}', expected one of {WEIGHTINGS}."
+            raise ValueError(msg)
+        keys = {
+            bpm: _fit_key(entry["diffdata"], order, weighting)
+            for bpm, entry in data.items()
+        }
+        fits = {}
+        with self._lock:
+            for bpm, key in keys.items():
+                found = self._memory.get(key)
+                if found is not None:
+                    self._memory.move_to_end(key)
+                    fits[bpm] = found
+        if self._db is not None:
+            stored = self._load([keys[bpm] for bpm in keys if bpm not in fits])
+            for bpm, key in keys.items():
+                if bpm not in fits and key in stored:
+                    fits[bpm] = _unpack(stored[key], order)
+        missing = [bpm for bpm in keys if bpm not in fits]
+        if missing:
+            dataset = RDTDataset.from_dict(
+                {"data": {bpm: data[bpm] for bpm in missing}}
+            )
+            new_fits = fit_dataset(dataset, order, weighting)
+            fits.update(new_fits)
+            if self._db is not None:
+                self._store({keys[bpm]: _pack(new_fits[bpm]) for bpm in missing})
+        with self._lock:
+            for bpm, key in keys.items():
+                self._memory[key] = fits[bpm]
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+        return {bpm: fits[bpm] for bpm in data}
+
+    def clear(self) -> None:
+        """
+        Remove every fit from memory and from the persistent store.
+        """
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM fits")
+                self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def _load(self, keys: list[str]) -> dict[str, bytes]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(
+                    self._db.execute(
+                        f"SELECT key, value FROM fits WHERE key IN ({placeholders})",
+                        chunk,
+                    ).fetchall()
+                )
+        return found
+
+    def _store(self, entries: dict[str, bytes]) -> None:
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO fits (key, value) VALUES (?, ?)",
+                entries.items(),
+            )
+            self._db.commit()
+
+
+_default_cache = FitCache()
+
+
+def get_fit_cache() -> FitCache:
+    """
+    Return the fit cache used when no cache is passed explicitly.
+    """
+    return _default_cache
+
+
+def set_fit_cache(cache: FitCache) -> None:
+    """
+    Replace the default fit cache, e.g. by one persisted in a cache directory.
+    """
+    global _default_cache
+    _default_cache = cache
+
+
+def fit_bpms(
+    data: dict,
+    order: int = 2,
+    weighting: str = "none",
+    cache: FitCache | None = None,
+) -> dict:
+    """
+    Fit the real and imaginary RDT shifts of every BPM through a fit cache.
+
+    Parameters
+    ----------
+    data : dict
+        BPM dictionary {bpm: {"diffdata": rows, ...}}.
+    order : int, optional
+        Polynomial order (default: 2).
+    weighting : str, optional
+        Weighting mode, one of WEIGHTINGS (default: "none").
+    cache : FitCache, optional
+        Cache to use (default: get_fit_cache()).
+
+    Returns
+    -------
+    dict
+        [re_opt, re_cov, re_err, im_opt, im_cov, im_err] for each BPM.
+    """
+    if cache is None:
+        cache = get_fit_cache()
+    return cache.fit(data, order, weighting)
+
+
+def fit_single_bpm(
+    fulldata: dict,
+    bpm: str,
+    order: int = 2,
+    weighting: str = "none",
+    cache: FitCache | None = None,
+) -> list:
+    """
+    Fit the real and imaginary RDT shifts of one BPM through a fit cache.
+
+    Parameters
+    ----------
+    fulldata : dict
+        Dataset with a "data" entry holding the diffdata of each BPM.
+    bpm : str
+        BPM name.
+    order : int, optional
+        Polynomial order (default: 2).
+    weighting : str, optional
+        Weighting mode, one of WEIGHTINGS (default: "none").
+    cache : FitCache, optional
+        Cache to use (default: get_fit_cache()).
+
+    Returns
+    -------
+    list
+        [re_opt, re_cov, re_err, im_opt, im_cov, im_err].
+
+    Raises
+    ------
+    KeyError
+        If the BPM is not in the dataset.
+    """
+    return fit_bpms({bpm: fulldata["data"][bpm]}, order, weighting, cache)[bpm]
+
+
+def _fit_key(diffdata: list, order: int, weighting: str) -> str:
+    values = np.asarray(diffdata, dtype=float)
+    if weighting == "none":
+        values = values[:, :3]
+    digest = hashlib.sha1(np.ascontiguousarray(values).tobytes())
+    digest.update(f"|{values.shape}|{order}|{weighting}".encode())
+    return digest.hexdigest()
+
+
+def _pack(fitdata: list) -> bytes:
+    return np.concatenate([np.ravel(part) for part in fitdata]).tobytes()
+
+
+def _unpack(blob: bytes, order: int) -> list:
+    npar = order + 1
+    sizes = [npar, npar * npar, npar] * 2
+    shapes = [(npar,), (npar, npar), (npar,)] * 2
+    flat = np.frombuffer(blob, dtype=float)
+    parts = np.split(flat, np.cumsum(sizes)[:-1])
+    return [part.reshape(shape) for part, shape in zip(parts, shapes)]
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from rdtfeeddown.dataset import RDTDataset
+
+WEIGHTINGS = ("none", "erramp")
+
+
+def polyfit_batch(
+    x: np.ndarray, y: np.ndarray, order: int, sigma: np.ndarray | None = None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Least-squares fit of a polynomial to many data sets sharing one abscissa.
+
+    Without sigma, all columns of y are fitted at once with a single
+    decomposition of the Vandermonde matrix. The results match ``curve_fit`` on
+    the model sum(c_i * x**i) without sigma: the covariance is the
+    pseudo-inverse of J^T J scaled by the reduced chi-square of each column, and
+    is infinite when there are no more points than parameters.
+
+    With sigma, each column is weighted by its own errors and the weighted
+    Vandermonde matrices of all columns are decomposed in one stacked call. The
+    results match ``curve_fit`` with sigma and ``absolute_sigma=True`` (as in
+    analysis.fitdata): the covariance is the pseudo-inverse of the weighted
+    J^T J, without rescaling.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Abscissa, shape (M,).
+    y : np.ndarray
+        Ordinates, shape (M,) or (M, K) for K data sets.
+    order : int
+        Polynomial order; N = order + 1 coefficients are fitted.
+    sigma : np.ndarray, optional
+        Standard errors of y, same shape as y (default: None, unweighted).
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray]
+        (popt, pcov, perr) with shapes (K, N), (K, N, N) and (K, N), or (N,),
+        (N, N) and (N,) for one-dimensional y. Coefficients are in increasing
+        order of the power of x.
+
+    Raises
+    ------
+    TypeError
+        If there are fewer points than coefficients, as raised by curve_fit.
+    ValueError
+        If sigma does not match y or holds errors that are not positive and
+        finite.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    single = y.ndim == 1
+    if single:
+        y = y[:, None]
+    npar = order + 1
+    npts = x.size
+    if npar > npts:
+        msg = f"Improper input: func (n={npar}) must not exceed data (m={npts})"
+        raise TypeError(msg)
+
+    vander = np.vander(x, npar, increasing=True)
+    threshold = np.finfo(float).eps * max(vander.shape)
+    if sigma is not None:
+        sigma = np.asarray(sigma, dtype=float).reshape(y.shape)
+        if not np.all(np.isfinite(sigma) & (sigma > 0)):
+            msg = "Weighted fits need positive, finite errors."
+            raise ValueError(msg)
+        weights = 1.0 / sigma.T
+        u, sing, vt = np.linalg.svd(
+            weights[:, :, None] * vander[None], full_matrices=False
+        )
+        keep = sing > threshold * sing[:, :1]
+        inv_sing = np.divide(1.0, sing, out=np.zeros_like(sing), where=keep)
+        proj = np.einsum("kmi,km->ki", u, weights * y.T) * inv_sing
+        popt = np.einsum("kij,ki->kj", vt, proj)
+        pcov = np.einsum("kij,ki,kil->kjl", vt, inv_sing**2, vt)
+    else:
+        u, sing, vt = np.linalg.svd(vander, full_matrices=False)
+        keep = sing > threshold * sing[0]
+        u, sing, vt = u[:, keep], sing[keep], vt[keep]
+
+        popt = (vt.T @ ((u.T @ y) / sing[:, None])).T
+        base_cov = (vt.T / sing**2) @ vt
+        if npts > npar:
+            resid = y - vander @ popt.T
+            scale = np.einsum("ij,ij->j", resid, resid) / (npts - npar)
+            pcov = base_cov[None] * scale[:, None, None]
+        else:
+            pcov = np.full((y.shape[1], npar, npar), np.inf)
+    perr = np.sqrt(np.diagonal(pcov, axis1=1, axis2=2))
+    if single:
+        return popt[0], pcov[0], perr[0]
+    return popt, pcov, perr
+
+
+def fit_dataset(
+    dataset: RDTDataset, order: int = 2, weighting: str = "none"
+) -> dict[str, list]:
+    """
+    Fit the real and imaginary RDT shifts of every BPM against the knob.
+
+    BPMs with entries at the same knob columns are fitted together in one
+    batched solve; a complete dataset is a single solve.
+
+    Parameters
+    ----------
+    dataset : RDTDataset
+        Dataset to fit.
+    order : int, optional
+        Polynomial order (default: 2).
+    weighting : str, optional
+        "none" for unweighted fits, or "erramp" to weight the real and
+        imaginary parts of each entry by its amplitude error (default: "none").
+
+    Returns
+    -------
+    dict[str, list]
+        [re_opt, re_cov, re_err, im_opt, im_cov, im_err] for each BPM, as
+        stored under "fitdata" by fit_bpm.
+
+    Raises
+    ------
+    ValueError
+        If the weighting mode is unknown, or if weighting by errors and a BPM
+        has an entry whose error is not positive (e.g. simulation data).
+    """
+    if weighting not in WEIGHTINGS:
+        msg = f"Unknown weighting '{weighting}', expected one of {WEIGHTINGS}."
+        raise ValueError(msg)
+    names = dataset.names.tolist()
+    weighted = weighting == "erramp"
+    if weighted:
+        invalid = dataset.mask & ~(np.isfinite(dataset.err) & (dataset.err > 0))
+        bad = dataset.names[invalid.any(axis=1)].tolist()
+        if bad:
+            msg = (
+                f"Cannot weight fits by ERRAMP: {len(bad)} BPMs have errors that "
+                f"are not positive, e.g. {', '.join(bad[:3])}."
+            )
+            raise ValueError(msg)
+    fits = {}
+    patterns, groups = np.unique(dataset.mask, axis=0, return_inverse=True)
+    groups = groups.reshape(-1)
+    for g, pattern in enumerate(patterns):
+        rows = np.flatnonzero(groups == g)
+        x = dataset.knobs[pattern]
+        y = np.concatenate(
+            [dataset.re[np.ix_(rows, pattern)], dataset.im[np.ix_(rows, pattern)]]
+        ).T
+        sigma = None
+        if weighted:
+            err = dataset.err[np.ix_(rows, pattern)]
+            sigma = np.concatenate([err, err]).T
+        popt, pcov, perr = polyfit_batch(x, y, order, sigma)
+        nrows = rows.size
+        for k, i in enumerate(rows.tolist()):
+            fits[names[i]] = [
+                popt[k],
+                pcov[k],
+                perr[k],
+                popt[nrows + k],
+                pcov[nrows + k],
+                perr[nrows + k],
+            ]
+    return {name: fits[name] for name in names}
@@ -40,6 +40,7 @@ from rdtfeeddown.file_dialog_helpers import (
     select_multiple_treefiles,
     select_singleitem,
 )
+from rdtfeeddown.fitting import WEIGHTINGS
 from rdtfeeddown.plotting import (
     plot_bpm,
     plot_drdt_dknob,
@@ -468,6 +469,15 @@ class RDTFeeddownGUI(QMainWindow):
         self.bpmfit_order = QLineEdit()
         self.bpmfit_order.setFixedWidth(60)
         beam_selector_layout.addWidget(self.bpmfit_order)
+
+        fit_weighting_label = QLabel("Fit Weighting:")
+        beam_selector_layout.addWidget(fit_weighting_label)
+        self.fit_weighting = QComboBox()
+        self.fit_weighting.addItems(list(WEIGHTINGS))
+        self.fit_weighting.setToolTip(
+            "none: unweighted fits; erramp: weight each point by its ERRAMP"
+        )
+        beam_selector_layout.addWidget(self.fit_weighting)
         bpm_tab_layout.addLayout(beam_selector_layout)
 
         self.bpm_search_entry = QLineEdit()
@@ -1225,6 +1235,7 @@ class RDTFeeddownGUI(QMainWindow):
             ax1=ax1,
             ax2=ax2,
             log_func=self.log_error,
+            weighting=self.fit_weighting.currentText(),
         )
         self.plot_progress.hide()
 
@@ -1289,6 +1300,8 @@ class RDTFeeddownGUI(QMainWindow):
                 self.rdt_plane,
                 self.rdt_axes,
                 log_func=self.log_error,
+                b1metadata=(self.b1rdtdata or {}).get("metadata"),
+                b2metadata=(self.b2rdtdata or {}).get("metadata"),
             )
         except (KeyError, AttributeError, TypeError) as e:
             self.log_error(f"Error plotting RDT data: {e}", e)
@@ -1331,6 +1344,9 @@ class RDTFeeddownGUI(QMainWindow):
                 self.rdtshift_axes,
                 knob,
                 log_func=self.log_error,
+                weighting=self.fit_weighting.currentText(),
+                b1metadata=(self.b1rdtdata or {}).get("metadata"),
+                b2metadata=(self.b2rdtdata or {}).get("metadata"),
             )
         except (KeyError, AttributeError, TypeError) as e:
             self.log_error(f"Error plotting RDT shifts: {e}", e)
@@ -1725,6 +1741,7 @@ class RDTFeeddownGUI(QMainWindow):
                 self.rdt_plane,
                 self.corr_axes,
                 log_func=self.log_error,
+                weighting=self.fit_weighting.currentText(),
             )
             plot_drdt_dknob(
                 self.b1data,
@@ -1733,6 +1750,7 @@ class RDTFeeddownGUI(QMainWindow):
                 self.rdt_plane,
                 self.corr_axes,
                 log_func=self.log_error,
+                weighting=self.fit_weighting.currentText(),
             )
 
         both_plot()
@@ -1849,6 +1867,7 @@ class RDTFeeddownGUI(QMainWindow):
             self.corr_axes,
             knob_values,
             log_func=self.log_error,
+            weighting=self.fit_weighting.currentText(),
         )
         self.simcorr_progress.hide()
 
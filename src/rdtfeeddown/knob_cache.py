@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import csv
+import sqlite3
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from rdtfeeddown.tfs_cache import default_cache_dir
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+DB_FILE = "knobs.sqlite"
+CSV_FIELDS = ("knob", "timestamp", "value")
+
+
+def default_knob_cache_dir() -> Path:
+    """
+    Return the default directory of the knob cache, next to the parsed-TFS cache
+    (``~/.cache/rdtfeeddown/knobs`` unless XDG_CACHE_HOME is set).
+    """
+    return default_cache_dir().with_name("knobs")
+
+
+class KnobCache:
+    """
+    Persistent store of knob settings at kick times.
+
+    Settings logged for past times never change, so each (knob, timestamp)
+    resolved from the logging service is stored in a SQLite database and
+    answered locally afterwards. Stores can be exported to and imported from
+    CSV files with the columns knob, timestamp and value, e.g. to share the
+    knob history of a fill.
+
+    Parameters
+    ----------
+    cache_dir : str or Path, optional
+        Directory of the database (default: default_knob_cache_dir()).
+    offline : bool, optional
+        Never query the logging service: settings missing from the cache stay
+        unresolved (default: False).
+    bypass : bool, optional
+        Neither read nor write the cache, querying every setting again
+        (default: False).
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path | str | None = None,
+        offline: bool = False,
+        bypass: bool = False,
+    ):
+        self.cache_dir = Path(cache_dir) if cache_dir else default_knob_cache_dir()
+        self.offline = offline
+        self.bypass = bypass
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.cache_dir / DB_FILE, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS knobs (knob TEXT, timestamp REAL, "
+            "value REAL, PRIMARY KEY (knob, timestamp))"
+        )
+        self._db.commit()
+
+    def get(self, knob: str, timestamps: Iterable[float]) -> dict[float, float]:
+        """
+        Return the cached settings of a knob.
+
+        Parameters
+        ----------
+        knob : str
+            Knob name.
+        timestamps : iterable of float
+            Unix times of the kicks.
+
+        Returns
+        -------
+        dict[float, float]
+            Setting at each cached timestamp. Missing timestamps are left out,
+            and the result is empty with bypass.
+        """
+        if self.bypass:
+            return {}
+        timestamps = list(dict.fromkeys(timestamps))
+        found = {}
+        with self._lock:
+            for start in range(0, len(timestamps), 500):
+                chunk = timestamps[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(
+                    self._db.execute(
+                        "SELECT timestamp, value FROM knobs WHERE knob = ? "
+                        f"AND timestamp IN ({placeholders})",
+                        [knob, *chunk],
+                    ).fetchall()
+                )
+        return found
+
+    def put(self, knob: str, settings: dict[float, float]) -> None:
+        """
+        Store settings of a knob, keyed by Unix time. Nothing is stored with
+        bypass.
+        """
+        if self.bypass or not settings:
+            return
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO knobs (knob, timestamp, value) "
+                "VALUES (?, ?, ?)",
+                [(knob, float(t), float(v)) for t, v in settings.items()],
+            )
+            self._db.commit()
+
+    def export_csv(self, path: Path | str, knobs: Iterable[str] | None = None) -> int:
+        """
+        Write the cached settings, optionally of some knobs only, to a CSV file.
+
+        Returns
+        -------
+        int
+            Number of settings written.
+        """
+        query = "SELECT knob, timestamp, value FROM knobs"
+        params = []
+        if knobs is not None:
+            params = list(knobs)
+            query += f" WHERE knob IN ({','.join('?' * len(params))})"
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY knob, timestamp", params)
+            rows = rows.fetchall()
+        with Path(path).open("w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            writer.writerows((knob, repr(t), repr(v)) for knob, t, v in rows)
+        return len(rows)
+
+    def import_csv(self, path: Path | str) -> int:
+        """
+        Add the settings of a CSV file written by export_csv to the cache.
+
+        Returns
+        -------
+        int
+            Number of settings read.
+
+        Raises
+        ------
+        ValueError
+            If the file lacks the knob, timestamp and value columns.
+        """
+        with Path(path).open(newline="") as f:
+            reader = csv.DictReader(f)
+            if not set(CSV_FIELDS) <= set(reader.fieldnames or ()):
+                msg = f"Knob file {path} needs the columns {', '.join(CSV_FIELDS)}."
+                raise ValueError(msg)
+            rows = [
+                (row["knob"], float(row["timestamp"]), float(row["value"]))
+                for row in reader
+            ]
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO knobs (knob, timestamp, value) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+        return len(rows)
+
+    def clear(self) -> None:
+        """
+        Remove every setting from the cache.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM knobs")
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM knobs").fetchone()[0]
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import sqlite3
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Protocol
+
+import numpy as np
+import pandas as pd
+
+from rdtfeeddown.knob_cache import CSV_FIELDS
+from rdtfeeddown.knobs import statetracker_variable
+
+REPLAY_FORMATS = (".csv", ".parquet", ".sqlite", ".db")
+
+
+class KnobSource(Protocol):
+    """
+    Source of logged knob settings, as queried by the analysis.
+
+    pytimber.LoggingDB satisfies it, and so does ReplayKnobSource.
+    """
+
+    def get(
+        self,
+        name: str,
+        t1: datetime | float | str,
+        t2: datetime | float | str | None = None,
+    ) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+        """
+        Return {name: (timestamps, values)} for a logging variable: the last
+        setting at or before t1, or all settings from t1 to t2 if t2 is given.
+        Timestamps are Unix times; the dictionary is empty for unknown names.
+        """
+        ...
+
+
+class ReplayKnobSource:
+    """
+    Knob source replaying settings recorded in a file, without pytimber.
+
+    The file holds one row per logged setting with the columns knob,
+    timestamp and value. Knobs are given either by name ("LHCBEAM/IP5") or by
+    logging variable ("LhcStateTracker:LHCBEAM:IP5:value"); timestamps are
+    Unix times or ISO strings, UTC unless they give a time zone. CSV files
+    written by KnobCache.export_csv and KnobCache databases can be replayed
+    directly.
+
+    Parameters
+    ----------
+    path : str or Path
+        CSV, Parquet (needs pyarrow or fastparquet) or SQLite file; a SQLite
+        file must have a "knobs" table with the same columns.
+
+    Raises
+    ------
+    ValueError
+        If the file format is unknown or the columns are missing.
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        suffix = self.path.suffix.lower()
+        if suffix == ".csv":
+            table = pd.read_csv(self.path, skipinitialspace=True)
+        elif suffix == ".parquet":
+            table = pd.read_parquet(self.path)
+        elif suffix in (".sqlite", ".db"):
+            db = sqlite3.connect(self.path)
+            try:
+                table = pd.read_sql_query(
+                    "SELECT knob, timestamp, value FROM knobs", db
+                )
+            finally:
+                db.close()
+        else:
+            msg = f"Unknown knob file format '{suffix}', expected one of {REPLAY_FORMATS}."
+            raise ValueError(msg)
+        if not set(CSV_FIELDS) <= set(table.columns):
+            msg = f"Knob file {path} needs the columns {', '.join(CSV_FIELDS)}."
+            raise ValueError(msg)
+        times = table["timestamp"]
+        if not pd.api.types.is_numeric_dtype(times):
+            times = [_unix_time(t) for t in times]
+        table = pd.DataFrame(
+            {
+                "variable": [
+                    knob
+                    if knob.startswith("LhcStateTracker:")
+                    else statetracker_variable(knob)
+                    for knob in table["knob"].astype(str)
+                ],
+                "timestamp": np.asarray(times, dtype=float),
+                "value": table["value"].to_numpy(),
+            }
+        ).sort_values(["variable", "timestamp"], kind="stable")
+        self._history = {
+            variable: (
+                group["timestamp"].to_numpy(),
+                group["value"].to_numpy(),
+            )
+            for variable, group in table.groupby("variable", sort=False)
+        }
+
+    @property
+    def variables(self) -> list[str]:
+        """
+        Logging variables held by the file.
+        """
+        return list(self._history)
+
+    def get(
+        self,
+        name: str,
+        t1: datetime | float | str,
+        t2: datetime | float | str | None = None,
+    ) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+        """
+        Return the recorded settings of a logging variable, see KnobSource.get.
+        """
+        history = self._history.get(name)
+        if history is None:
+            return {}
+        times, values = history
+        t1 = _unix_time(t1)
+        if t2 is None:
+            stop = np.searchsorted(times, t1, side="right")
+            rows = slice(max(stop - 1, 0), stop)
+        else:
+            rows = slice(
+                np.searchsorted(times, t1, side="left"),
+                np.searchsorted(times, _unix_time(t2), side="right"),
+            )
+        return {name: (times[rows], values[rows])}
+
+
+def _unix_time(value: datetime | float | str) -> float:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=UTC)
+        return value.timestamp()
+    return float(value)
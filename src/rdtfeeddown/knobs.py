@@ -0,0 +1,640 @@
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import UTC, datetime
+from itertools import compress, pairwise
+from typing import TYPE_CHECKING, NamedTuple
+
+import numpy as np
+
+from rdtfeeddown.archive import open_path_text, path_signature
+from rdtfeeddown.parallel import map_ordered
+from rdtfeeddown.utils import KICK_TIME_RE, utctolocal
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+    from pathlib import Path
+
+    from rdtfeeddown.knob_cache import KnobCache
+    from rdtfeeddown.knob_sources import KnobSource
+
+OMC3_OPTICS_COMMAND = "bin/python -m omc3.hole_in_one --optics"
+RUN_CACHE_SIZE = 1024
+
+# Files of the first optics command: everything after "--files" up to the next
+# option or the end of the line
+_OPTICS_FILES_RE = re.compile(
+    re.escape(OMC3_OPTICS_COMMAND) + r"[^\n]*?--files(?P<files>[^\n]*?)(?:--|$)",
+    re.MULTILINE,
+)
+
+_runs = OrderedDict()
+_lock = threading.Lock()
+
+
+class RunMetadata(NamedTuple):
+    """
+    Kicks of a results folder, parsed from its command.run.
+
+    Attributes
+    ----------
+    files : tuple[str, ...]
+        Kick files given to the optics command, in its order.
+    kick_times : np.ndarray
+        Unix time of each kick, from the UTC time in its file name.
+    """
+
+    files: tuple[str, ...]
+    kick_times: np.ndarray
+
+
+def statetracker_variable(knob: str) -> str:
+    """
+    Return the logging variable of a knob, e.g. "LhcStateTracker:LHCBEAM:IP5:value"
+    for "LHCBEAM/IP5".
+    """
+    return "LhcStateTracker:" + re.sub("/", ":", knob) + ":value"
+
+
+def read_run_metadata(analyfile: Path | str) -> RunMetadata:
+    """
+    Parse the kick files and times of a results folder from its command.run.
+
+    The file list is extracted with one regular expression over the whole
+    file and the kick times are converted together. The result is kept in
+    memory until the size or modification time of command.run changes, so
+    resolving the same folders again does not reread them.
+
+    Parameters
+    ----------
+    analyfile : Path
+        OMC3 results folder, on disk or inside an archive.
+
+    Returns
+    -------
+    RunMetadata
+        Kick files and times; both are empty if command.run holds no optics
+        command. The kick_times array is shared and must not be modified.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the folder has no command.run.
+    ValueError
+        If a kick file name holds no valid time.
+    """
+    path = f"{analyfile}/command.run"
+    signature = path_signature(path)
+    with _lock:
+        cached = _runs.get(path)
+        if cached is not None and cached[0] == signature:
+            _runs.move_to_end(path)
+            return cached[1]
+    with open_path_text(path) as rc:
+        match = _OPTICS_FILES_RE.search(rc.read())
+    files = ()
+    if match is not None:
+        files = tuple(f.strip() for f in match["files"].split(",") if f.strip())
+    run = RunMetadata(files, kick_unix_times(f.rpartition("/")[2] for f in files))
+    with _lock:
+        _runs[path] = (signature, run)
+        while len(_runs) > RUN_CACHE_SIZE:
+            _runs.popitem(last=False)
+    return run
+
+
+def kick_unix_times(kickfilenames: Iterable[str]) -> np.ndarray:
+    """
+    Return the Unix times of kick files named like
+    "Beam1@Turn@2024_05_01@12_00_00_000.sdds", converted together.
+
+    Raises
+    ------
+    ValueError
+        If a name holds no valid time.
+    """
+    stamps = []
+    for name in kickfilenames:
+        match = KICK_TIME_RE.search(name)
+        if match is None:
+            msg = f"No kick time in file name '{name}'"
+            raise ValueError(msg)
+        year, month, day, hour, minute, second, fraction = match.groups()
+        stamps.append(
+            f"{year}-{month}-{day}T{hour}:{minute}:{second}.{fraction.ljust(6, '0')}"
+        )
+    micros = np.array(stamps, dtype="datetime64[us]").astype(np.int64)
+    return micros / 1e6
+
+
+def read_kick_times(
+    analyfile: Path, log_func: Callable[[str], None] | None = None
+) -> np.ndarray | None:
+    """
+    Return the times of the kicks used to produce a results folder.
+
+    The kick files are listed after "--files" in the optics command of the
+    folder's command.run, and each name holds the UTC time of its kick. See
+    read_run_metadata.
+
+    Parameters
+    ----------
+    analyfile : Path
+        OMC3 results folder.
+    log_func : Callable[[str], None], optional
+        Logging function; messages are printed without it.
+
+    Returns
+    -------
+    np.ndarray or None
+        Unix kick times in the order of the command, or None if the file list
+        could not be read.
+    """
+    times, reason, error = _read_kick_times(analyfile)
+    if times is None:
+        if log_func:
+            log_func(reason, error) if error is not None else log_func(reason)
+        else:
+            print(reason)
+    return times
+
+
+def _read_kick_times(
+    analyfile: Path,
+) -> tuple[np.ndarray | None, str | None, Exception | None]:
+    try:
+        run = read_run_metadata(analyfile)
+    except FileNotFoundError:
+        return None, "No command.run file found in the results folder", None
+    except ValueError as e:
+        return None, "Error reading command.run file: " + str(e), e
+    if not run.files:
+        reason = "No file list found in command.run; cannot determine knob settings."
+        return None, reason, None
+    return run.kick_times, None, None
+
+
+class KnobTimeline:
+    """
+    Step history of a knob over a time window, e.g. a whole fill.
+
+    The settings are held as sorted NumPy arrays, so any number of kick times
+    is resolved with one searchsorted call: a kick takes the last setting
+    logged at or before it.
+
+    Parameters
+    ----------
+    timestamps : array_like
+        Unix times at which the settings were logged.
+    values : array_like
+        Setting from each time on.
+    start, end : float, optional
+        Unix bounds of the window the history is complete for (default: the
+        first and last timestamps).
+    """
+
+    def __init__(
+        self,
+        timestamps: np.ndarray,
+        values: np.ndarray,
+        start: float | None = None,
+        end: float | None = None,
+    ):
+        timestamps = np.asarray(timestamps, dtype=float)
+        order = np.argsort(timestamps, kind="stable")
+        self.timestamps = timestamps[order]
+        self.values = np.asarray(values, dtype=float)[order]
+        bounds = self.timestamps[[0, -1]] if self.timestamps.size else (np.nan,) * 2
+        self.start = float(bounds[0] if start is None else start)
+        self.end = float(bounds[1] if end is None else end)
+
+    @classmethod
+    def fetch(
+        cls, ldb: KnobSource, knob: str, start: datetime, end: datetime
+    ) -> KnobTimeline:
+        """
+        Load the history of a knob over a time window.
+
+        The window is fetched with one range query. The state tracker only logs
+        changes, so the setting in force at the start of the window is fetched
+        with one more point query whenever the range does not begin with it.
+
+        Parameters
+        ----------
+        ldb : KnobSource
+            Logging database or replay source, see KnobSource.
+        knob : str
+            Knob name.
+        start, end : datetime
+            Naive UTC bounds of the window.
+
+        Returns
+        -------
+        KnobTimeline
+            History valid from start to end.
+        """
+        name = statetracker_variable(knob)
+        start, end = utctolocal(start), utctolocal(end)
+        times, values = ldb.get(name, start, end)[name]
+        times = np.asarray(times, dtype=float)
+        values = np.asarray(values, dtype=float)
+        if times.size == 0 or times[0] > start.timestamp():
+            prior_times, prior_values = ldb.get(name, start)[name]
+            times = np.concatenate([np.asarray(prior_times, dtype=float), times])
+            values = np.concatenate([np.asarray(prior_values, dtype=float), values])
+        return cls(times, values, start.timestamp(), end.timestamp())
+
+    def covers(self, start: float, end: float) -> bool:
+        """
+        Return True if the history is complete between two Unix times.
+        """
+        return self.start <= start and end <= self.end
+
+    def at(self, timestamps: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return the settings at Unix times.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            (values, found): the setting at each time, NaN before the first
+            logged setting, and a mask of the times that have a setting.
+        """
+        rows = np.searchsorted(self.timestamps, timestamps, side="right") - 1
+        found = rows >= 0
+        values = np.where(found, self.values[np.maximum(rows, 0)], np.nan)
+        return values, found
+
+    def same_setting(self, timestamps: np.ndarray) -> bool:
+        """
+        Return True if all the times have a setting and share it.
+        """
+        values, found = self.at(timestamps)
+        return bool(found.all() and (values == values[0]).all())
+
+
+class KnobResolution(NamedTuple):
+    """
+    Knob settings of results folders, see KnobResolver.
+
+    Attributes
+    ----------
+    settings : list
+        Setting of each folder, in the order of the folders, or None.
+    failures : dict[str, str]
+        Reason why each unresolved folder has no setting, in folder order.
+    messages : list[str]
+        Notes that concern all folders, e.g. kicks missing from an offline
+        knob cache.
+    """
+
+    settings: list
+    failures: dict[str, str]
+    messages: list[str]
+
+    def report(self) -> str | None:
+        """
+        Return one message listing every unresolved folder, or None.
+        """
+        if not self.failures:
+            return None
+        lines = [f"{folder}: {reason}" for folder, reason in self.failures.items()]
+        return (
+            f"Knob setting not resolved for {len(lines)} folder(s):\n  "
+            + "\n  ".join(lines)
+        )
+
+
+class KnobResolver:
+    """
+    Resolves the knob setting of results folders against a knob source.
+
+    The command.run files of the folders are read concurrently and their kicks
+    are resolved together: settings held by the cache or a preloaded timeline
+    are used directly, and the others are fetched as knob histories, one per
+    window of kicks. Windows are fetched concurrently, at most max_concurrency
+    queries at a time; each query is abandoned after timeout seconds and
+    retried with exponential backoff. An abandoned query keeps its slot until
+    it actually returns, so a slow server never has more than max_concurrency
+    queries of the resolver in flight. Failures of the knob source do not stop
+    the resolution: they are collected per folder in the returned
+    KnobResolution. Other errors, e.g. a missing ldb, are raised.
+
+    Parameters
+    ----------
+    ldb : KnobSource
+        Logging database or replay source; may be None with an offline cache
+        or a timeline covering the kicks.
+    knob : str
+        Knob name.
+    cache : KnobCache, optional
+        Persistent store of settings at kick times. Only the kicks it does not
+        hold are queried, and their settings are stored (default: None).
+    timeline : KnobTimeline, optional
+        Preloaded history of the knob, e.g. over a whole fill, used instead of
+        a query for the windows it covers (default: None).
+    max_concurrency : int, optional
+        Maximum number of command.run files read and of queries in flight at a
+        time (default: 1).
+    timeout : float, optional
+        Seconds after which a query is abandoned (default: None, wait).
+    retries : int, optional
+        Number of times a failed or timed out query is repeated (default: 0).
+    backoff : float, optional
+        Delay before the first retry in seconds, doubled on each further retry
+        (default: 1).
+    max_gap : float, optional
+        Kicks further apart than this many seconds are fetched in separate
+        windows, so that scans spread over days do not load the history in
+        between (default: None, a single window).
+    retry_on : tuple of exception types, optional
+        Transport errors of the knob source that are retried; timeouts are
+        always retried (default: None, OSError and, if JPype is installed, the
+        Java exceptions raised by pytimber).
+    """
+
+    def __init__(
+        self,
+        ldb: KnobSource,
+        knob: str,
+        cache: KnobCache | None = None,
+        timeline: KnobTimeline | None = None,
+        max_concurrency: int = 1,
+        timeout: float | None = None,
+        retries: int = 0,
+        backoff: float = 1.0,
+        max_gap: float | None = None,
+        retry_on: tuple[type[Exception], ...] | None = None,
+    ):
+        if max_concurrency < 1 or retries < 0:
+            msg = "max_concurrency must be at least 1 and retries at least 0."
+            raise ValueError(msg)
+        self.ldb = ldb
+        self.knob = knob
+        self.cache = cache
+        self.timeline = timeline
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_gap = max_gap
+        self.retry_on = retry_on if retry_on is not None else _transport_errors()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def resolve(self, folders: list[Path]) -> KnobResolution:
+        """
+        Return the knob settings of results folders.
+
+        A folder's setting is the setting of its kicks, which must all agree.
+
+        Parameters
+        ----------
+        folders : list[Path]
+            OMC3 results folders.
+
+        Returns
+        -------
+        KnobResolution
+            Settings in the order of folders, and the reason for each folder
+            left without one.
+        """
+        failures = {}
+        messages = []
+        read = list(
+            map_ordered(_read_kick_times, folders, self.max_concurrency, "thread")
+        )
+        for folder, (times, reason, _) in zip(folders, read):
+            if times is None:
+                failures[str(folder)] = reason
+        stamps = [times.tolist() if times is not None else [] for times, _, _ in read]
+        wanted = list(
+            dict.fromkeys(t for folder_stamps in stamps for t in folder_stamps)
+        )
+        resolved = self.cache.get(self.knob, wanted) if self.cache is not None else {}
+        missing = [t for t in wanted if t not in resolved]
+        errors = {}
+        if missing:
+            queried, errors = self._query(sorted(missing), messages)
+            resolved.update(queried)
+            if self.cache is not None:
+                self.cache.put(self.knob, queried)
+
+        # All kicks in one array; each folder is a contiguous segment of it
+        counts = np.array([len(folder_stamps) for folder_stamps in stamps])
+        flat = np.array(
+            [
+                resolved.get(t, np.nan)
+                for folder_stamps in stamps
+                for t in folder_stamps
+            ],
+            dtype=float,
+        )
+        has_kicks = counts > 0
+        first = (np.cumsum(counts) - counts)[has_kicks]
+        lowest = np.full(len(folders), np.nan)
+        highest = np.full(len(folders), np.nan)
+        last = np.full(len(folders), np.nan)
+        if flat.size:
+            lowest[has_kicks] = np.minimum.reduceat(flat, first)
+            highest[has_kicks] = np.maximum.reduceat(flat, first)
+            last[has_kicks] = flat[first + counts[has_kicks] - 1]
+        unresolved = has_kicks & np.isnan(lowest)
+        mixed = has_kicks & ~unresolved & (lowest != highest)
+        valid = has_kicks & ~unresolved & ~mixed
+
+        settings = []
+        for i, folder in enumerate(folders):
+            if unresolved[i]:
+                error = next((errors[t] for t in stamps[i] if t in errors), None)
+                failures[str(folder)] = (
+                    f"Query of knob {self.knob} failed: {error}"
+                    if error is not None
+                    else f"No setting of knob {self.knob} found for the kicks"
+                )
+            elif mixed[i]:
+                failures[str(folder)] = "Includes kicks with different knob settings"
+            settings.append(last[i].item() if valid[i] else None)
+        failures = {
+            str(folder): failures[str(folder)]
+            for folder in folders
+            if str(folder) in failures
+        }
+        return KnobResolution(settings, failures, messages)
+
+    def submit(self, folders: list[Path]) -> Future:
+        """
+        Start resolving the knob settings of results folders in the background,
+        e.g. while their RDT files are read.
+
+        Returns
+        -------
+        Future
+            Future of the KnobResolution, see resolve.
+        """
+        return _start(self.resolve, folders)
+
+    def _query(
+        self, missing: list[float], messages: list[str]
+    ) -> tuple[dict[float, float], dict[float, Exception]]:
+        """
+        Resolve sorted kick times without a cached setting.
+
+        Returns the settings found, and the error of the failed query of each
+        kick time it concerned.
+        """
+        windows = _split_windows(missing, self.max_gap)
+        timelines = [self.timeline] * len(windows)
+        to_fetch = [
+            i
+            for i, window in enumerate(windows)
+            if self.timeline is None or not self.timeline.covers(window[0], window[-1])
+        ]
+        if to_fetch and self.cache is not None and self.cache.offline:
+            count = sum(len(windows[i]) for i in to_fetch)
+            messages.append(
+                f"{count} kicks of knob {self.knob} are not in the offline knob cache"
+            )
+            for i in to_fetch:
+                timelines[i] = None
+            to_fetch = []
+        errors = {}
+        fetched = map_ordered(
+            self._fetch, [windows[i] for i in to_fetch], self.max_concurrency, "thread"
+        )
+        for i, (timeline, error) in zip(to_fetch, fetched):
+            timelines[i] = timeline
+            if error is not None:
+                errors.update(dict.fromkeys(windows[i], error))
+        queried = {}
+        for window, timeline in zip(windows, timelines):
+            if timeline is not None:
+                values, found = timeline.at(np.array(window))
+                queried.update(compress(zip(window, values.tolist()), found.tolist()))
+        return queried, errors
+
+    def _fetch(
+        self, window: list[float]
+    ) -> tuple[KnobTimeline | None, Exception | None]:
+        """
+        Fetch the knob history of a window of kicks, retrying failed and timed
+        out queries. Returns the timeline, or None and the last error.
+        """
+        start, end = _utc_datetime(window[0]), _utc_datetime(window[-1])
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            if not self._slots.acquire(timeout=self.timeout):
+                # Every slot is held by a query that has not returned yet
+                error = TimeoutError(f"no free query slot within {self.timeout} s")
+                continue
+            try:
+                return _start(self._fetch_window, start, end).result(self.timeout), None
+            except FutureTimeoutError:
+                error = TimeoutError(f"no answer within {self.timeout} s")
+            except self.retry_on as e:
+                error = e
+        return None, error
+
+    def _fetch_window(self, start: datetime, end: datetime) -> KnobTimeline:
+        # Holds the slot taken by _fetch until the query returns
+        try:
+            return KnobTimeline.fetch(self.ldb, self.knob, start, end)
+        finally:
+            self._slots.release()
+
+
+def resolve_knob_settings(
+    ldb: KnobSource,
+    knob: str,
+    folders: list[Path],
+    log_func: Callable[[str], None] | None = None,
+    cache: KnobCache | None = None,
+    timeline: KnobTimeline | None = None,
+) -> list:
+    """
+    Return the knob setting of several results folders with one history query.
+
+    The kick times of all folders are collected first; the knob history
+    spanning them is then loaded once as a KnobTimeline and all kicks are
+    resolved against it at once. A folder's setting is the setting of its
+    kicks, which must all agree. See KnobResolver for concurrent reads,
+    timeouts and retries.
+
+    Parameters
+    ----------
+    ldb : KnobSource
+        Logging database or replay source; may be None with an offline cache
+        or a timeline covering the kicks.
+    knob : str
+        Knob name.
+    folders : list[Path]
+        OMC3 results folders.
+    log_func : Callable[[str], None], optional
+        Logging function; messages are printed without it.
+    cache : KnobCache, optional
+        Persistent store of settings at kick times. Only the kicks it does not
+        hold are queried, and their settings are stored (default: None).
+    timeline : KnobTimeline, optional
+        Preloaded history of the knob, e.g. over a whole fill, used instead of
+        a query when it covers the kicks (default: None).
+
+    Returns
+    -------
+    list
+        Setting of each folder, in the order of folders, or None for folders
+        whose kicks could not be read or resolved, or have different settings.
+    """
+    log = log_func or print
+    resolution = KnobResolver(ldb, knob, cache, timeline).resolve(folders)
+    for message in resolution.messages:
+        log(message)
+    for folder, reason in resolution.failures.items():
+        log(f"{folder}: {reason}")
+    return resolution.settings
+
+
+def _split_windows(times: list[float], max_gap: float | None) -> list[list[float]]:
+    if max_gap is None:
+        return [times]
+    windows = [[times[0]]]
+    for previous, t in pairwise(times):
+        if t - previous > max_gap:
+            windows.append([])
+        windows[-1].append(t)
+    return windows
+
+
+def _transport_errors() -> tuple[type[Exception], ...]:
+    try:
+        from jpype import JException
+    except ImportError:
+        return (OSError,)
+    return (OSError, JException)
+
+
+def _start(func: Callable, *args) -> Future:
+    """
+    Run a function in a daemon thread, so that an abandoned call does not keep
+    the interpreter alive.
+    """
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args))
+        except Exception as e:  # noqa: BLE001 - handed to the waiting thread
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def _utc_datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, UTC).replace(tzinfo=None)
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+import numpy as np
+
+from rdtfeeddown.tfs_reader import read_tfs_columns
+
+if TYPE_CHECKING:
+    from rdtfeeddown.tfs_cache import TFSCache
+
+MODEL_COLUMNS = ("NAME", "S")
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+class ModelIndex(NamedTuple):
+    """
+    BPMs of a model twiss file.
+
+    Attributes
+    ----------
+    names : np.ndarray
+        BPM names in model order.
+    s : np.ndarray
+        Longitudinal positions of the BPMs in metres.
+    index : dict[str, int]
+        Position of each BPM name in names and s.
+    """
+
+    names: np.ndarray
+    s: np.ndarray
+    index: dict[str, int]
+
+
+def get_model_index(modelpath: Path | str, cache: TFSCache | None = None) -> ModelIndex:
+    """
+    Return the BPM index of the twiss.dat file in a model directory.
+
+    Indexes are kept in memory for the lifetime of the process, so repeated
+    analyses of the same model are a dictionary lookup. An entry is rebuilt when
+    the size or modification time of twiss.dat changes.
+
+    Parameters
+    ----------
+    modelpath : str or Path
+        Path to the model directory containing the twiss.dat file.
+    cache : TFSCache, optional
+        Parsed-TFS cache used when the index is not in memory, so that it also
+        persists across processes and runs (default: None).
+
+    Returns
+    -------
+    ModelIndex
+        Names, S positions and name-to-index map of the model BPMs. The arrays
+        are shared between callers and must not be modified.
+    """
+    twissfile = Path(modelpath) / "twiss.dat"
+    stat = twissfile.stat()
+    key = str(twissfile.resolve())
+    signature = (stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        entry = _indexes.get(key)
+    if entry is not None and entry[0] == signature:
+        return entry[1]
+
+    hit = cache.get(twissfile, MODEL_COLUMNS) if cache is not None else None
+    if hit is not None:
+        arrays = hit[0]
+    else:
+        arrays, _ = read_tfs_columns(twissfile, MODEL_COLUMNS, name_filter="BPM")
+        arrays["S"] = arrays["S"].astype(float)
+        if cache is not None:
+            cache.put(twissfile, arrays)
+    names = np.asarray(arrays["NAME"])
+    s = np.asarray(arrays["S"], dtype=float)
+    model_index = ModelIndex(
+        names, s, {name: i for i, name in enumerate(names.tolist())}
+    )
+    with _lock:
+        _indexes[key] = (signature, model_index)
+    return model_index
+
+
+def clear_model_indexes() -> None:
+    """
+    Forget every model index held in memory.
+    """
+    with _lock:
+        _indexes.clear()
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator, Sequence
+
+EXECUTORS = ("serial", "thread", "process")
+
+
+def resolve_executor(executor: str, max_workers: int | None, n_items: int) -> tuple:
+    """
+    Decide how a batch of items is actually processed.
+
+    Parameters
+    ----------
+    executor : str
+        Requested execution mode: "serial", "thread" or "process".
+    max_workers : int or None
+        Requested number of workers; None means one per CPU for processes and
+        serial execution for threads.
+    n_items : int
+        Number of items to process.
+
+    Returns
+    -------
+    tuple[str, int]
+        (executor, workers) after falling back to serial execution when only
+        one worker, one CPU or one item is available.
+
+    Raises
+    ------
+    ValueError
+        If the executor is unknown.
+    """
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor '{executor}', expected one of {EXECUTORS}.")
+    if executor == "process":
+        cpus = os.cpu_count() or 1
+        workers = min(max_workers or cpus, cpus)
+    else:
+        workers = max_workers or 1
+    workers = min(workers, n_items)
+    if executor == "serial" or workers <= 1:
+        return "serial", 1
+    return executor, workers
+
+
+def map_ordered(
+    func: Callable,
+    items: Sequence,
+    max_workers: int | None = None,
+    executor: str = "thread",
+    chunksize: int | None = None,
+    max_pending: int | None = None,
+) -> Iterator:
+    """
+    Apply a function to every item, yielding the results in input order.
+
+    With more than one worker the calls run concurrently in a thread or process
+    pool; otherwise they run one after the other in the calling thread. An
+    exception raised by ``func`` is re-raised when its result is reached, so
+    errors surface in the same order as in the serial case.
+
+    Items are submitted in chunks, and at most ``max_pending`` chunks are in
+    flight at any time: results are produced only as fast as they are consumed,
+    which bounds the memory held by finished but unconsumed results.
+
+    Parameters
+    ----------
+    func : Callable
+        Function applied to each item. Must be picklable for processes.
+    items : Sequence
+        Items to process.
+    max_workers : int, optional
+        Number of workers (default: None, see resolve_executor).
+    executor : str, optional
+        "serial", "thread" or "process" (default: "thread").
+    chunksize : int, optional
+        Items per submitted task (default: 1 for threads; for processes, enough
+        to give each worker about four chunks).
+    max_pending : int, optional
+        Maximum number of chunks in flight (default: twice the worker count).
+
+    Yields
+    ------
+    object
+        func(item) for each item, in the order of items.
+    """
+    executor, workers = resolve_executor(executor, max_workers, len(items))
+    if executor == "serial":
+        for item in items:
+            yield func(item)
+        return
+    if chunksize is None:
+        chunksize = 1 if executor == "thread" else -(-len(items) // (4 * workers))
+    chunks = [items[i : i + chunksize] for i in range(0, len(items), chunksize)]
+    max_pending = max(max_pending or 2 * workers, 1)
+    pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    pool = pool_class(max_workers=workers)
+    try:
+        pending = deque()
+        next_chunk = 0
+        while next_chunk < len(chunks) or pending:
+            while next_chunk < len(chunks) and len(pending) < max_pending:
+                pending.append(pool.submit(_run_chunk, func, chunks[next_chunk]))
+                next_chunk += 1
+            yield from pending.popleft().result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _run_chunk(func: Callable, chunk: Sequence) -> list:
+    return [func(item) for item in chunk]
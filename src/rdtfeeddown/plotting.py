@@ -4,14 +4,10 @@ from qtpy.QtCore import Qt
 from qtpy.QtGui import QCursor, QPainterPathStroker, QPen
 from qtpy.QtWidgets import QToolTip
 
-from rdtfeeddown.analysis import (
-    arc_bpm_check,
-    bad_bpm_check,
-    calculate_avg_rdt_shift,
-    fit_bpm,
-    fitdatanoerrors,
-    make_polyfunction,
-)
+from rdtfeeddown.analysis import calculate_avg_rdt_shift, make_polyfunction
+from rdtfeeddown.bad_bpms import excluded_bpms
+from rdtfeeddown.bpm_registry import averaged_bpms
+from rdtfeeddown.fitcache import fit_bpms, fit_single_bpm
 from rdtfeeddown.style import DARK_BACKGROUND_COLOR
 
 COLOR_LIST = [
@@ -130,7 +126,15 @@ def plot_ips(axes, label):
 
 
 def plot_bpm(
-    bpm, fulldata, fitbpm_order, rdt, rdt_plane, ax1=None, ax2=None, log_func=None
+    bpm,
+    fulldata,
+    fitbpm_order,
+    rdt,
+    rdt_plane,
+    ax1=None,
+    ax2=None,
+    log_func=None,
+    weighting="none",
 ):
     """
     Plot the BPM fit for a given BPM.
@@ -153,16 +157,16 @@ def plot_bpm(
         Axis for imaginary part plot.
     log_func : callable, optional
         Logging function.
+    weighting : str, optional
+        Fit weighting, "none" or "erramp" (default: "none").
 
     Returns
     -------
     None
     """
     try:
-        data = fit_bpm(fulldata, fitbpm_order)
-        data = fulldata["data"]
-        diffdata = data[bpm]["diffdata"]
-        fitdata = data[bpm]["fitdata"]
+        fitdata = fit_single_bpm(fulldata, bpm, fitbpm_order, weighting)
+        diffdata = fulldata["data"][bpm]["diffdata"]
         polyfunction = make_polyfunction(order=fitbpm_order)
         knob = fulldata["metadata"]["knob"]
         xing, re, im, amp_err = [], [], [], []
@@ -234,7 +238,7 @@ def plot_bpm(
         return
 
 
-def plot_avg_rdt_shift(ax, data, line_color, rdt, rdt_plane, knob):
+def plot_avg_rdt_shift(ax, data, line_color, rdt, rdt_plane, knob, metadata=None):
     """
     Plot the average RDT shift and standard deviation for given data on the provided axis.
 
@@ -252,12 +256,14 @@ def plot_avg_rdt_shift(ax, data, line_color, rdt, rdt_plane, knob):
         RDT plane ("x" or "y").
     knob : str
         Knob name.
+    metadata : dict, optional
+        Metadata of the dataset, selecting the bad BPMs, see excluded_bpms.
 
     Returns
     -------
     None
     """
-    xing, ampdat, stddat = calculate_avg_rdt_shift(data)
+    xing, ampdat, stddat = calculate_avg_rdt_shift(data, metadata)
     xing = np.insert(xing, 0, 0)
     ampdat = np.insert(ampdat, 0, 0)
     stddat = np.insert(stddat, 0, 0)
@@ -280,7 +286,18 @@ def plot_avg_rdt_shift(ax, data, line_color, rdt, rdt_plane, knob):
     ax.addItem(error_item)
 
 
-def plot_rdtshifts(b1data, b2data, rdt, rdt_plane, axes, knob, log_func=None):
+def plot_rdtshifts(
+    b1data,
+    b2data,
+    rdt,
+    rdt_plane,
+    axes,
+    knob,
+    log_func=None,
+    weighting=None,
+    b1metadata=None,
+    b2metadata=None,
+):
     """
     Plot RDT shifts for LHCB1, LHCB2, or both.
 
@@ -300,6 +317,14 @@ def plot_rdtshifts(b1data, b2data, rdt, rdt_plane, axes, knob, log_func=None):
         Knob name.
     log_func : callable, optional
         Logging function.
+    weighting : str, optional
+        Weighting of the linear fits giving the slopes, "none" or "erramp"
+        (default: None, use the fits stored in the data if they are linear and
+        fit the other BPMs without weights).
+    b1metadata, b2metadata : dict, optional
+        Metadata of the LHCB1 and LHCB2 datasets, selecting the bad BPMs (see
+        excluded_bpms). Stored fits are only reused if metadata["fit"] records
+        a linear fit (default: None, exclude BAD_BPMS and refit).
 
     Returns
     -------
@@ -311,7 +336,7 @@ def plot_rdtshifts(b1data, b2data, rdt, rdt_plane, axes, knob, log_func=None):
         else:
             ax1, ax2, ax3 = axes
 
-        def plot_beam_data(axs, data, label, knob=knob):
+        def plot_beam_data(axs, data, label, metadata, knob=knob):
             """
             Plots the RDT shift data for a single beam into the three provided axes:
             axs[0] => Average re^2 + im^2
@@ -347,34 +372,29 @@ def plot_rdtshifts(b1data, b2data, rdt, rdt_plane, axes, knob, log_func=None):
             # Collect data for dRe/dknob and dIm/dknob
             sdat, dredkdat, dimdkdat = [], [], []
             dredkerr, dimdkerr = [], []
-            for bpm in data:
-                if not arc_bpm_check(bpm) or bad_bpm_check(bpm):
-                    continue
+            plotted = averaged_bpms(data, excluded_bpms(metadata))
+            # Linear fits through the fit cache; stored fits are kept if they
+            # are linear and no weighting is requested
+            stored_linear = (
+                weighting is None
+                and ((metadata or {}).get("fit") or {}).get("order") == 1
+            )
+            refit = [
+                bpm
+                for bpm in plotted
+                if not stored_linear or "fitdata" not in data[bpm]
+            ]
+            fits = fit_bpms(
+                {bpm: data[bpm] for bpm in refit},
+                order=1,
+                weighting=weighting or "none",
+            )
+            for bpm in plotted:
                 s = data[bpm]["s"] / 1000
                 # [re_opt, re_cov, re_err, im_opt, im_cov, im_err]
-                try:
-                    re_opt, _, re_err, im_opt, _, im_err = data[bpm]["fitdata"]
-                except KeyError:
-                    diffdata = data["data"][bpm]["diffdata"]
-                    xing = []
-                    re = []
-                    im = []
-                    for x in range(len(diffdata)):
-                        xing.append(diffdata[x][0])
-                        re.append(diffdata[x][1])
-                        im.append(diffdata[x][2])
-
-                    polyfunction = make_polyfunction(order=1)
-                    re_opt, re_cov, re_err = fitdatanoerrors(xing, re, polyfunction, 1)
-                    im_opt, im_cov, im_err = fitdatanoerrors(xing, im, polyfunction, 1)
-                    data["data"][bpm]["fitdata"] = [
-                        re_opt,
-                        re_cov,
-                        re_err,
-                        im_opt,
-                        im_cov,
-                        im_err,
-                    ]
+                re_opt, _, re_err, im_opt, _, im_err = (
+                    fits[bpm] if bpm in fits else data[bpm]["fitdata"]
+                )
 
                 # re_opt[1] => slope in re polynomial fit, re_err[1] => error in that slope
                 sdat.append(s)
@@ -391,7 +411,7 @@ def plot_rdtshifts(b1data, b2data, rdt, rdt_plane, axes, knob, log_func=None):
             line_color = b1_line_color if label == "LHCB1" else b2_line_color
 
             # Plot average re^2 + im^2
-            plot_avg_rdt_shift(ax_avg, data, line_color, rdt, rdt_plane, knob)
+            plot_avg_rdt_shift(ax_avg, data, line_color, rdt, rdt_plane, knob, metadata)
             # Plot dRe with error bars
             error_re = ErrorBarItem(
                 x=sdat, y=dredkdat, height=2 * dredkerr, beam=0.1, pen=line_color
@@ -411,21 +431,21 @@ def plot_rdtshifts(b1data, b2data, rdt, rdt_plane, axes, knob, log_func=None):
         # Case 1: Both Beam 1 and Beam 2 data
         if b1data and b2data:
             # LHCB1 on the left: (ax1, ax3, ax5)
-            plot_beam_data((ax1, ax3, ax5), b1data, "LHCB1")
+            plot_beam_data((ax1, ax3, ax5), b1data, "LHCB1", b1metadata)
 
             # LHCB2 on the right: (ax2, ax4, ax6)
-            plot_beam_data((ax2, ax4, ax6), b2data, "LHCB2")
+            plot_beam_data((ax2, ax4, ax6), b2data, "LHCB2", b2metadata)
             find_min_max_y((ax3, ax4, ax5, ax6))
             find_min_max_y((ax1, ax2))
 
         # Case 2: Only Beam 1 data given (b2data is None)
         elif b1data:
-            plot_beam_data((ax1, ax2, ax3), b1data, "LHCB1")
+            plot_beam_data((ax1, ax2, ax3), b1data, "LHCB1", b1metadata)
             find_min_max_y((ax2, ax3))
 
         # Case 3: Only Beam 2 data given (b1data is None)
         elif b2data is not None:
-            plot_beam_data((ax1, ax2, ax3), b2data, "LHCB2")
+            plot_beam_data((ax1, ax2, ax3), b2data, "LHCB2", b2metadata)
             find_min_max_y((ax2, ax3))
 
     except (KeyError, ValueError, TypeError) as e:
@@ -438,7 +458,16 @@ def plot_rdtshifts(b1data, b2data, rdt, rdt_plane, axes, knob, log_func=None):
     return
 
 
-def plot_rdt(b1data, b2data, rdt, rdt_plane, axes, log_func=None):
+def plot_rdt(
+    b1data,
+    b2data,
+    rdt,
+    rdt_plane,
+    axes,
+    log_func=None,
+    b1metadata=None,
+    b2metadata=None,
+):
     """
     Plot RDT data for LHCB1, LHCB2, or both.
 
@@ -456,6 +485,9 @@ def plot_rdt(b1data, b2data, rdt, rdt_plane, axes, log_func=None):
         List of PlotWidgets for plotting.
     log_func : callable, optional
         Logging function.
+    b1metadata, b2metadata : dict, optional
+        Metadata of the LHCB1 and LHCB2 datasets, selecting the bad BPMs, see
+        excluded_bpms (default: None, exclude BAD_BPMS).
 
     Returns
     -------
@@ -468,7 +500,7 @@ def plot_rdt(b1data, b2data, rdt, rdt_plane, axes, log_func=None):
         else:
             ax1, ax2, ax3 = axes
 
-        def plot_single_beam(ax_amp, ax_re, ax_im, data, beam_label):
+        def plot_single_beam(ax_amp, ax_re, ax_im, data, beam_label, metadata):
             """
             Plots |f|, Re(f), and Im(f) vs. knob trim in three provided axes.
             """
@@ -490,12 +522,11 @@ def plot_rdt(b1data, b2data, rdt, rdt_plane, axes, log_func=None):
             hover_lines_amp = []
             hover_lines_re = []
             hover_lines_im = []
+            plotted = averaged_bpms(data, excluded_bpms(metadata))
             # For each crossing angle, gather BPM data
             for i, angle in enumerate(xing):
                 sdat, ampdat, redat, imdat = [], [], [], []
-                for bpm in data:
-                    if not arc_bpm_check(bpm) or bad_bpm_check(bpm):
-                        continue
+                for bpm in plotted:
                     s = data[bpm]["s"] / 1000
                     diffdata = data[bpm]["diffdata"]
                     for row in diffdata:
@@ -552,14 +583,14 @@ def plot_rdt(b1data, b2data, rdt, rdt_plane, axes, log_func=None):
         if b1data and b2data:
             # Plot B1 (left column)
             hover_lines_amp_b1, hover_lines_re_b1, hover_lines_im_b1 = plot_single_beam(
-                ax1, ax3, ax5, b1data, "LHCB1"
+                ax1, ax3, ax5, b1data, "LHCB1", b1metadata
             )
             install_closest_y_hover(ax1, hover_lines_amp_b1)
             install_closest_y_hover(ax3, hover_lines_re_b1)
             install_closest_y_hover(ax5, hover_lines_im_b1)
             # Plot B2 (right column)
             hover_lines_amp_b2, hover_lines_re_b2, hover_lines_im_b2 = plot_single_beam(
-                ax2, ax4, ax6, b2data, "LHCB2"
+                ax2, ax4, ax6, b2data, "LHCB2", b2metadata
             )
             install_closest_y_hover(ax2, hover_lines_amp_b2)
             install_closest_y_hover(ax4, hover_lines_re_b2)
@@ -569,7 +600,7 @@ def plot_rdt(b1data, b2data, rdt, rdt_plane, axes, log_func=None):
         elif b1data:
             # Only B1
             hover_lines_amp_b1, hover_lines_re_b1, hover_lines_im_b1 = plot_single_beam(
-                ax1, ax2, ax3, b1data, "LHCB1"
+                ax1, ax2, ax3, b1data, "LHCB1", b1metadata
             )
             install_closest_y_hover(ax1, hover_lines_amp_b1)
             install_closest_y_hover(ax2, hover_lines_re_b1)
@@ -578,7 +609,7 @@ def plot_rdt(b1data, b2data, rdt, rdt_plane, axes, log_func=None):
         elif b2data:
             # Only B2
             hover_lines_amp_b2, hover_lines_re_b2, hover_lines_im_b2 = plot_single_beam(
-                ax1, ax2, ax3, b2data, "LHCB2"
+                ax1, ax2, ax3, b2data, "LHCB2", b2metadata
             )
             install_closest_y_hover(ax1, hover_lines_amp_b2)
             install_closest_y_hover(ax2, hover_lines_re_b2)
@@ -595,7 +626,16 @@ def plot_rdt(b1data, b2data, rdt, rdt_plane, axes, log_func=None):
     return
 
 
-def plot_drdt_dknob(b1data, b2data, rdt, rdt_plane, axes, knoblist=None, log_func=None):
+def plot_drdt_dknob(
+    b1data,
+    b2data,
+    rdt,
+    rdt_plane,
+    axes,
+    knoblist=None,
+    log_func=None,
+    weighting="none",
+):
     """
     Plot dRDT/dknob for LHCB1, LHCB2, or both.
 
@@ -615,6 +655,9 @@ def plot_drdt_dknob(b1data, b2data, rdt, rdt_plane, axes, knoblist=None, log_fun
         Dictionary of knob values (default: None).
     log_func : callable, optional
         Logging function.
+    weighting : str, optional
+        Weighting of the linear fits of measured data, "none" or "erramp"
+        (default: "none").
 
     Returns
     -------
@@ -668,9 +711,10 @@ def plot_drdt_dknob(b1data, b2data, rdt, rdt_plane, axes, knoblist=None, log_fun
             if is_file_key_structure:
                 line_label = "Simulation"
                 # Data has a "file" key structure
-                for bpm in data[next(iter(data.keys()))]["data"]:
-                    if not arc_bpm_check(bpm) or bad_bpm_check(bpm):
-                        continue
+                first = data[next(iter(data.keys()))]
+                for bpm in averaged_bpms(
+                    first["data"], excluded_bpms(first.get("metadata"))
+                ):
                     re_opts, re_errs, im_opts, im_errs = 0, 0, 0, 0
                     s = float(data[next(iter(data.keys()))]["data"][bpm]["s"]) / 1000
                     for file in data:
@@ -693,37 +737,17 @@ def plot_drdt_dknob(b1data, b2data, rdt, rdt_plane, axes, knoblist=None, log_fun
             else:
                 line_label = "Measurement"
                 # Data is directly a BPM dictionary
-                for bpm in data["data"]:
-                    if not arc_bpm_check(bpm) or bad_bpm_check(bpm):
-                        continue
+                plotted = averaged_bpms(
+                    data["data"], excluded_bpms(data.get("metadata"))
+                )
+                fits = fit_bpms(
+                    {bpm: data["data"][bpm] for bpm in plotted},
+                    order=1,
+                    weighting=weighting,
+                )
+                for bpm in plotted:
                     s = float(data["data"][bpm]["s"]) / 1000
-                    try:
-                        re_opt, _, re_err, im_opt, _, im_err = data[bpm]["fitdata"]
-                    except KeyError:
-                        diffdata = data["data"][bpm]["diffdata"]
-                        xing = []
-                        re = []
-                        im = []
-                        for x in range(len(diffdata)):
-                            xing.append(diffdata[x][0])
-                            re.append(diffdata[x][1])
-                            im.append(diffdata[x][2])
-
-                        polyfunction = make_polyfunction(order=1)
-                        re_opt, re_cov, re_err = fitdatanoerrors(
-                            xing, re, polyfunction, 1
-                        )
-                        im_opt, im_cov, im_err = fitdatanoerrors(
-                            xing, im, polyfunction, 1
-                        )
-                        data["data"][bpm]["fitdata"] = [
-                            re_opt,
-                            re_cov,
-                            re_err,
-                            im_opt,
-                            im_cov,
-                            im_err,
-                        ]
+                    re_opt, _, re_err, im_opt, _, im_err = fits[bpm]
                     sdat.append(s)
                     dredkdat.append(float(re_opt[1]))
                     dredkerr.append(float(re_err[1]))
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import re
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+from rdtfeeddown.utils import csv_to_dict
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+_REGEX_CHARS = re.compile(r"[.^$*+?{}\[\]\\|()]")
+# Global inline flags, numbered backreferences, conditionals, named groups and
+# named backreferences do not survive being combined into one alternation
+_UNCOMBINABLE = re.compile(r"^\(\?[aiLmsux]+\)|\\[1-9]|\(\?\(|\(\?P[<=]")
+
+_mappings = {}
+_lock = threading.Lock()
+
+
+class SimMatch(NamedTuple):
+    """
+    Knob settings of simulation folders, see SimMapping.resolve.
+
+    Attributes
+    ----------
+    settings : list
+        Knob setting of each folder, in the order of the folders, or None.
+    unmatched : list[str]
+        Folders matched by no entry.
+    ambiguous : dict[str, list[str]]
+        MATCH of the first and last entries matching each folder matched by
+        several entries; the first entry is used.
+    """
+
+    settings: list
+    unmatched: list[str]
+    ambiguous: dict[str, list[str]]
+
+    def report(self, source: str = "mapping dictionary") -> list[str]:
+        """
+        Return one message listing all unmatched folders and one listing all
+        ambiguous folders, if there are any.
+        """
+        messages = []
+        if self.unmatched:
+            messages.append(
+                f"Knob of {len(self.unmatched)} folder(s) not found in {source}:\n  "
+                + "\n  ".join(self.unmatched)
+            )
+        if self.ambiguous:
+            lines = [
+                f"{folder}: {' and '.join(matches)}"
+                for folder, matches in self.ambiguous.items()
+            ]
+            messages.append(
+                f"{len(lines)} folder(s) match several entries of {source}, "
+                "using the first:\n  " + "\n  ".join(lines)
+            )
+        return messages
+
+
+class SimMapping:
+    """
+    Compiled index of a simulation property file.
+
+    Each entry maps the folders whose name fully matches its MATCH pattern to
+    its KNOB setting; the first matching entry in file order applies. Literal
+    patterns are looked up in a dictionary, and all other patterns sharing a
+    literal prefix are combined into one alternation of named groups. The re
+    module tries alternatives one by one, so the prefixes keep the alternation
+    run for a folder short: a folder is resolved with a few dictionary lookups
+    and, per prefix it starts with, one regex match, whatever the number of
+    entries. A second alternation in reverse order tells whether another entry
+    matches too. The few patterns that cannot be combined, i.e. those with
+    global inline flags such as "(?i)", backreferences, conditionals or named
+    groups, and the patterns of any prefix whose alternation fails to compile,
+    are matched separately.
+
+    A pattern must match the whole folder name, as for reference folders. A
+    top-level alternation such as "seed_1|seed_2" therefore no longer matches
+    "seed_10", which it did when measurement folders were matched with
+    ``re.search(rf"^{MATCH}$")``, anchoring only its outer branches.
+
+    Parameters
+    ----------
+    entries : iterable of dict
+        Rows of the property file with the MATCH and KNOB columns, as returned
+        by csv_to_dict. A missing KNOB is 0.
+
+    Raises
+    ------
+    ValueError
+        If a MATCH pattern is not a valid regular expression.
+    """
+
+    def __init__(self, entries: Iterable[dict]):
+        self.entries = [
+            (entry.get("MATCH") or "", entry.get("KNOB") or 0) for entry in entries
+        ]
+        self._literals = {}
+        self._separate = []
+        buckets = {}
+        for i, (match, _) in enumerate(self.entries):
+            if _REGEX_CHARS.search(match) is None:
+                self._literals.setdefault(match, []).append(i)
+                continue
+            try:
+                pattern = re.compile(match)
+            except re.error as e:
+                msg = f"Invalid MATCH pattern '{match}' in the property file: {e}"
+                raise ValueError(msg) from e
+            if _UNCOMBINABLE.search(match) is not None or not _groups(match):
+                self._separate.append((i, pattern))
+                continue
+            buckets.setdefault(_literal_prefix(match), []).append((i, pattern))
+        self._patterns = {}
+        for prefix, patterns in buckets.items():
+            grouped = [f"(?P<m{i}>{pattern.pattern})" for i, pattern in patterns]
+            try:
+                self._patterns[prefix] = (
+                    re.compile("|".join(grouped)),
+                    re.compile("|".join(reversed(grouped))),
+                )
+            except re.error:
+                self._separate.extend(patterns)
+        self._prefix_lengths = sorted({len(prefix) for prefix in self._patterns})
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def match(self, name: str) -> list[int]:
+        """
+        Return the indexes of the first and, if several entries match, the last
+        entry matching a folder name; empty if none matches.
+        """
+        found = self._literals.get(name, [])
+        for length in self._prefix_lengths:
+            if length > len(name):
+                break
+            patterns = self._patterns.get(name[:length])
+            if patterns is None:
+                continue
+            forward, reverse = patterns
+            first = forward.fullmatch(name)
+            if first is not None:
+                found = [*found, _entry(first), _entry(reverse.fullmatch(name))]
+        found = [
+            *found,
+            *(i for i, pattern in self._separate if pattern.fullmatch(name)),
+        ]
+        if not found:
+            return []
+        first, last = min(found), max(found)
+        return [first] if first == last else [first, last]
+
+    def resolve(self, folders: Iterable[Path | str]) -> SimMatch:
+        """
+        Return the knob settings of simulation folders, matched by name.
+
+        Parameters
+        ----------
+        folders : iterable of str or Path
+            Simulation folders.
+
+        Returns
+        -------
+        SimMatch
+            Settings in the order of folders, with the unmatched and ambiguous
+            folders.
+        """
+        settings = []
+        unmatched = []
+        ambiguous = {}
+        for folder in folders:
+            found = self.match(Path(folder).name)
+            if not found:
+                unmatched.append(str(folder))
+                settings.append(None)
+                continue
+            if len(found) > 1:
+                ambiguous[str(folder)] = [self.entries[i][0] for i in found]
+            settings.append(float(self.entries[found[0]][1]))
+        return SimMatch(settings, unmatched, ambiguous)
+
+
+def load_sim_mapping(propfile: Path | str) -> SimMapping:
+    """
+    Return the compiled index of a simulation property file.
+
+    Indexes are kept in memory and rebuilt when the size or modification time
+    of the file changes.
+
+    Parameters
+    ----------
+    propfile : str or Path
+        CSV property file with the MATCH and KNOB columns.
+
+    Returns
+    -------
+    SimMapping
+        Index of the file's entries.
+
+    Raises
+    ------
+    ValueError
+        If a MATCH pattern is not a valid regular expression.
+    """
+    propfile = Path(propfile)
+    stat = propfile.stat()
+    key = str(propfile.resolve())
+    signature = (stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        entry = _mappings.get(key)
+    if entry is not None and entry[0] == signature:
+        return entry[1]
+    mapping = SimMapping(csv_to_dict(propfile))
+    with _lock:
+        _mappings[key] = (signature, mapping)
+    return mapping
+
+
+def _literal_prefix(pattern: str) -> str:
+    """
+    Return the literal text every name matched by a pattern starts with.
+    """
+    if "|" in pattern:
+        return ""
+    end = _REGEX_CHARS.search(pattern).start()
+    if pattern[end] in "*?{":
+        # The quantifier makes the preceding character optional
+        end -= 1
+    return pattern[: max(end, 0)]
+
+
+def _groups(pattern: str) -> bool:
+    """
+    Return True if a pattern still compiles as a named group of an alternation.
+    """
+    try:
+        re.compile(f"(?P<m0>{pattern})|x")
+    except re.error:
+        return False
+    return True
+
+
+def _entry(match: re.Match) -> int:
+    # The group of an entry encloses its whole pattern, so it closes last
+    return int(match.lastgroup[1:])
@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from rdtfeeddown.archive import path_signature
+
+DEFAULT_MAX_BYTES = 512 * 1024**2
+INDEX_FILE = "index.json"
+
+
+def default_cache_dir() -> Path:
+    """
+    Return the default directory of the parsed-TFS cache.
+
+    Returns
+    -------
+    Path
+        ``$XDG_CACHE_HOME/rdtfeeddown/tfs`` if XDG_CACHE_HOME is set, otherwise
+        ``~/.cache/rdtfeeddown/tfs``.
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "rdtfeeddown" / "tfs"
+
+
+class TFSCache:
+    """
+    On-disk cache of parsed TFS columns.
+
+    Each entry holds a projection of one TFS file (a set of named, equal-length
+    columns) as a structured ``.npy`` sidecar that is memory-mapped on load, plus
+    a small JSON-serialisable metadata dict (e.g. the beam number). Entries are
+    keyed by the absolute file path and the requested column names, and are
+    invalidated when the size or modification time of the source file (or of
+    the archive holding it) changes.
+    The total size of the sidecars is capped, evicting the least recently used
+    entries first. Cache hits only update the access times in memory; they are
+    written with the next stored entry or by flush.
+
+    Instances can be pickled to share the cache with worker processes: the
+    index is re-read on unpickling, and each write merges the entries changed
+    by this instance into the index on disk rather than overwriting it.
+
+    Parameters
+    ----------
+    cache_dir : str or Path, optional
+        Directory holding the sidecars and the index (default: default_cache_dir()).
+    max_bytes : int, optional
+        Maximum total size of the cached sidecars in bytes (default: 512 MiB).
+    """
+
+    def __init__(
+        self, cache_dir: Path | str | None = None, max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._index = self._load_index()
+        self._changed = set()
+        self._touched = set()
+
+    def __getstate__(self) -> dict:
+        return {"cache_dir": self.cache_dir, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["cache_dir"], state["max_bytes"])
+
+    # --- Public API ---
+
+    def get(
+        self, filepath: Path | str, columns: list[str] | tuple[str, ...]
+    ) -> tuple[dict[str, np.ndarray], dict] | None:
+        """
+        Look up the cached columns of a file.
+
+        Parameters
+        ----------
+        filepath : str or Path
+            Path of the source TFS file.
+        columns : list[str] or tuple[str, ...]
+            Names of the cached columns (part of the key).
+
+        Returns
+        -------
+        tuple[dict[str, np.ndarray], dict] or None
+            (arrays, metadata) on a valid hit, where arrays are read-only views
+            into the memory-mapped sidecar. None on a miss or a stale entry.
+        """
+        signature = path_signature(filepath)
+        if signature is None:
+            return None
+        key = _entry_key(filepath, columns)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            if [entry["size"], entry["mtime_ns"]] != list(signature):
+                self._remove(key)
+                self._write_index()
+                return None
+        try:
+            table = np.load(self._entry_path(key), mmap_mode="r")
+        except (OSError, ValueError):
+            with self._lock:
+                self._remove(key)
+                self._write_index()
+            return None
+        with self._lock:
+            # Access times are kept in memory and written with the next change
+            # of the index or by flush, so hits cause no disk writes
+            current = self._index.get(key)
+            if current is not None:
+                current["last_access"] = time.time()
+                self._touched.add(key)
+        return {name: table[name] for name in columns}, dict(entry["meta"])
+
+    def put(
+        self,
+        filepath: Path | str,
+        arrays: dict[str, np.ndarray],
+        meta: dict | None = None,
+    ) -> None:
+        """
+        Store parsed columns of a file, evicting old entries if over the size cap.
+
+        Parameters
+        ----------
+        filepath : str or Path
+            Path of the source TFS file.
+        arrays : dict[str, np.ndarray]
+            Equal-length, non-object arrays keyed by column name.
+        meta : dict, optional
+            JSON-serialisable metadata returned alongside the arrays on a hit.
+        """
+        signature = path_signature(filepath)
+        if signature is None:
+            return
+        columns = list(arrays)
+        key = _entry_key(filepath, columns)
+        table = np.empty(
+            len(next(iter(arrays.values()))),
+            dtype=[(name, np.asarray(arrays[name]).dtype) for name in columns],
+        )
+        for name in columns:
+            table[name] = arrays[name]
+        with self._lock:
+            entry_path = self._entry_path(key)
+            tmp_path = entry_path.with_suffix(f".{os.getpid()}.tmp.npy")
+            np.save(tmp_path, table)
+            tmp_path.replace(entry_path)
+            self._index[key] = {
+                "path": str(Path(filepath).resolve()),
+                "columns": columns,
+                "size": signature[0],
+                "mtime_ns": signature[1],
+                "nbytes": entry_path.stat().st_size,
+                "last_access": time.time(),
+                "meta": meta or {},
+            }
+            self._changed.add(key)
+            self._evict()
+            self._write_index()
+
+    def clear(self) -> None:
+        """
+        Remove every entry from the cache.
+        """
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+            for stray in self.cache_dir.glob("*.npy"):
+                stray.unlink(missing_ok=True)
+            self._changed.clear()
+            self._touched.clear()
+            self._index = {}
+            self._write_index(merge=False)
+
+    def flush(self) -> None:
+        """
+        Write the access times of the entries read since the last change of the
+        index to disk, so that eviction in later runs sees them.
+        """
+        with self._lock:
+            if self._touched or self._changed:
+                self._write_index()
+
+    def total_bytes(self) -> int:
+        """
+        Return the total size of the cached sidecars in bytes.
+        """
+        with self._lock:
+            return sum(entry["nbytes"] for entry in self._index.values())
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    # --- Internals ---
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.npy"
+
+    def _remove(self, key: str) -> None:
+        self._index.pop(key, None)
+        self._changed.add(key)
+        self._entry_path(key).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        total = sum(entry["nbytes"] for entry in self._index.values())
+        for key in sorted(self._index, key=lambda k: self._index[k]["last_access"]):
+            if total <= self.max_bytes or len(self._index) <= 1:
+                break
+            total -= self._index[key]["nbytes"]
+            self._remove(key)
+
+    def _load_index(self) -> dict:
+        index_path = self.cache_dir / INDEX_FILE
+        try:
+            with Path.open(index_path, "r") as fin:
+                return json.load(fin)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_index(self, merge: bool = True) -> None:
+        index_path = self.cache_dir / INDEX_FILE
+        if merge:
+            index = self._load_index()
+            for key in self._touched - self._changed:
+                if key in index and key in self._index:
+                    index[key]["last_access"] = max(
+                        index[key]["last_access"], self._index[key]["last_access"]
+                    )
+            for key in self._changed:
+                if key in self._index:
+                    index[key] = self._index[key]
+                else:
+                    index.pop(key, None)
+            self._index = index
+        self._changed.clear()
+        self._touched.clear()
+        tmp_path = index_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with Path.open(tmp_path, "w") as fout:
+            json.dump(self._index, fout)
+        tmp_path.replace(index_path)
+
+
+def clear_tfs_cache(cache_dir: Path | str | None = None) -> None:
+    """
+    Remove every entry from the parsed-TFS cache in the given directory.
+
+    Parameters
+    ----------
+    cache_dir : str or Path, optional
+        Cache directory (default: default_cache_dir()).
+    """
+    TFSCache(cache_dir).clear()
+
+
+def _entry_key(filepath: Path | str, columns: list[str] | tuple[str, ...]) -> str:
+    ident = f"{Path(filepath).resolve()}|{','.join(columns)}"
+    return hashlib.sha1(ident.encode()).hexdigest()
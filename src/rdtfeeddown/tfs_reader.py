@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import re
+from pathlib import Path
+
+import numpy as np
+import tfs
+
+from rdtfeeddown.archive import local_path, open_path_text
+
+_HEADER_RE = re.compile(r"^@\s+(.+?)\s+(%\S+)\s*(.*)$")
+_COMPRESSED_SUFFIXES = {".gz", ".bz2", ".xz", ".zip", ".zst", ".tar"}
+
+
+class UnsupportedTFSError(ValueError):
+    """Raised when a file uses TFS features the fast reader does not handle."""
+
+
+def read_tfs_columns(
+    filepath: Path | str,
+    columns: list[str] | tuple[str, ...],
+    name_filter: str | None = None,
+    headers: list[str] | tuple[str, ...] = (),
+    fast: bool = True,
+) -> tuple[dict[str, np.ndarray], dict]:
+    """
+    Read selected columns of a TFS file into NumPy arrays.
+
+    Only the requested columns are converted, and rows whose NAME does not
+    contain ``name_filter`` are skipped while scanning. Anything the fast reader
+    does not handle (compressed files, quoted strings containing whitespace,
+    boolean columns, 'nil' values, ...) falls back to ``tfs.read``. Files inside
+    tar or zip archives are addressed as described in split_archive_path.
+
+    Parameters
+    ----------
+    filepath : str or Path
+        Path to the TFS file.
+    columns : list[str] or tuple[str, ...]
+        Names of the columns to return.
+    name_filter : str, optional
+        Keep only rows whose NAME column contains this substring (default: None,
+        keep all rows).
+    headers : list[str] or tuple[str, ...], optional
+        Names of the headers to return (default: none).
+    fast : bool, optional
+        If False, always use ``tfs.read`` (default: True).
+
+    Returns
+    -------
+    tuple[dict[str, np.ndarray], dict]
+        (arrays, header_values) where arrays maps each requested column to an
+        array (str for string columns, float, int or complex for numeric ones)
+        and header_values maps each requested header found in the file to its
+        value.
+    """
+    if fast:
+        try:
+            return _fast_read(filepath, columns, name_filter, headers)
+        except UnsupportedTFSError:
+            pass
+    return _tfs_read(filepath, columns, name_filter, headers)
+
+
+def _tfs_read(
+    filepath: Path | str,
+    columns: list[str] | tuple[str, ...],
+    name_filter: str | None,
+    headers: list[str] | tuple[str, ...],
+) -> tuple[dict[str, np.ndarray], dict]:
+    with local_path(filepath) as path:
+        df = tfs.read(path)
+    if name_filter is not None:
+        df = df[df["NAME"].str.contains(name_filter, regex=False)]
+    arrays = {}
+    for col in columns:
+        series = df[col]
+        arrays[col] = series.to_numpy(
+            dtype=str if series.dtype.kind in "OSUT" else series.dtype
+        )
+    header_values = {name: df.headers[name] for name in headers if name in df.headers}
+    return arrays, header_values
+
+
+def _fast_read(
+    filepath: Path | str,
+    columns: list[str] | tuple[str, ...],
+    name_filter: str | None,
+    headers: list[str] | tuple[str, ...],
+) -> tuple[dict[str, np.ndarray], dict]:
+    filepath = Path(filepath)
+    if filepath.suffix in _COMPRESSED_SUFFIXES:
+        raise UnsupportedTFSError(f"Compressed file: {filepath}")
+    with open_path_text(filepath) as fin:
+        lines = fin.read().splitlines()
+    return parse_tfs_lines(lines, columns, name_filter, headers)
+
+
+def parse_tfs_lines(
+    lines: list[str],
+    columns: list[str] | tuple[str, ...],
+    name_filter: str | None = None,
+    headers: list[str] | tuple[str, ...] = (),
+) -> tuple[dict[str, np.ndarray], dict]:
+    """
+    Parse selected columns from the lines of a TFS file.
+
+    Parameters
+    ----------
+    lines : list[str]
+        Lines of the TFS file without line terminators.
+    columns : list[str] or tuple[str, ...]
+        Names of the columns to return.
+    name_filter : str, optional
+        Keep only rows whose NAME column contains this substring.
+    headers : list[str] or tuple[str, ...], optional
+        Names of the headers to return.
+
+    Returns
+    -------
+    tuple[dict[str, np.ndarray], dict]
+        As in read_tfs_columns.
+
+    Raises
+    ------
+    UnsupportedTFSError
+        If the content needs the full ``tfs.read`` parser.
+    """
+    header_values = {}
+    column_names = column_types = None
+    first_data = len(lines)
+    for lineno, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped or stripped[0] == "#":
+            continue
+        if stripped[0] == "@":
+            match = _HEADER_RE.match(stripped)
+            if match is None:
+                raise UnsupportedTFSError(f"Unparsable header line: {line}")
+            name, type_id, value = match.groups()
+            if name in headers:
+                header_values[name] = _convert_header(type_id, value)
+        elif stripped[0] == "*":
+            column_names = stripped.split()[1:]
+        elif stripped[0] == "$":
+            column_types = stripped.split()[1:]
+        else:
+            first_data = lineno
+            break
+    if column_names is None or column_types is None:
+        raise UnsupportedTFSError("Missing column names or types.")
+    ncols = len(column_names)
+    if len(column_types) != ncols:
+        raise UnsupportedTFSError("Column names and types differ in length.")
+    try:
+        indices = [column_names.index(col) for col in columns]
+        name_index = column_names.index("NAME") if name_filter is not None else None
+    except ValueError as e:
+        raise UnsupportedTFSError(str(e)) from e
+    kinds = [_column_kind(column_types[i]) for i in indices]
+
+    rows = []
+    for line in lines[first_data:]:
+        parts = line.split()
+        if not parts:
+            continue
+        if len(parts) != ncols:
+            if parts[0][0] == "#":
+                continue
+            raise UnsupportedTFSError(f"Unexpected number of fields: {line}")
+        if name_index is not None and name_filter not in parts[name_index]:
+            continue
+        rows.append(parts)
+
+    arrays = {}
+    for col, index, kind in zip(columns, indices, kinds):
+        values = [row[index] for row in rows]
+        if kind is str:
+            for value in values:
+                if value[0] == '"' and (len(value) < 2 or value[-1] != '"'):
+                    raise UnsupportedTFSError(f"Quoted string with spaces: {value}")
+            arrays[col] = np.array([v.strip('"') for v in values], dtype=str)
+        else:
+            if kind is complex:
+                values = [v.replace("i", "j") for v in values]
+            try:
+                arrays[col] = np.array(values, dtype=kind)
+            except ValueError as e:
+                raise UnsupportedTFSError(str(e)) from e
+    return arrays, header_values
+
+
+def _column_kind(type_id: str) -> type:
+    if type_id == "%s" or type_id.endswith("s"):
+        return str
+    if type_id in ("%le", "%lf", "%f", "%e", "%g"):
+        return float
+    if type_id.endswith("d"):
+        return int
+    if type_id == "%lz":
+        return complex
+    raise UnsupportedTFSError(f"Unsupported column type {type_id}")
+
+
+def _convert_header(type_id: str, value: str):
+    value = value.strip().strip('"')
+    kind = _column_kind(type_id)
+    try:
+        return kind(value)
+    except ValueError as e:
+        raise UnsupportedTFSError(str(e)) from e
@@ -13,17 +13,26 @@ from zoneinfo import ZoneInfo
 if TYPE_CHECKING:
     from qtpy.QtGui import QMouseEvent
 
+    from rdtfeeddown.knobs import KnobTimeline
+    from rdtfeeddown.tfs_cache import TFSCache
+
 # if not (
 #     any("PYTEST_CURRENT_TEST" in k for k in os.environ)
 #     or "unittest" in sys.modules
 #     or os.environ.get("READTHEDOCS") == "True"
 # ):
 #     import pytimber
-import tfs
 from pyqtgraph import ViewBox
 from qtpy.QtCore import Qt, QTimer
 from qtpy.QtWidgets import QApplication
 
+from rdtfeeddown.model_index import get_model_index
+
+# UTC time in the name of a kick file, e.g. "Beam1@Turn@2024_05_01@12_00_00_000.sdds"
+KICK_TIME_RE = re.compile(
+    r"Beam[12]@(?:Bunch)?Turn@(\d{4})_(\d{2})_(\d{2})@(\d{2})_(\d{2})_(\d{2})_(\d{1,6})"
+)
+
 
 def rdt_to_order_and_type(rdt: str):
     rdt_j, rdt_k, rdt_l, rdt_m = map(int, rdt)
@@ -41,7 +50,25 @@ def rdt_to_order_and_type(rdt: str):
     return f"{rdt_type}_{orders[rdt_j + rdt_k + rdt_l + rdt_m]}"
 
 
-def initialize_statetracker():
+def initialize_statetracker(source: Path | str | None = None):
+    """
+    Return the source of the logged knob settings.
+
+    Parameters
+    ----------
+    source : str or Path, optional
+        File of recorded knob settings, replayed with ReplayKnobSource
+        (default: None, connect to the logging service with pytimber).
+
+    Returns
+    -------
+    KnobSource
+        pytimber.LoggingDB or ReplayKnobSource.
+    """
+    if source:
+        from rdtfeeddown.knob_sources import ReplayKnobSource
+
+        return ReplayKnobSource(source)
     import pytimber
 
     return pytimber.LoggingDB()
@@ -63,68 +90,26 @@ def get_analysis_knobsetting(
     requested_knob: str,
     analyfile: Path,
     log_func: callable = None,
+    timeline: KnobTimeline = None,
 ):
-    ############-> read the command.run file to generate a list of all the kicks used to produce this results folder
-    fc = analyfile + "/command.run"
-    try:
-        rc = Path.open(fc, "r")
-    except FileNotFoundError:
-        if log_func:
-            log_func("No command.run file found in the results folder")
-        else:
-            print("No command.run file found in the results folder")
-    flist = []
-    for line in rc.readlines():
-        if re.search(
-            "bin/python -m omc3.hole_in_one --optics",
-            line,
-        ):
-            flist = line.partition("--files")[2].partition("--")[0].split(",")
-            break
-    rc.close()
-    if not flist:
-        if log_func:
-            log_func(
-                "No file list found in command.run; cannot determine knob settings."
-            )
-        else:
-            print("No file list found in command.run; cannot determine knob settings.")
-        return None
-    knobsettings = []
-    try:
-        for f in flist:
-            kickname = f.rpartition("/")[2]
-            kicktime = convert_from_kickfilename(kickname)
-            localktime = utctolocal(kicktime)
-            knobsetting = getknobsetting_statetracker(ldb, localktime, requested_knob)
-            knobsettings.append([kicktime, knobsetting])
-    except (FileNotFoundError, ValueError) as e:
-        if log_func:
-            log_func("Error reading command.run file: " + str(e), e)
-        else:
-            print("Error reading command.run file: " + str(e))
-        return None
-
-    if (
-        len(knobsettings) > 1
-    ):  #### --> in case multiple files were used for the analysis - check all were performed at timestamp with equal knob settings
-        for k in range(len(knobsettings)):
-            if knobsettings[k][1] != knobsettings[0][1]:
-                if log_func:
-                    log_func(
-                        "Results file "
-                        + analyfile
-                        + " includes kicks with different knob settings"
-                    )
-                else:
-                    print(
-                        "Results file "
-                        + analyfile
-                        + " includes kicks with different knob settings"
-                    )
-                return None
-
-    return knobsetting  ### --> in case results folder generated with single kick, or all kicks have the same knob setting, just take the last knobsetting as the value to use moving forward
+    """
+    Return the knob setting of the kicks used to produce a results folder.
+
+    See rdtfeeddown.knobs.resolve_knob_settings, which resolves many folders
+    with a single query of the knob history. A preloaded KnobTimeline covering
+    the kicks answers without querying ldb.
+
+    Returns
+    -------
+    float or None
+        The setting shared by all kicks, or None if the kicks could not be read
+        or have different settings.
+    """
+    from rdtfeeddown.knobs import resolve_knob_settings
+
+    return resolve_knob_settings(
+        ldb, requested_knob, [analyfile], log_func, timeline=timeline
+    )[0]
 
 
 def parse_timestamp(thistime: str, log_func: callable = None):
@@ -163,19 +148,14 @@ def utctolocal(dtutctime: datetime, local_tz_str: str = "Europe/Paris"):
 
 
 def convert_from_kickfilename(kickfilename: str):
-    if re.search("Beam1@Turn@", kickfilename):
-        ts = kickfilename.partition("Beam1@Turn@")[2]
-    elif re.search("Beam2@Turn@", kickfilename):
-        ts = kickfilename.partition("Beam2@Turn@")[2]
-    elif re.search("Beam1@BunchTurn@", kickfilename):
-        ts = kickfilename.partition("Beam1@BunchTurn@")[2]
-    elif re.search("Beam2@BunchTurn@", kickfilename):
-        ts = kickfilename.partition("Beam2@BunchTurn@")[2]
-    ts = ts.partition(".sdds")[0]
-    return dt.datetime.strptime(ts, "%Y_%m_%d@%H_%M_%S_%f")
-
-
-def getmodelbpms(modelpath: Path):
+    match = KICK_TIME_RE.search(kickfilename)
+    if match is None:
+        raise ValueError(f"No kick time in file name '{kickfilename}'")
+    *fields, fraction = match.groups()
+    return dt.datetime(*map(int, fields), int(fraction.ljust(6, "0")))
+
+
+def getmodelbpms(modelpath: Path, cache: TFSCache = None):
     """
     Read the model BPMs from the twiss.dat file in the given model path.
 
@@ -183,6 +163,9 @@ def getmodelbpms(modelpath: Path):
     ----------
     modelpath : Path
         Path to the model directory containing the twiss.dat file.
+    cache : TFSCache, optional
+        Parsed-TFS cache persisting the model index across runs (default: None).
+        Within a process the index is always reused, see get_model_index.
 
     Returns
     -------
@@ -194,18 +177,12 @@ def getmodelbpms(modelpath: Path):
             Dictionary with BPM names as keys, their corresponding 's' position,
             and ready to be filled with data.
     """
-    modelbpmlist = []
-    bpmdata = {}
-    twissfile = Path(modelpath) / "twiss.dat"
-    rt = tfs.read(twissfile)
-    rt_filtered = rt[rt["NAME"].str.contains("BPM")]
-    for _, row in rt_filtered.iterrows():
-        bpm = row["NAME"]
-        modelbpmlist.append(bpm)
-        bpmdata[bpm] = {}
-        bpmdata[bpm]["s"] = float(row["S"])
-        bpmdata[bpm]["ref"] = []
-        bpmdata[bpm]["data"] = []
+    model_index = get_model_index(modelpath, cache)
+    modelbpmlist = model_index.names.tolist()
+    bpmdata = {
+        bpm: {"s": s, "ref": [], "data": []}
+        for bpm, s in zip(modelbpmlist, model_index.s.tolist())
+    }
     return modelbpmlist, bpmdata
 
 
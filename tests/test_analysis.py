@@ -1,16 +1,152 @@
+import datetime as dt
+import json
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
 import unittest
+import warnings
+import zipfile
 from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import tfs
+from scipy.optimize import OptimizeWarning, curve_fit
+from scipy.stats import zscore
 
 from rdtfeeddown.analysis import (
+    calculate_avg_rdt_shift,
+    columns_to_rows,
     filter_outliers,
+    fit_bpm,
+    fitdatanoerrors,
     getrdt_omc3,
+    getrdts_omc3,
+    make_polyfunction,
+    outlier_mask,
+    read_rdt_columns,
     read_rdt_file,
+    read_sim_rdt_columns,
     readrdtdatafile,
+    rows_to_columns,
+)
+from rdtfeeddown.analysis_runner import run_analysis, run_response
+from rdtfeeddown.archive import (
+    clear_archive_indexes,
+    get_archive_index,
+    path_is_dir,
+    path_is_file,
+    prefetch_paths,
+    read_path_bytes,
 )
-from rdtfeeddown.analysis_runner import run_response
+from rdtfeeddown.bad_bpms import excluded_bpms, resolve_bad_bpms
+from rdtfeeddown.bpm_registry import (
+    BAD_BPMS,
+    averaged_bpms,
+    get_bpm_registry,
+    parse_bpm_name,
+)
+from rdtfeeddown.cli import parse_rdt_spec
 from rdtfeeddown.data_handler import save_rdtdata
-from rdtfeeddown.utils import getmodelbpms
-from rdtfeeddown.validation_utils import validate_file_structure
+from rdtfeeddown.dataset import RDTDataset
+from rdtfeeddown.fitcache import (
+    FitCache,
+    fit_bpms,
+    fit_single_bpm,
+    get_fit_cache,
+    set_fit_cache,
+)
+from rdtfeeddown.fitting import fit_dataset
+from rdtfeeddown.knob_cache import KnobCache
+from rdtfeeddown.knob_sources import ReplayKnobSource
+from rdtfeeddown.knobs import (
+    KnobResolver,
+    KnobTimeline,
+    kick_unix_times,
+    read_kick_times,
+    read_run_metadata,
+    resolve_knob_settings,
+)
+from rdtfeeddown.model_index import get_model_index
+from rdtfeeddown.sim_mapping import SimMapping, load_sim_mapping
+from rdtfeeddown.tfs_cache import TFSCache
+from rdtfeeddown.tfs_reader import read_tfs_columns
+from rdtfeeddown.utils import (
+    convert_from_kickfilename,
+    get_analysis_knobsetting,
+    getmodelbpms,
+    initialize_statetracker,
+    rdt_to_order_and_type,
+    utctolocal,
+)
+from rdtfeeddown.validation_utils import validate_file_structure, validate_knob
+
+
+class FakeLoggingDB:
+    """
+    Logging database holding one knob history, counting the queries.
+    """
+
+    def __init__(self, name, times, values):
+        self.name = name
+        self.times = np.array([t.timestamp() for t in times])
+        self.values = np.array(values, dtype=float)
+        self.queries = 0
+
+    def get(self, name, t1, t2=None):
+        self.queries += 1
+        t1 = t1.timestamp()
+        if t2 is None:
+            rows = self.times <= t1
+            rows &= np.cumsum(rows[::-1])[::-1] == 1
+        else:
+            rows = (self.times >= t1) & (self.times <= t2.timestamp())
+        return {name: (self.times[rows], self.values[rows])}
+
+
+class SlowLoggingDB(FakeLoggingDB):
+    """
+    Logging database answering after a delay and failing its first queries,
+    recording the largest number of queries in flight.
+    """
+
+    def __init__(self, name, times, values, delay=0.0, failures=0):
+        super().__init__(name, times, values)
+        self.delay = delay
+        self.failures = failures
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def get(self, name, t1, t2=None):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            fail = self.failures > 0
+            self.failures -= fail
+        try:
+            time.sleep(self.delay)
+            if fail:
+                msg = "logging service unavailable"
+                raise ConnectionError(msg)
+            return super().get(name, t1, t2)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def write_command_run(folder, kick_times):
+    kicks = ",".join(
+        f"/data/Beam1@Turn@{t:%Y_%m_%d@%H_%M_%S}_000.sdds" for t in kick_times
+    )
+    Path(folder, "command.run").write_text(
+        "/opt/venv/bin/python -m omc3.hole_in_one --optics "
+        f"--files {kicks} --beam 1 --accel lhc\n"
+    )
 
 
 class TestAnalysis(unittest.TestCase):
@@ -45,6 +181,35 @@ class TestAnalysis(unittest.TestCase):
             filtered_data[0],
         )
 
+    def test_outlier_modes(self):
+        columns = rows_to_columns(self.b1_raw_data)
+        expected = (
+            (np.abs(zscore(columns.amp)) < 3)
+            & (np.abs(zscore(columns.real)) < 3)
+            & (np.abs(zscore(columns.imag)) < 3)
+        )
+        np.testing.assert_array_equal(
+            outlier_mask(columns.amp, columns.real, columns.imag), expected
+        )
+        rows = filter_outliers(self.b1_raw_data, mode="mad")
+        self.assertIs(rows[0], self.b1_raw_data[0])
+
+        # Two far outliers inflate the standard deviation enough for a single
+        # Z-score pass to keep the milder one
+        rng = np.random.default_rng(0)
+        real = rng.normal(0, 1, 200)
+        imag = rng.normal(0, 1, 200)
+        real[:2] = [40.0, 4.5]
+        imag[:2] = [40.0, 4.5]
+        amp = np.hypot(real, imag)
+        self.assertTrue(outlier_mask(amp, real, imag)[1])
+        for mode in ("mad", "sigma_clip", "complex"):
+            keep = outlier_mask(amp, real, imag, mode=mode)
+            self.assertFalse(keep[:2].any(), mode)
+            self.assertGreater(keep.sum(), 180, mode)
+        with self.assertRaises(ValueError):
+            outlier_mask(amp, real, imag, mode="unknown")
+
     def test_read_rdt_file(self):
         test_dir = Path(__file__).resolve().parent
         filepath = test_dir / "test_data/LHCB1_refdata/rdt/skew_sextupole/f0030_y.tfs"
@@ -61,6 +226,113 @@ class TestAnalysis(unittest.TestCase):
             ],
         )
 
+    def test_read_rdt_columns(self):
+        test_dir = Path(__file__).resolve().parent
+        filepath = test_dir / "test_data/LHCB1_refdata/rdt/skew_sextupole/f0030_y.tfs"
+        columns, beam_no = read_rdt_columns(filepath)
+        self.assertEqual(beam_no, self.b1_beam_no)
+        self.assertEqual(len(columns.names), 526)
+        self.assertEqual(columns_to_rows(columns), self.b1_raw_data)
+        filtered = filter_outliers(columns, threshold=3)
+        self.assertEqual(
+            columns_to_rows(filtered), filter_outliers(self.b1_raw_data, threshold=3)
+        )
+
+    def test_read_rdt_columns_cache(self):
+        test_dir = Path(__file__).resolve().parent
+        source = test_dir / "test_data/LHCB1_refdata/rdt/skew_sextupole/f0030_y.tfs"
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = Path(tmp) / "f0030_y.tfs"
+            shutil.copy(source, filepath)
+            cache = TFSCache(Path(tmp) / "cache")
+            columns, beam_no = read_rdt_columns(filepath, cache=cache)
+            self.assertEqual(len(cache), 1)
+            index_file = Path(tmp) / "cache" / "index.json"
+            written = index_file.stat().st_mtime_ns
+            cached, cached_beam_no = read_rdt_columns(filepath, cache=cache)
+            self.assertEqual(cached_beam_no, beam_no)
+            # Hits do not rewrite the index; flush stores their access time
+            self.assertEqual(index_file.stat().st_mtime_ns, written)
+            (entry,) = json.loads(index_file.read_text()).values()
+            cache.flush()
+            (flushed,) = json.loads(index_file.read_text()).values()
+            self.assertGreater(flushed["last_access"], entry["last_access"])
+            for col, cached_col in zip(columns, cached):
+                np.testing.assert_array_equal(col, cached_col)
+            # A touched file invalidates its entry
+            stat = filepath.stat()
+            os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            self.assertIsNone(cache.get(filepath, ("NAME",)))
+            read_rdt_columns(filepath, cache=cache)
+            cache.clear()
+            self.assertEqual(len(cache), 0)
+            self.assertEqual(cache.total_bytes(), 0)
+
+    def test_read_tfs_columns(self):
+        test_dir = Path(__file__).resolve().parent
+        files = [
+            (
+                test_dir / "test_data/LHCB1_refdata/rdt/skew_sextupole/f0030_y.tfs",
+                ("NAME", "S", "AMP", "REAL", "IMAG", "ERRAMP"),
+            ),
+            (test_dir / "test_data/LHCB2_model/twiss.dat", ("NAME", "S")),
+        ]
+        for filepath, columns in files:
+            fast, fast_headers = read_tfs_columns(
+                filepath, columns, name_filter="BPM", headers=("Command",)
+            )
+            ref, ref_headers = read_tfs_columns(
+                filepath, columns, name_filter="BPM", headers=("Command",), fast=False
+            )
+            self.assertEqual(fast_headers, ref_headers)
+            np.testing.assert_array_equal(fast["NAME"], ref["NAME"])
+            for col in columns[1:]:
+                np.testing.assert_allclose(fast[col], ref[col], rtol=1e-15, atol=0)
+
+    def test_read_tfs_columns_fallback(self):
+        content = (
+            '@ Command %s "python -m omc3.hole_in_one --beam 1"\n'
+            "* NAME S COMMENT\n"
+            "$ %s %le %s\n"
+            '"BPM.10L1.B1" 1.5 "two words"\n'
+            '"MQ.10L1.B1" 2.5 "x"\n'
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = Path(tmp) / "fallback.tfs"
+            filepath.write_text(content)
+            arrays, headers = read_tfs_columns(
+                filepath, ("NAME", "COMMENT"), name_filter="BPM", headers=("Command",)
+            )
+        self.assertEqual(headers["Command"][-1], "1")
+        self.assertEqual(arrays["NAME"].tolist(), ["BPM.10L1.B1"])
+        self.assertEqual(arrays["COMMENT"].tolist(), ["two words"])
+
+    def test_read_sim_rdt_columns(self):
+        rng = np.random.default_rng(0)
+        values = rng.normal(size=50) + 1j * rng.normal(size=50)
+        names = [f"BPM.{i}R1.B1" for i in range(49)] + ["MQ.1R1.B1"]
+        df = tfs.TfsDataFrame(
+            {"NAME": names, "F0030": values}, headers={"Command": "madx --beam 1"}
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            filepath = Path(tmp) / "twiss_rdt.tfs"
+            tfs.write(filepath, df)
+            fast, _ = read_tfs_columns(filepath, ("F0030",), name_filter="BPM")
+            ref, _ = read_tfs_columns(
+                filepath, ("F0030",), name_filter="BPM", fast=False
+            )
+            columns, beam_no = read_sim_rdt_columns(filepath, "0030")
+            rows, _ = readrdtdatafile(
+                filepath, "0030", "y", "skew_sextupole", sim=True, threshold=10
+            )
+        np.testing.assert_array_equal(fast["F0030"], ref["F0030"])
+        self.assertEqual(beam_no, "1")
+        self.assertEqual(columns.names.tolist(), names[:-1])
+        np.testing.assert_array_equal(columns.real, ref["F0030"].real)
+        np.testing.assert_array_equal(columns.imag, ref["F0030"].imag)
+        np.testing.assert_array_equal(columns.amp, np.abs(ref["F0030"]))
+        self.assertEqual(rows, columns_to_rows(columns))
+
     def test_readrdtdatafile(self):
         test_dir = Path(__file__).resolve().parent
         cfile = test_dir / "test_data/LHCB1_refdata/"
@@ -90,6 +362,23 @@ class TestAnalysis(unittest.TestCase):
         modelbpmlist, bpmdata = getmodelbpms(model_path)
         self.assertIn("BPMWI.4L2.B1", modelbpmlist)
 
+    def test_get_model_index(self):
+        test_dir = Path(__file__).resolve().parent
+        with tempfile.TemporaryDirectory() as tmp:
+            shutil.copy(test_dir / "test_data/LHCB1_model/twiss.dat", tmp)
+            model_index = get_model_index(tmp)
+            self.assertIs(get_model_index(tmp), model_index)
+            self.assertEqual(model_index.names.tolist(), self.modelbpmlist)
+            bpm = self.modelbpmlist[1]
+            self.assertEqual(
+                model_index.s[model_index.index[bpm]], self.bpmdata[bpm]["s"]
+            )
+            # A touched model is read again
+            twissfile = Path(tmp) / "twiss.dat"
+            stat = twissfile.stat()
+            os.utime(twissfile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            self.assertIsNot(get_model_index(tmp), model_index)
+
     def test_getrdt_omc3_lhcb1(self):
         ldb = None
         ref = "tests/test_data/LHCB1_refdata"
@@ -153,6 +442,837 @@ class TestAnalysis(unittest.TestCase):
         valid = validate_file_structure(b2_rdtdata, required_metas)
         self.assertTrue(valid, "File structure validation failed for LHCB2 RDT data")
 
+    def test_getrdt_omc3_threaded(self):
+        test_dir = Path(__file__).resolve().parent
+        flist = [
+            "tests/test_data/LHCB1_IP5V_150",
+            "tests/test_data/LHCB1_IP5V_m150",
+        ]
+        results = []
+        for executor, max_workers in (("serial", None), ("thread", 3), ("process", 2)):
+            modelbpmlist, bpmdata = getmodelbpms(test_dir / "test_data/LHCB1_model/")
+            results.append(
+                getrdt_omc3(
+                    None,
+                    "LHCB1",
+                    modelbpmlist,
+                    bpmdata,
+                    "tests/test_data/LHCB1_refdata",
+                    flist,
+                    "",
+                    "0030",
+                    "y",
+                    "skew_sextupole",
+                    sim=True,
+                    propfile="tests/test_data/b1_knobs.csv",
+                    max_workers=max_workers,
+                    executor=executor,
+                )
+            )
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+        with self.assertRaisesRegex(RuntimeError, "LHCB1_missing"):
+            getrdt_omc3(
+                None,
+                "LHCB1",
+                *getmodelbpms(test_dir / "test_data/LHCB1_model/"),
+                "tests/test_data/LHCB1_refdata",
+                [*flist, "tests/test_data/LHCB1_missing"],
+                "",
+                "0030",
+                "y",
+                "skew_sextupole",
+                sim=True,
+                propfile="tests/test_data/b1_knobs.csv",
+                max_workers=3,
+            )
+
+    def test_rdt_dataset(self):
+        test_dir = Path(__file__).resolve().parent
+        modelbpmlist, bpmdata = getmodelbpms(test_dir / "test_data/LHCB1_model/")
+        data = getrdt_omc3(
+            None,
+            "LHCB1",
+            modelbpmlist,
+            bpmdata,
+            "tests/test_data/LHCB1_refdata",
+            ["tests/test_data/LHCB1_IP5V_150", "tests/test_data/LHCB1_IP5V_m150"],
+            "",
+            "0030",
+            "y",
+            "skew_sextupole",
+            sim=True,
+            propfile="tests/test_data/b1_knobs.csv",
+        )
+        dataset = RDTDataset.from_dict(data)
+        self.assertTrue(dataset.complete)
+        self.assertEqual(dataset.re.shape, (len(data["data"]), 3))
+        self.assertEqual(dataset.to_dict(), data)
+        reloaded = RDTDataset.from_dict(json.loads(json.dumps(dataset.to_dict())))
+        np.testing.assert_array_equal(reloaded.re, dataset.re)
+        bpm = next(iter(data["data"]))
+        knobs, re, im, err = dataset.row(bpm)
+        np.testing.assert_array_equal(
+            np.column_stack([knobs, re, im, err]), data["data"][bpm]["diffdata"]
+        )
+
+        # Repeated knob settings get their own columns, missing ones are masked
+        partial_data = {
+            "metadata": {},
+            "data": {
+                "BPM.10L1.B1": {"s": 1.0, "diffdata": [[0, 0, 0, 1], [1, 2, 3, 4]]},
+                "BPM.11L1.B1": {
+                    "s": 2.0,
+                    "diffdata": [[0, 0, 0, 1], [1, 5, 6, 7], [1, 8, 9, 10]],
+                },
+            },
+        }
+        dataset = RDTDataset.from_dict(partial_data)
+        np.testing.assert_array_equal(dataset.knobs, [0, 1, 1])
+        np.testing.assert_array_equal(dataset.mask[0], [True, True, False])
+        self.assertEqual(dataset.to_dict(), partial_data)
+        self.assertEqual(dataset.select(["BPM.11L1.B1"]).re.tolist(), [[0, 5, 8]])
+
+    def test_fit_bpm_matches_curve_fit(self):
+        test_dir = Path(__file__).resolve().parent
+        for flist in (
+            ["LHCB1_IP5V_150", "LHCB1_IP5V_m150", "LHCB1_IP5V_200"],
+            ["LHCB1_IP5V_150", "LHCB1_IP5V_m150"],
+        ):
+            modelbpmlist, bpmdata = getmodelbpms(test_dir / "test_data/LHCB1_model/")
+            data = getrdt_omc3(
+                None,
+                "LHCB1",
+                modelbpmlist,
+                bpmdata,
+                "tests/test_data/LHCB1_refdata",
+                [f"tests/test_data/{f}" for f in flist],
+                "",
+                "0030",
+                "y",
+                "skew_sextupole",
+                sim=True,
+                propfile="tests/test_data/b1_knobs.csv",
+            )
+            fit_bpm(data, order=2)
+            polyfunction = make_polyfunction(2)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", OptimizeWarning)
+                for bpm in list(data["data"])[:20]:
+                    xing, re, im, _ = np.array(data["data"][bpm]["diffdata"]).T
+                    expected = [
+                        *fitdatanoerrors(xing, re, polyfunction, 2),
+                        *fitdatanoerrors(xing, im, polyfunction, 2),
+                    ]
+                    fitdata = data["data"][bpm]["fitdata"]
+                    # curve_fit uses a finite-difference Jacobian, so its
+                    # covariance is only accurate to about 1e-5
+                    for k, rtol in enumerate((1e-7, 1e-4, 1e-4) * 2):
+                        np.testing.assert_allclose(
+                            fitdata[k], expected[k], rtol=rtol, atol=1e-14
+                        )
+                    if len(xing) > 3:
+                        vander = np.vander(xing, 3, increasing=True)
+                        resid = re - vander @ fitdata[0]
+                        exact = np.linalg.inv(vander.T @ vander) * (
+                            resid @ resid / (len(xing) - 3)
+                        )
+                        np.testing.assert_allclose(fitdata[1], exact, rtol=1e-9)
+
+    def test_bpm_registry(self):
+        info = parse_bpm_name("BPM.13L2.B1")
+        self.assertEqual(info, ("BPM", 13, "L", 2, 1, True))
+        self.assertFalse(parse_bpm_name("BPMSW.1R5.B2_DOROS").arc)
+        names = ["BPM.13L2.B1", "BPMWB.4R1.B1", "BPM.9L1.B1", "BPM.25R3.B1"]
+        registry = get_bpm_registry(names)
+        self.assertIs(get_bpm_registry(list(names)), registry)
+        np.testing.assert_array_equal(registry.arc, [True, False, False, True])
+        np.testing.assert_array_equal(registry.bad, [True, False, False, False])
+        np.testing.assert_array_equal(registry.ip, [2, 1, 1, 3])
+        self.assertTrue(registry.is_arc(0))
+        self.assertTrue(registry.is_bad("BPM.13L2.B1"))
+        self.assertTrue(registry.is_arc("BPM.12R8.B2"))
+        self.assertEqual(averaged_bpms(names), ["BPM.25R3.B1"])
+        self.assertEqual(
+            averaged_bpms(names, bad_bpms=()), ["BPM.13L2.B1", "BPM.25R3.B1"]
+        )
+        np.testing.assert_array_equal(registry.rows(["BPM.9L1.B1"]), [2])
+
+    def test_bad_bpm_list(self):
+        test_dir = Path(__file__).resolve().parent
+        with tempfile.TemporaryDirectory() as tmp:
+            listfile = Path(tmp) / "bad_bpms.json"
+            listfile.write_text(
+                json.dumps(
+                    {
+                        "version": "2",
+                        "default": ["BPM.11R2.B1"],
+                        "entries": [
+                            {"fills": [9000, 9010], "bpms": ["BPM.19R4.B1"]},
+                            {"fill": 9100, "bpms": ["BPM.12R2.B1"]},
+                            {"from": "2024-05-01", "to": "2024-06-01", "bpms": ["X"]},
+                        ],
+                    }
+                )
+            )
+            self.assertEqual(resolve_bad_bpms(listfile).bpms, {"BPM.11R2.B1"})
+            self.assertEqual(
+                resolve_bad_bpms(listfile, fill=9005).bpms,
+                {"BPM.11R2.B1", "BPM.19R4.B1"},
+            )
+            self.assertEqual(
+                resolve_bad_bpms(listfile, fill=9100, time="2024-05-31T23:00").bpms,
+                {"BPM.11R2.B1", "BPM.12R2.B1", "X"},
+            )
+            self.assertNotIn("X", resolve_bad_bpms(listfile, time="2024-06-01").bpms)
+            self.assertEqual(resolve_bad_bpms().bpms, BAD_BPMS)
+
+            bad_bpms = resolve_bad_bpms(listfile, fill=9005)
+            modelbpmlist, bpmdata = getmodelbpms(test_dir / "test_data/LHCB1_model/")
+            result = getrdt_omc3(
+                None,
+                "LHCB1",
+                modelbpmlist,
+                bpmdata,
+                "tests/test_data/LHCB1_refdata",
+                ["tests/test_data/LHCB1_IP5V_150", "tests/test_data/LHCB1_IP5V_m150"],
+                "",
+                "0030",
+                "y",
+                "skew_sextupole",
+                sim=True,
+                propfile="tests/test_data/b1_knobs.csv",
+                bad_bpms=bad_bpms,
+            )
+            self.assertNotIn("BPM.11R2.B1", result["data"])
+            self.assertNotIn("BPM.19R4.B1", result["data"])
+            self.assertIn("BPM.12R2.B1", result["data"])
+            recorded = result["metadata"]["bad_bpms"]
+            self.assertEqual(recorded["version"], "2")
+            self.assertEqual(recorded["fill"], 9005)
+            self.assertEqual(recorded["bpms"], ["BPM.11R2.B1", "BPM.19R4.B1"])
+            # The recorded list replaces the built-in one in the averages
+            self.assertIn("BPM.13L2.B1", result["data"])
+            self.assertEqual(excluded_bpms(result["metadata"]), bad_bpms.bpms)
+            self.assertIn(
+                "BPM.13L2.B1",
+                averaged_bpms(result["data"], excluded_bpms(result["metadata"])),
+            )
+            self.assertEqual(excluded_bpms({}), BAD_BPMS)
+            averaged = calculate_avg_rdt_shift(result["data"], result["metadata"])
+            default = calculate_avg_rdt_shift(result["data"])
+            self.assertFalse(np.array_equal(averaged[1], default[1]))
+
+            listfile.write_text(json.dumps({"default": []}))
+            with self.assertRaises(ValueError):
+                resolve_bad_bpms(listfile)
+
+    def test_calculate_avg_rdt_shift(self):
+        data = {
+            "BPM.12L1.B1": {"s": 1.0, "diffdata": [[-1, 3, 4, 0.1], [1, 6, 8, 0.1]]},
+            # Missing the entry at -1, and measured twice at 1
+            "BPM.14L1.B1": {"s": 2.0, "diffdata": [[1, 0, 1, 0.1], [1, 0, 3, 0.1]]},
+            # Not averaged: IR BPM and known bad BPM
+            "BPM.6L1.B1": {"s": 3.0, "diffdata": [[-1, 30, 40, 0.1]]},
+            "BPM.13L2.B1": {"s": 4.0, "diffdata": [[-1, 30, 40, 0.1]]},
+        }
+        xing, avg, std = calculate_avg_rdt_shift(data)
+        np.testing.assert_array_equal(xing, [-1, 1])
+        np.testing.assert_array_equal(avg, [5.0, np.mean([10.0, 1.0, 3.0])])
+        np.testing.assert_array_equal(std, [0.0, np.std([10.0, 1.0, 3.0])])
+        # Angles come from the first BPM, even when it is not averaged
+        data = {"BPM.6L1.B1": data.pop("BPM.6L1.B1"), **data}
+        xing, avg, std = calculate_avg_rdt_shift(data)
+        np.testing.assert_array_equal(xing, [-1])
+        np.testing.assert_array_equal(avg, [5.0])
+        for result in calculate_avg_rdt_shift({}):
+            self.assertEqual(result.size, 0)
+
+    def test_fit_bpm_weighted(self):
+        test_dir = Path(__file__).resolve().parent
+        modelbpmlist, bpmdata = getmodelbpms(test_dir / "test_data/LHCB1_model/")
+        data = getrdt_omc3(
+            None,
+            "LHCB1",
+            modelbpmlist,
+            bpmdata,
+            "tests/test_data/LHCB1_refdata",
+            [
+                "tests/test_data/LHCB1_IP5V_150",
+                "tests/test_data/LHCB1_IP5V_m150",
+                "tests/test_data/LHCB1_IP5V_200",
+                "tests/test_data/LHCB1_IP5V_m200",
+            ],
+            "",
+            "0030",
+            "y",
+            "skew_sextupole",
+            sim=True,
+            propfile="tests/test_data/b1_knobs.csv",
+        )
+        rng = np.random.default_rng(3)
+        for entry in data["data"].values():
+            for row in entry["diffdata"]:
+                row[3] = float(rng.uniform(0.5, 2.0)) * (abs(row[1]) + 1e-3)
+        # Entries without an error (e.g. simulations) cannot be weighted
+        bpm = next(iter(data["data"]))
+        data["data"][bpm]["diffdata"][0][3] = 0.0
+        with self.assertRaises(ValueError):
+            fit_bpm(data, order=2, weighting="erramp")
+        data["data"][bpm]["diffdata"][0][3] = 1.0
+        fit_bpm(data, order=2, weighting="erramp")
+        self.assertEqual(data["metadata"]["fit"], {"order": 2, "weighting": "erramp"})
+        polyfunction = make_polyfunction(2)
+        for bpm in list(data["data"])[:20]:
+            xing, re, im, err = np.array(data["data"][bpm]["diffdata"]).T
+            fitdata = data["data"][bpm]["fitdata"]
+            vander = np.vander(xing, 3, increasing=True) / err[:, None]
+            exact_cov = np.linalg.inv(vander.T @ vander)
+            for offset, values in ((0, re), (3, im)):
+                exact = np.linalg.lstsq(vander, values / err, rcond=None)[0]
+                np.testing.assert_array_less(
+                    abs(fitdata[offset] - exact), 1e-9 * fitdata[offset + 2]
+                )
+                np.testing.assert_allclose(
+                    fitdata[offset + 1],
+                    exact_cov,
+                    rtol=1e-9,
+                    atol=1e-12 * abs(exact_cov).max(),
+                )
+                # curve_fit converges to a tolerance and differentiates
+                # numerically, so it only agrees to a fraction of the errors
+                popt, pcov = curve_fit(
+                    polyfunction,
+                    xing,
+                    values,
+                    p0=[0] * 3,
+                    sigma=err,
+                    absolute_sigma=True,
+                )
+                np.testing.assert_array_less(
+                    abs(fitdata[offset] - popt), 1e-3 * fitdata[offset + 2]
+                )
+                np.testing.assert_allclose(
+                    fitdata[offset + 2], np.sqrt(np.diag(pcov)), rtol=1e-3
+                )
+
+    def test_fit_cache(self):
+        test_dir = Path(__file__).resolve().parent
+        modelbpmlist, bpmdata = getmodelbpms(test_dir / "test_data/LHCB1_model/")
+        data = getrdt_omc3(
+            None,
+            "LHCB1",
+            modelbpmlist,
+            bpmdata,
+            "tests/test_data/LHCB1_refdata",
+            ["tests/test_data/LHCB1_IP5V_150", "tests/test_data/LHCB1_IP5V_m150"],
+            "",
+            "0030",
+            "y",
+            "skew_sextupole",
+            sim=True,
+            propfile="tests/test_data/b1_knobs.csv",
+        )
+        bpm = next(iter(data["data"]))
+        cache = FitCache()
+        fitdata = fit_single_bpm(data, bpm, 1, cache=cache)
+        self.assertIs(fit_single_bpm(data, bpm, 1, cache=cache), fitdata)
+        self.assertNotIn("fitdata", data["data"][bpm])
+        # Same content in a new dict hits the cache, another order does not
+        copy = json.loads(json.dumps(data))
+        self.assertIs(fit_single_bpm(copy, bpm, 1, cache=cache), fitdata)
+        self.assertEqual(len(fit_single_bpm(copy, bpm, 2, cache=cache)[0]), 3)
+        with self.assertRaises(ValueError):
+            fit_bpms(data["data"], 1, weighting="unknown", cache=cache)
+
+        expected = fit_dataset(RDTDataset.from_dict(data), 1)
+        fit_bpm(data, order=1)
+        for got, exp in zip(data["data"][bpm]["fitdata"], expected[bpm]):
+            np.testing.assert_array_equal(got, exp)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fit_bpms(data["data"], 1, cache=FitCache(tmpdir))
+            reloaded = FitCache(tmpdir)
+            fits = fit_bpms(data["data"], 1, cache=reloaded)
+            self.assertEqual(len(reloaded), len(data["data"]))
+            for name, fit in fits.items():
+                for got, exp in zip(fit, expected[name]):
+                    np.testing.assert_array_equal(got, exp)
+            reloaded.clear()
+            self.assertEqual(len(reloaded), 0)
+
+    def test_run_analysis_fit_cache(self):
+        test_dir = Path(__file__).resolve().parent
+
+        def run(tmp):
+            return run_analysis(
+                beam1_model=test_dir / "test_data/LHCB1_model",
+                beam1_reffolder=test_dir / "test_data/LHCB1_refdata",
+                beam1_folders=[
+                    test_dir / "test_data/LHCB1_IP5V_150",
+                    test_dir / "test_data/LHCB1_IP5V_m150",
+                ],
+                knob="LHCBEAM/IP5",
+                rdt="0030",
+                rdt_plane="y",
+                simulation_checkbox=True,
+                simulation_file=test_dir / "test_data/b1_knobs.csv",
+                b1filename=Path(tmp) / "b1.json",
+                b2filename=Path(tmp) / "b2.json",
+                fit_order=1,
+                fit_cache=Path(tmp) / "fits",
+            )[0]
+
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                first = run(tmp)
+                # The second run finds every fit on disk and fits nothing
+                with mock.patch(
+                    "rdtfeeddown.fitcache.fit_dataset", side_effect=AssertionError
+                ):
+                    second = run(tmp)
+                self.assertEqual(get_fit_cache().cache_dir, Path(tmp) / "fits")
+                for bpm, entry in first["data"].items():
+                    for got, exp in zip(
+                        second["data"][bpm]["fitdata"], entry["fitdata"]
+                    ):
+                        np.testing.assert_array_equal(got, exp)
+        finally:
+            set_fit_cache(FitCache())
+
+    def test_resolve_knob_settings(self):
+        test_dir = Path(__file__).resolve().parent
+        utc = dt.UTC
+        history = [
+            dt.datetime(2024, 5, 1, 11, tzinfo=utc),
+            dt.datetime(2024, 5, 1, 12, 30, tzinfo=utc),
+            dt.datetime(2024, 5, 1, 13, 30, tzinfo=utc),
+        ]
+        kicks = {
+            "LHCB1_refdata": [(12, 0), (12, 1)],
+            "LHCB1_IP5V_150": [(13, 0), (13, 1), (13, 2)],
+            "LHCB1_IP5V_m150": [(14, 0)],
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            folders = []
+            for name, times in kicks.items():
+                folder = Path(tmp) / name
+                shutil.copytree(test_dir / "test_data" / name, folder)
+                write_command_run(
+                    folder, [dt.datetime(2024, 5, 1, h, m) for h, m in times]
+                )
+                folders.append(folder)
+            mixed = Path(tmp) / "mixed"
+            mixed.mkdir()
+            write_command_run(
+                mixed,
+                [dt.datetime(2024, 5, 1, 12), dt.datetime(2024, 5, 1, 13)],
+            )
+            ldb = FakeLoggingDB(
+                "LhcStateTracker:LHCBEAM:IP5:value", history, [0, 150, -150]
+            )
+            settings = resolve_knob_settings(
+                ldb, "LHCBEAM/IP5", [*folders, mixed, Path(tmp)], log_func=print
+            )
+            self.assertEqual(settings, [0, 150, -150, None, None])
+            self.assertEqual(ldb.queries, 2)
+
+            knob_cache = KnobCache(Path(tmp) / "knobs")
+            resolve_knob_settings(ldb, "LHCBEAM/IP5", folders, cache=knob_cache)
+            self.assertEqual(len(knob_cache), 6)
+            exported = Path(tmp) / "fill.csv"
+            self.assertEqual(knob_cache.export_csv(exported), 6)
+            shared = KnobCache(Path(tmp) / "shared", offline=True)
+            self.assertEqual(shared.import_csv(exported), 6)
+            self.assertEqual(
+                resolve_knob_settings(None, "LHCBEAM/IP5", folders, cache=shared),
+                [0, 150, -150],
+            )
+            knob_cache.bypass = True
+            resolve_knob_settings(ldb, "LHCBEAM/IP5", folders, cache=knob_cache)
+            self.assertEqual(ldb.queries, 6)
+
+            propfile = Path(tmp) / "knobs.csv"
+            propfile.write_text(
+                "MATCH, KNOB\n"
+                "LHCB1_refdata, 0\nLHCB1_IP5V_150, 150\nLHCB1_IP5V_m150, -150\n"
+            )
+            results = []
+            for sim, source in ((False, ldb), (True, None)):
+                modelbpmlist, bpmdata = getmodelbpms(
+                    test_dir / "test_data/LHCB1_model/"
+                )
+                results.append(
+                    getrdt_omc3(
+                        source,
+                        "LHCB1",
+                        modelbpmlist,
+                        bpmdata,
+                        folders[0],
+                        folders[1:],
+                        "LHCBEAM/IP5",
+                        "0030",
+                        "y",
+                        "skew_sextupole",
+                        sim=sim,
+                        propfile=propfile,
+                    )
+                )
+            self.assertEqual(results[0], results[1])
+
+    def test_read_run_metadata(self):
+        kicks = [
+            "Beam1@Turn@2024_05_01@12_00_00_5.sdds",
+            "Beam1@BunchTurn@2024_05_01@12_01_30_123456.sdds",
+        ]
+        expected = [
+            utctolocal(convert_from_kickfilename(kick)).timestamp() for kick in kicks
+        ]
+        self.assertEqual(kick_unix_times(kicks).tolist(), expected)
+        with self.assertRaises(ValueError):
+            kick_unix_times(["Beam1@Turn@2024_13_01@12_00_00_000.sdds"])
+        with tempfile.TemporaryDirectory() as tmp:
+            command = Path(tmp) / "command.run"
+            command.write_text(
+                "/opt/venv/bin/python -m omc3.hole_in_one --optics --files "
+                + ",".join(f"/data/{kick}" for kick in kicks)
+                + " --beam 1\n"
+            )
+            run = read_run_metadata(tmp)
+            self.assertEqual(run.files, tuple(f"/data/{kick}" for kick in kicks))
+            self.assertEqual(run.kick_times.tolist(), expected)
+            self.assertIs(read_run_metadata(tmp), run)
+            command.write_text("/opt/venv/bin/python -m omc3.hole_in_one --harpy\n")
+            os.utime(command, ns=(0, 0))
+            self.assertEqual(read_run_metadata(tmp).files, ())
+            self.assertIsNone(read_kick_times(tmp))
+
+    def test_knob_timeline(self):
+        timeline = KnobTimeline([30.0, 10.0, 20.0], [2.0, 0.0, 1.0])
+        self.assertEqual(timeline.timestamps.tolist(), [10.0, 20.0, 30.0])
+        values, found = timeline.at(np.array([5.0, 10.0, 25.0, 40.0]))
+        self.assertEqual(found.tolist(), [False, True, True, True])
+        self.assertEqual(values[1:].tolist(), [0.0, 1.0, 2.0])
+        self.assertTrue(np.isnan(values[0]))
+        self.assertTrue(timeline.same_setting(np.array([20.0, 21.0, 29.9])))
+        self.assertFalse(timeline.same_setting(np.array([20.0, 30.0])))
+        self.assertFalse(timeline.same_setting(np.array([5.0, 6.0])))
+
+        utc = dt.UTC
+        ldb = FakeLoggingDB(
+            "LhcStateTracker:LHCBEAM:IP5:value",
+            [dt.datetime(2024, 5, 1, h, tzinfo=utc) for h in (8, 12, 16)],
+            [0, 150, -150],
+        )
+        fill = KnobTimeline.fetch(
+            ldb, "LHCBEAM/IP5", dt.datetime(2024, 5, 1, 9), dt.datetime(2024, 5, 1, 20)
+        )
+        self.assertEqual(fill.values.tolist(), [0, 150, -150])
+        with tempfile.TemporaryDirectory() as tmp:
+            folders = []
+            for hour in (10, 13, 17):
+                folder = Path(tmp) / f"kick_{hour}"
+                folder.mkdir()
+                write_command_run(
+                    folder,
+                    [dt.datetime(2024, 5, 1, hour, m) for m in range(0, 60, 10)],
+                )
+                folders.append(folder)
+            settings = resolve_knob_settings(
+                None, "LHCBEAM/IP5", folders, timeline=fill
+            )
+        self.assertEqual(settings, [0, 150, -150])
+        self.assertEqual(ldb.queries, 2)
+
+    def test_knob_resolver(self):
+        utc = dt.UTC
+        history = [dt.datetime(2024, 5, h, 8, tzinfo=utc) for h in (1, 2, 3, 4)]
+        name = "LhcStateTracker:LHCBEAM:IP5:value"
+        with tempfile.TemporaryDirectory() as tmp:
+            folders = []
+            for day in (4, 1, 3, 2):
+                folder = Path(tmp) / f"kick_{day}"
+                folder.mkdir()
+                write_command_run(
+                    folder, [dt.datetime(2024, 5, day, 10, m) for m in (0, 5)]
+                )
+                folders.append(folder)
+            missing = Path(tmp) / "missing"
+            missing.mkdir()
+            folders.insert(2, missing)
+
+            # One window per day, fetched concurrently; the first query fails
+            ldb = SlowLoggingDB(name, history, [0, 50, 100, 150], 0.05, failures=1)
+            resolver = KnobResolver(
+                ldb,
+                "LHCBEAM/IP5",
+                max_concurrency=4,
+                retries=1,
+                backoff=0.01,
+                max_gap=3600,
+            )
+            resolution = resolver.submit(folders).result()
+            self.assertEqual(resolution.settings, [150, 0, None, 100, 50])
+            self.assertEqual(list(resolution.failures), [str(missing)])
+            self.assertGreater(ldb.peak, 1)
+            self.assertLessEqual(ldb.peak, 4)
+
+            # Timed out queries fail their folders, reported together; abandoned
+            # queries keep their slot until they return
+            ldb = SlowLoggingDB(name, history, [0, 50, 100, 150], 0.3)
+            resolver = KnobResolver(
+                ldb,
+                "LHCBEAM/IP5",
+                max_concurrency=2,
+                timeout=0.05,
+                retries=2,
+                backoff=0.01,
+                max_gap=3600,
+            )
+            resolution = resolver.resolve(folders)
+            self.assertEqual(resolution.settings, [None] * 5)
+            self.assertEqual(list(resolution.failures), [str(f) for f in folders])
+            self.assertIn("within 0.05 s", resolution.failures[str(folders[0])])
+            self.assertIn("5 folder(s)", resolution.report())
+            time.sleep(0.4)
+            self.assertEqual(ldb.peak, 2)
+            self.assertEqual(ldb.active, 0)
+
+            # Errors other than transport errors are raised, without retries
+            ldb = SlowLoggingDB(name, history, [0, 50, 100, 150])
+            calls = []
+            ldb.get = lambda *_: calls.append(1) or 1 / 0
+            resolver = KnobResolver(ldb, "LHCBEAM/IP5", retries=3, backoff=0.01)
+            with self.assertRaises(ZeroDivisionError):
+                resolver.resolve(folders)
+            self.assertEqual(len(calls), 1)
+            with self.assertRaises(ValueError):
+                KnobResolver(ldb, "LHCBEAM/IP5", max_concurrency=0)
+
+    def test_sim_mapping(self):
+        entries = [
+            {"MATCH": "seed_1", "KNOB": "10"},
+            {"MATCH": r"seed_\d+", "KNOB": "20"},
+            {"MATCH": "seed_2", "KNOB": "30"},
+            {"MATCH": r"seed_[0-9]", "KNOB": "40"},
+            {"MATCH": "ref(erence)?", "KNOB": ""},
+        ]
+        mapping = SimMapping(entries)
+        names = ["seed_1", "seed_2", "seed_15", "reference", "ref", "seed_x"]
+        # Same result as matching every entry in file order
+        expected = [
+            next(
+                (
+                    float(e["KNOB"] or 0)
+                    for e in entries
+                    if re.fullmatch(rf"^{e['MATCH']}$", name)
+                ),
+                None,
+            )
+            for name in names
+        ]
+        result = mapping.resolve([Path("sim", name) for name in names])
+        self.assertEqual(result.settings, expected)
+        self.assertEqual(result.settings, [10, 20, 20, 0, 0, None])
+        self.assertEqual(result.unmatched, [str(Path("sim", "seed_x"))])
+        self.assertEqual(
+            result.ambiguous,
+            {
+                str(Path("sim", "seed_1")): ["seed_1", r"seed_[0-9]"],
+                str(Path("sim", "seed_2")): [r"seed_\d+", r"seed_[0-9]"],
+            },
+        )
+        self.assertEqual(len(result.report()), 2)
+        self.assertEqual(mapping.match("seed_15"), [1])
+
+        test_dir = Path(__file__).resolve().parent
+        propfile = test_dir / "test_data/b1_knobs.csv"
+        self.assertIs(load_sim_mapping(propfile), load_sim_mapping(propfile))
+        self.assertEqual(load_sim_mapping(propfile).match("LHCB1_IP5V_150"), [1])
+        with self.assertRaises(ValueError):
+            SimMapping([{"MATCH": "seed_(", "KNOB": "1"}])
+        # Patterns that cannot be combined are matched on their own
+        mapping = SimMapping(
+            [
+                {"MATCH": "(?i)SEED_1", "KNOB": "1"},
+                {"MATCH": r"(seed)_\1", "KNOB": "2"},
+                {"MATCH": r"(?P<m0>seed)_\d", "KNOB": "3"},
+                {"MATCH": r"seed_\d+", "KNOB": "4"},
+            ]
+        )
+        result = mapping.resolve(["seed_1", "seed_seed", "seed_7", "seed_77"])
+        self.assertEqual(result.settings, [1, 2, 3, 4])
+        self.assertEqual(list(result.ambiguous), ["seed_1", "seed_7"])
+        # Named groups and backreferences may repeat across entries
+        mapping = SimMapping(
+            [
+                {"MATCH": r"seed_(?P<n>\d+)_x", "KNOB": "1"},
+                {"MATCH": r"seed_(?P<n>\d+)_y", "KNOB": "2"},
+                {"MATCH": r"seed_(?P<a>\d)_(?P=a)", "KNOB": "3"},
+                {"MATCH": r"seed_(?P<a>\d)(?P=a)", "KNOB": "4"},
+            ]
+        )
+        result = mapping.resolve(["seed_1_x", "seed_2_y", "seed_3_3", "seed_44"])
+        self.assertEqual(result.settings, [1, 2, 3, 4])
+        # A prefix whose alternation does not compile is matched entry by entry
+        with mock.patch("rdtfeeddown.sim_mapping._UNCOMBINABLE", re.compile("$^")):
+            mapping = SimMapping(
+                [
+                    {"MATCH": r"seed_(?P<n>\d+)_x", "KNOB": "1"},
+                    {"MATCH": r"seed_(?P<n>\d+)_y", "KNOB": "2"},
+                ]
+            )
+        self.assertEqual(mapping.resolve(["seed_1_y"]).settings, [2])
+        # Numbered conditionals keep referring to their own entry's groups
+        mapping = SimMapping(
+            [
+                {"MATCH": "s(x)?_a", "KNOB": "1"},
+                {"MATCH": "s(y)?_b(?(1)c|d)", "KNOB": "2"},
+            ]
+        )
+        self.assertEqual(mapping.resolve(["sy_bc", "sy_bd"]).settings, [2, None])
+        # Top-level alternations must match the whole folder name
+        mapping = SimMapping([{"MATCH": "seed_1|seed_2", "KNOB": "1"}])
+        self.assertEqual(mapping.resolve(["seed_2", "seed_10"]).settings, [1, None])
+
+    def test_replay_knob_source(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            history = Path(tmp) / "history.csv"
+            history.write_text(
+                "knob,timestamp,value\n"
+                "LHCBEAM/IP5,2024-05-01T11:00:00,0\n"
+                "LHCBEAM/IP5,2024-05-01T12:30:00,150\n"
+                "LhcStateTracker:LHCBEAM:IP5:value,2024-05-01T13:30:00,-150\n"
+            )
+            source = initialize_statetracker(history)
+            name = "LhcStateTracker:LHCBEAM:IP5:value"
+            self.assertEqual(source.variables, [name])
+            utc = dt.UTC
+            point = source.get(name, dt.datetime(2024, 5, 1, 13, tzinfo=utc))
+            self.assertEqual(point[name][1].tolist(), [150])
+            window = source.get(
+                name, "2024-05-01T12:00:00", dt.datetime(2024, 5, 1, 14, tzinfo=utc)
+            )
+            self.assertEqual(window[name][1].tolist(), [150, -150])
+            self.assertEqual(source.get("unknown", 0), {})
+            self.assertEqual(validate_knob(source, "LHCBEAM/IP5"), (True, -150))
+            self.assertFalse(validate_knob(source, "LHCBEAM/IP1")[0])
+
+            folder = Path(tmp) / "LHCB1_IP5V_150"
+            folder.mkdir()
+            write_command_run(folder, [dt.datetime(2024, 5, 1, 13)])
+            self.assertEqual(
+                get_analysis_knobsetting(source, "LHCBEAM/IP5", folder), 150
+            )
+            knob_cache = KnobCache(Path(tmp) / "knobs")
+            resolve_knob_settings(source, "LHCBEAM/IP5", [folder], cache=knob_cache)
+            replay = ReplayKnobSource(Path(tmp) / "knobs" / "knobs.sqlite")
+            self.assertEqual(
+                get_analysis_knobsetting(replay, "LHCBEAM/IP5", folder), 150
+            )
+            with self.assertRaises(ValueError):
+                ReplayKnobSource(Path(tmp) / "history.txt")
+
+    def test_getrdt_omc3_archive(self):
+        test_dir = Path(__file__).resolve().parent
+        folders = ["LHCB1_refdata", "LHCB1_IP5V_150", "LHCB1_IP5V_m150"]
+
+        def run(base):
+            modelbpmlist, bpmdata = getmodelbpms(test_dir / "test_data/LHCB1_model/")
+            result = getrdt_omc3(
+                None,
+                "LHCB1",
+                modelbpmlist,
+                bpmdata,
+                f"{base}/{folders[0]}",
+                [f"{base}/{f}" for f in folders[1:]],
+                "",
+                "0030",
+                "y",
+                "skew_sextupole",
+                sim=True,
+                propfile="tests/test_data/b1_knobs.csv",
+            )
+            result["metadata"].pop("ref")
+            result["metadata"].pop("file_list")
+            return result
+
+        expected = run(test_dir / "test_data")
+        with tempfile.TemporaryDirectory() as tmp:
+            tar_path = Path(tmp) / "fill.tar.gz"
+            with tarfile.open(tar_path, "w:gz") as tar:
+                for folder in folders:
+                    tar.add(test_dir / "test_data" / folder, arcname=folder)
+            zip_path = Path(tmp) / "fill.zip"
+            with zipfile.ZipFile(zip_path, "w") as zf:
+                for folder in folders:
+                    for member in (test_dir / "test_data" / folder).rglob("*"):
+                        zf.write(member, member.relative_to(test_dir / "test_data"))
+            for archive_path in (tar_path, zip_path):
+                self.assertTrue(path_is_dir(f"{archive_path}/{folders[0]}/rdt"))
+                self.assertEqual(run(archive_path), expected)
+            with self.assertRaises(FileNotFoundError):
+                readrdtdatafile(f"{tar_path}/LHCB1_missing", "0030", "y", "x")
+            # Prefetched members are read in one pass and served from memory
+            members = [
+                f"{folder}/rdt/skew_sextupole/f0030_y.tfs" for folder in folders
+            ][::-1]
+            prefetch_paths([f"{tar_path}/{member}" for member in members])
+            index = get_archive_index(tar_path)
+            position = index._stream.tell()
+            for member in members:
+                self.assertEqual(
+                    index.read_bytes(member),
+                    (test_dir / "test_data" / member).read_bytes(),
+                )
+            self.assertEqual(index._stream.tell(), position)
+            # Zip members stored with a leading "./" are read by their plain name
+            dot_path = Path(tmp) / "dot.zip"
+            with zipfile.ZipFile(dot_path, "w") as zf:
+                zf.writestr(f"./{folders[0]}/command.run", "knob")
+            self.assertTrue(path_is_file(f"{dot_path}/{folders[0]}/command.run"))
+            self.assertEqual(
+                read_path_bytes(f"{dot_path}/{folders[0]}/command.run"), b"knob"
+            )
+            clear_archive_indexes()
+
+    def test_getrdts_omc3(self):
+        test_dir = Path(__file__).resolve().parent
+        flist = ["tests/test_data/LHCB1_IP5V_150", "tests/test_data/LHCB1_IP5V_m150"]
+        rdts = [parse_rdt_spec("f0030_y"), parse_rdt_spec("1020_x")]
+        self.assertEqual(rdts, [("0030", "y"), ("1020", "x")])
+        modelbpmlist, bpmdata = getmodelbpms(test_dir / "test_data/LHCB1_model/")
+        results = getrdts_omc3(
+            None,
+            "LHCB1",
+            modelbpmlist,
+            bpmdata,
+            "tests/test_data/LHCB1_refdata",
+            flist,
+            "",
+            rdts,
+            sim=True,
+            propfile="tests/test_data/b1_knobs.csv",
+        )
+        self.assertEqual(len(results), 2)
+        for result, (rdt, rdt_plane) in zip(results, rdts):
+            modelbpmlist, bpmdata = getmodelbpms(test_dir / "test_data/LHCB1_model/")
+            expected = getrdt_omc3(
+                None,
+                "LHCB1",
+                modelbpmlist,
+                bpmdata,
+                "tests/test_data/LHCB1_refdata",
+                flist,
+                "",
+                rdt,
+                rdt_plane,
+                rdt_to_order_and_type(rdt),
+                sim=True,
+                propfile="tests/test_data/b1_knobs.csv",
+            )
+            self.assertEqual(result, expected)
+
     def test_run_response(self):
         rdt = "0030"
         rdt_plane = "y"